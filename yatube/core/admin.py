@@ -0,0 +1,24 @@
+from django.contrib import admin
+
+from .models import Job, StoredFile
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'task',
+        'status',
+        'priority',
+        'attempts',
+        'run_at',
+        'finished_at',
+    )
+    list_filter = ('status', 'task')
+    search_fields = ('idempotency_key',)
+
+
+@admin.register(StoredFile)
+class StoredFileAdmin(admin.ModelAdmin):
+    list_display = ('name', 'refcount', 'created')
+    search_fields = ('name',)
@@ -0,0 +1,73 @@
+"""request.user из кеша вместо запроса к auth_user на каждой странице.
+
+CachedAuthenticationMiddleware заменяет AuthenticationMiddleware:
+пользователь, которого вернул бэкенд аутентификации, кладётся в кеш
+на USER_CACHE_TIMEOUT секунд. Хеш сессии (он зависит от пароля)
+проверяется, как в django.contrib.auth.get_user(), и для закешированного
+пользователя. Сохранение и удаление пользователя, в том числе смена
+пароля и обновление last_login при входе, удаляют его из кеша.
+
+Вместе с сессиями cached_db страница авторизованного пользователя
+не делает ни одного запроса ради сессии и пользователя.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+User = auth.get_user_model()
+
+USER_KEY = 'user:{pk}'
+
+
+def user_key(pk):
+    return USER_KEY.format(pk=pk)
+
+
+def get_user(request):
+    """django.contrib.auth.get_user(), который берёт пользователя
+    из кеша."""
+    try:
+        user_id = User._meta.pk.to_python(request.session[auth.SESSION_KEY])
+        backend_path = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return AnonymousUser()
+    key = user_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = auth.load_backend(backend_path).get_user(user_id)
+        if user is None:
+            return AnonymousUser()
+        cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if not (session_hash and constant_time_compare(
+            session_hash, user.get_session_auth_hash())):
+        request.session.flush()
+        return AnonymousUser()
+    return user
+
+
+def get_cached_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_user(request)
+    return request._cached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user(sender, instance, **kwargs):
+    """Сбрасывает закешированного пользователя"""
+    cache.delete(user_key(instance.pk))
@@ -0,0 +1,94 @@
+"""Прогон сценариев через тестовый клиент Django и сравнение с базой.
+
+Сценарий — один запрос (метод, url, данные, пользователь), который
+повторяется N раз подряд. Для каждого считаются req/s, перцентили
+задержки и число SQL-запросов на запрос.
+"""
+import json
+import time
+from collections import namedtuple
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+Scenario = namedtuple(
+    'Scenario', 'name method url data user', defaults=(None, None)
+)
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу из отсортированного списка."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(share * len(values)) - 1))
+    return values[index]
+
+
+def run_scenario(scenario, requests, warmup=0, host='localhost'):
+    client = Client(SERVER_NAME=host)
+    if scenario.user is not None:
+        client.force_login(scenario.user)
+    send = getattr(client, scenario.method)
+    for _ in range(warmup):
+        send(scenario.url, scenario.data)
+    latencies, queries, statuses = [], [], set()
+    started = time.perf_counter()
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            request_started = time.perf_counter()
+            response = send(scenario.url, scenario.data)
+            latencies.append(time.perf_counter() - request_started)
+        queries.append(len(captured))
+        statuses.add(response.status_code)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': requests,
+        'rps': round(requests / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'queries': round(sum(queries) / len(queries), 2) if queries else 0,
+        'max_queries': max(queries, default=0),
+        'statuses': sorted(statuses),
+    }
+
+
+def compare(baseline, results, threshold):
+    """Строки сравнения с базой и список регрессий.
+
+    Регрессия — рост p95 больше чем на threshold (доля) или рост
+    среднего числа запросов.
+    """
+    lines, regressions = [], []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            lines.append(f'{name}: нет в базе')
+            continue
+        ratio = result['p95_ms'] / base['p95_ms'] if base['p95_ms'] else 1
+        lines.append(
+            f'{name}: p95 {base["p95_ms"]} → {result["p95_ms"]} мс '
+            f'({(ratio - 1) * 100:+.0f}%), запросов '
+            f'{base["queries"]} → {result["queries"]}'
+        )
+        if ratio > 1 + threshold:
+            regressions.append(f'{name}: p95 вырос на {(ratio - 1):.0%}')
+        if result['queries'] > base['queries']:
+            regressions.append(f'{name}: запросов стало больше')
+    return lines, regressions
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)['scenarios']
+
+
+def save(path, results):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(
+            {'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+             'scenarios': results},
+            file, ensure_ascii=False, indent=2,
+        )
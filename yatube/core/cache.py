@@ -0,0 +1,80 @@
+"""Кеш с защитой от «стада» при истечении записи.
+
+get_or_compute() хранит значение вместе с мягким сроком жизни и
+временем, которое заняло его вычисление:
+
+* пока срок не вышел, значение отдаётся как есть, но с вероятностью,
+  растущей к концу срока, один из запросов пересчитывает его заранее
+  (probabilistic early expiration, XFetch);
+* после мягкого срока значение ещё CACHE_STALE_TIMEOUT секунд лежит
+  в кеше: пересчитывает его только запрос, взявший блокировку,
+  остальные получают устаревшее значение (stale-while-revalidate);
+* блокировка берётся через cache.add(), который атомарен в общих
+  бэкендах (memcached, redis, database), поэтому работает и между
+  процессами.
+"""
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+LOCK_KEY = '{key}:lock'
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _store(key, value, timeout, delta):
+    expires = time.time() + timeout
+    cache.set(
+        key, (value, expires, delta), timeout + settings.CACHE_STALE_TIMEOUT
+    )
+
+
+def _compute(key, compute, timeout):
+    started = time.monotonic()
+    value = compute()
+    _store(key, value, timeout, time.monotonic() - started)
+    return value
+
+
+def _expires_early(expires, delta, beta):
+    jitter = delta * beta * math.log(1 - random.random())
+    return time.time() - jitter >= expires
+
+
+def get_or_compute(key, compute, timeout, beta=1.0):
+    """Значение из кеша или результат compute() с защитой от stampede.
+
+    beta > 1 пересчитывает заранее чаще, beta = 0 отключает ранний
+    пересчёт.
+    """
+    entry = cache.get(key)
+    lock_key = LOCK_KEY.format(key=key)
+    lock_timeout = settings.CACHE_LOCK_TIMEOUT
+    if entry is not None:
+        value, expires, delta = entry
+        if not _expires_early(expires, delta, beta):
+            return value
+        if not cache.add(lock_key, True, lock_timeout):
+            return value
+        try:
+            return _compute(key, compute, timeout)
+        finally:
+            cache.delete(lock_key)
+
+    if cache.add(lock_key, True, lock_timeout):
+        try:
+            return _compute(key, compute, timeout)
+        finally:
+            cache.delete(lock_key)
+    # Значение считает другой запрос: ждём его, но не дольше блокировки.
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+        if cache.get(lock_key) is None:
+            break
+    return _compute(key, compute, timeout)
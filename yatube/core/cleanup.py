@@ -0,0 +1,173 @@
+"""Поиск медиафайлов, на которые больше никто не ссылается.
+
+Все проходы потоковые и держат в памяти не больше пачки имён
+и листингов каталогов текущего пути, поэтому годятся для миллионов
+файлов:
+
+* walk() обходит каталог так, что имена выходят в том же порядке,
+  что и ORDER BY в базе, а orphans() находит лишние файлы слиянием
+  двух отсортированных потоков;
+* stale_sources() перебирает исходники из key-value store sorl
+  и пачками проверяет, нужны ли они ещё;
+* unregistered() пачками находит файлы миниатюр, о которых
+  key-value store ничего не знает.
+
+Найденное удаляют (или переносят в карантин) remove_sources()
+и remove_files().
+"""
+import os
+import shutil
+import time
+from itertools import islice
+
+from django.core.files.storage import default_storage
+from sorl import thumbnail
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from .models import StoredFile
+
+
+def walk(storage, path, min_age=0):
+    """Файлы каталога path хранилища: (имя, размер) по возрастанию имени.
+
+    Каталог сортируется по «имя/», поэтому порядок совпадает с
+    посимвольным сравнением полных имён, как у ORDER BY в базе.
+    Файлы моложе min_age секунд пропускаются: запись о них в базе
+    может быть ещё не закоммичена.
+    """
+    directory = storage.path(path)
+    if os.path.isdir(directory):
+        yield from _walk(path, directory, time.time() - min_age)
+
+
+def _walk(path, directory, newest):
+    with os.scandir(directory) as entries:
+        entries = sorted(
+            ((entry.name + '/', entry) if entry.is_dir(follow_symlinks=False)
+             else (entry.name, entry))
+            for entry in entries
+        )
+    for key, entry in entries:
+        name = f'{path}/{entry.name}'
+        if key.endswith('/'):
+            yield from _walk(name, entry.path, newest)
+            continue
+        stat = entry.stat(follow_symlinks=False)
+        if stat.st_mtime <= newest:
+            yield name, stat.st_size
+
+
+def orphans(files, referenced):
+    """Файлы из files, которых нет в referenced.
+
+    Оба потока отсортированы по возрастанию имени; files выдаёт
+    пары (имя, размер), referenced — имена.
+    """
+    referenced = iter(referenced)
+    current = next(referenced, None)
+    for name, size in files:
+        while current is not None and current < name:
+            current = next(referenced, None)
+        if current != name:
+            yield name, size
+
+
+def batches(iterable, size):
+    """Разбивает поток на списки по size элементов."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def thumbnail_key(name):
+    """Ключ записи о файле миниатюры в key-value store."""
+    return add_prefix(ImageFile(name, default.storage).key)
+
+
+def unregistered(files):
+    """Файлы миниатюр из пачки files, которых нет в key-value store."""
+    keys = {thumbnail_key(name): (name, size) for name, size in files}
+    known = set(
+        KVStore.objects.filter(key__in=keys).values_list('key', flat=True)
+    )
+    return [file for key, file in keys.items() if key not in known]
+
+
+def stale_sources(is_referenced, batch_size):
+    """Исходники из key-value store, которые не нужны is_referenced.
+
+    is_referenced(имена) возвращает множество используемых имён.
+    Исходники, файл которых ещё существует, пропускаются: их
+    вместе с файлами находит orphans().
+    """
+    prefix = add_prefix('', 'thumbnails')
+    last_key = ''
+    while True:
+        keys = list(
+            KVStore.objects.filter(key__startswith=prefix, key__gt=last_key)
+            .order_by('key').values_list('key', flat=True)[:batch_size]
+        )
+        if not keys:
+            return
+        last_key = keys[-1]
+        sources = [
+            deserialize_image_file(value) for value in
+            KVStore.objects.filter(key__in=[
+                add_prefix(key[len(prefix):]) for key in keys
+            ]).values_list('value', flat=True)
+        ]
+        used = is_referenced([source.name for source in sources])
+        yield [
+            source for source in sources
+            if source.name not in used and not source.exists()
+        ]
+
+
+def remove_sources(names, quarantine=None):
+    """Удаляет исходники вместе с миниатюрами и записями StoredFile.
+
+    С quarantine файл переносится в этот каталог, а миниатюры
+    удаляются: их можно сделать заново.
+    """
+    for name in names:
+        image = ImageFile(name, default_storage)
+        if quarantine:
+            thumbnail.delete(image, delete_file=False)
+            move(default_storage, name, quarantine)
+        else:
+            thumbnail.delete(image)
+    StoredFile.objects.filter(name__in=names).delete()
+
+
+def forget_sources(sources):
+    """Удаляет из key-value store исходники без файлов и их миниатюры."""
+    for source in sources:
+        default.kvstore.delete(source)
+
+
+def remove_files(storage, names, quarantine=None):
+    """Удаляет файлы или переносит их в каталог quarantine."""
+    for name in names:
+        if quarantine:
+            move(storage, name, quarantine)
+        else:
+            storage.delete(name)
+
+
+def move(storage, name, quarantine):
+    """Переносит файл в quarantine с сохранением относительного пути."""
+    target = os.path.join(quarantine, *name.split('/'))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.move(storage.path(name), target)
+
+
+def thumbnail_prefix():
+    """Каталог миниатюр sorl без завершающего «/»."""
+    return thumbnail_settings.THUMBNAIL_PREFIX.rstrip('/')
@@ -0,0 +1,88 @@
+"""SQLite для продакшена: WAL, PRAGMA и повтор при блокировке.
+
+Подключается в settings.DATABASES как ENGINE 'core.db.sqlite3'.
+Поверх стандартного бэкенда Django:
+
+* на каждом соединении выполняются PRAGMA из PRAGMAS (WAL, чтобы
+  читатели не ждали писателя, synchronous=NORMAL, mmap, кеш страниц,
+  busy_timeout); их можно поменять через OPTIONS['pragmas'];
+* транзакции начинаются с BEGIN IMMEDIATE (OPTIONS['transaction_mode']):
+  блокировка записи берётся сразу и ждёт через busy_timeout, а не
+  падает посреди транзакции при попытке перейти от чтения к записи;
+* запрос вне транзакции, получивший «database is locked», повторяется
+  до OPTIONS['lock_retries'] раз с экспоненциальной задержкой.
+
+Постоянные соединения включаются обычным CONN_MAX_AGE.
+"""
+import random
+import time
+
+from django.db.backends.sqlite3 import base
+
+Database = base.Database
+
+PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+
+
+def is_locked(error):
+    return 'database is locked' in str(error)
+
+
+class SQLiteCursorWrapper(base.SQLiteCursorWrapper):
+    database = None
+
+    def execute(self, query, params=None):
+        return self.retry(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self.retry(super().executemany, query, param_list)
+
+    def retry(self, execute, *args):
+        attempt = 0
+        while True:
+            try:
+                return execute(*args)
+            except Database.OperationalError as error:
+                # Внутри транзакции повтор одного запроса не поможет:
+                # её целиком откатит atomic().
+                if (not is_locked(error) or self.database.in_atomic_block
+                        or attempt >= self.database.lock_retries):
+                    raise
+            time.sleep(
+                self.database.lock_retry_delay * 2 ** attempt
+                * random.uniform(0.5, 1.5)
+            )
+            attempt += 1
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        # Свои OPTIONS забираются до того, как остальные уйдут
+        # в sqlite3.connect().
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop('pragmas', {})}
+        self.transaction_mode = params.pop('transaction_mode', 'IMMEDIATE')
+        self.lock_retries = params.pop('lock_retries', 5)
+        self.lock_retry_delay = params.pop('lock_retry_delay', 0.05)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for pragma, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {pragma} = {value}')
+        return connection
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=SQLiteCursorWrapper)
+        cursor.database = self
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,57 @@
+"""Сведения о загруженных файлах без лишнего чтения с диска."""
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.images import get_image_dimensions
+from PIL import Image, ImageOps
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def digest(file):
+    """SHA-256 и размер файла, прочитанного потоком по кускам."""
+    sha256 = hashlib.sha256()
+    size = 0
+    file.seek(0)
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+        sha256.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    return sha256.hexdigest(), size
+
+
+def image_metadata(file):
+    """Ширина, высота, размер в байтах и SHA-256 картинки.
+
+    Размеры читаются из заголовка картинки, без декодирования.
+    """
+    width, height = get_image_dimensions(file)
+    content_hash, size = digest(file)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_bytes': size,
+        'image_hash': content_hash,
+    }
+
+
+def normalize_image(file, max_side):
+    """Картинка, уменьшенная до max_side по большей стороне, без EXIF.
+
+    Возвращает ContentFile или None, если менять нечего. JPEG
+    декодируется сразу в уменьшенном масштабе (Image.draft), так что
+    полный растр в памяти не появляется. Анимации не трогаются.
+    """
+    with Image.open(file) as image:
+        if getattr(image, 'is_animated', False):
+            return None
+        if not image.getexif() and max(image.size) <= max_side:
+            return None
+        format_ = image.format
+        image.draft(image.mode, (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format_)
+    return ContentFile(buffer.getvalue())
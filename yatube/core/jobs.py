@@ -0,0 +1,249 @@
+"""Очередь фоновых задач в базе данных, без внешнего брокера.
+
+Задача — функция, зарегистрированная через @task и принимающая
+JSON-сериализуемые именованные аргументы:
+
+    @jobs.task('posts.fan_out', max_attempts=5)
+    def fan_out(post_id):
+        ...
+
+    jobs.enqueue('posts.fan_out', post_id=post.pk, priority=10)
+
+Задачи ставятся в той же транзакции, что и данные, которые их
+породили, а выполняет их команда runworker. Обработчик забирает
+пачку задач одним атомарным UPDATE (SQLite) или через
+SELECT ... FOR UPDATE SKIP LOCKED (остальные СУБД), поэтому
+несколько обработчиков не получат одну и ту же задачу. Упавшая
+задача повторяется с экспоненциальной задержкой, пока не кончатся
+попытки. Выполненные и упавшие задачи хранятся JOB_RETENTION_DAYS
+дней, потом их удаляет purge_finished() (runworker вызывает её вместе
+с метриками).
+"""
+import json
+import logging
+import random
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import (
+    Avg, Count, DurationField, ExpressionWrapper, F, Min,
+)
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class Task:
+    def __init__(self, name, function, max_attempts, priority):
+        self.name = name
+        self.function = function
+        self.max_attempts = max_attempts
+        self.priority = priority
+
+    def __call__(self, **kwargs):
+        return self.function(**kwargs)
+
+    def delay(self, **kwargs):
+        return enqueue(self.name, **kwargs)
+
+
+def task(name, max_attempts=3, priority=0):
+    """Регистрирует функцию как фоновую задачу с именем name."""
+    def decorator(function):
+        registry[name] = Task(name, function, max_attempts, priority)
+        return registry[name]
+    return decorator
+
+
+def autodiscover():
+    """Импортирует модули tasks всех приложений."""
+    autodiscover_modules('tasks')
+
+
+def enqueue(task_name, *, priority=None, key=None, delay=0, **kwargs):
+    """Ставит задачу в очередь и возвращает Job.
+
+    Пока в очереди есть невыполненная задача с тем же key,
+    повторная постановка возвращает её, а не создаёт новую.
+    """
+    registered = registry[task_name]
+    job = Job(
+        task=task_name,
+        payload=json.dumps(kwargs, sort_keys=True),
+        priority=registered.priority if priority is None else priority,
+        max_attempts=registered.max_attempts,
+        idempotency_key=key,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    if key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return Job.objects.get(
+            idempotency_key=key, status__in=(Job.QUEUED, Job.RUNNING)
+        )
+    return job
+
+
+def backoff(attempts):
+    """Задержка перед повтором: 2^attempts * JOB_RETRY_DELAY ± 25%."""
+    delay = settings.JOB_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=delay * random.uniform(0.75, 1.25))
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи упавших обработчиков.
+
+    Задача, у которой кончились попытки, помечается упавшей: иначе
+    задача, которая роняет сам обработчик, повторялась бы вечно.
+    Возвращает число задач, вернувшихся в очередь.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        started_at__lt=now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT),
+    )
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, locked_by='', finished_at=now,
+        last_error='Обработчик не завершил задачу за JOB_LOCK_TIMEOUT',
+    )
+    if failed:
+        logger.error('Задач зависло окончательно: %s', failed)
+    return stale.update(status=Job.QUEUED, locked_by='')
+
+
+def purge_finished(batch_size=1000):
+    """Удаляет выполненные и упавшие задачи старше JOB_RETENTION_DAYS
+    пачками по batch_size. Возвращает число удалённых задач."""
+    finished = Job.objects.filter(
+        status__in=(Job.DONE, Job.FAILED),
+        finished_at__lt=timezone.now() - timedelta(
+            days=settings.JOB_RETENTION_DAYS
+        ),
+    )
+    deleted = 0
+    while True:
+        ids = list(finished.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += Job.objects.filter(pk__in=ids).delete()[0]
+
+
+def claim(worker, limit):
+    """Забирает до limit готовых задач для обработчика worker."""
+    now = timezone.now()
+    ready = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by(
+        '-priority', 'run_at', 'id'
+    )
+    token = f'{worker}:{uuid.uuid4().hex[:8]}'
+    claimed = dict(
+        status=Job.RUNNING, locked_by=token, started_at=now,
+        attempts=F('attempts') + 1,
+    )
+    if connection.vendor == 'sqlite':
+        # SQLite пишет одним писателем, поэтому UPDATE ... WHERE id IN
+        # (SELECT ... LIMIT n) атомарен; status=queued проверяется
+        # повторно на случай гонки между подзапросом и записью.
+        Job.objects.filter(
+            pk__in=ready.values('pk')[:limit], status=Job.QUEUED
+        ).update(**claimed)
+    else:
+        with transaction.atomic():
+            ids = list(
+                ready.select_for_update(skip_locked=True)
+                .values_list('pk', flat=True)[:limit]
+            )
+            Job.objects.filter(pk__in=ids).update(**claimed)
+    return list(
+        Job.objects.filter(locked_by=token, status=Job.RUNNING)
+        .order_by('-priority', 'run_at', 'id')
+    )
+
+
+def run(job):
+    """Выполняет задачу и записывает результат в Job."""
+    try:
+        registry[job.task](**json.loads(job.payload))
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + backoff(job.attempts)
+            logger.warning(
+                'Задача %s упала, повтор в %s', job, job.run_at
+            )
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+            logger.error('Задача %s упала окончательно', job)
+    else:
+        job.status = Job.DONE
+        job.finished_at = timezone.now()
+    job.locked_by = ''
+    job.save(update_fields=[
+        'status', 'run_at', 'finished_at', 'locked_by', 'last_error',
+    ])
+    return job
+
+
+def work_off(limit=100, worker='inline'):
+    """Выполняет готовые задачи в текущем потоке (для тестов и cron)."""
+    done = 0
+    while done < limit:
+        batch = claim(worker, min(limit - done, 10))
+        if not batch:
+            break
+        for job in batch:
+            run(job)
+        done += len(batch)
+    return done
+
+
+def metrics():
+    """Глубина очереди по состояниям, возраст старейшей готовой
+    задачи и среднее ожидание и время выполнения последних задач."""
+    now = timezone.now()
+    depth = dict(
+        Job.objects.order_by().values('status')
+        .annotate(total=Count('id')).values_list('status', 'total')
+    )
+    oldest = Job.objects.filter(
+        status=Job.QUEUED, run_at__lte=now
+    ).aggregate(oldest=Min('run_at'))['oldest']
+    recent = Job.objects.filter(
+        status=Job.DONE, finished_at__gte=now - timedelta(minutes=5)
+    ).order_by().aggregate(
+        wait=Avg(_duration('started_at', 'created')),
+        run=Avg(_duration('finished_at', 'started_at')),
+        total=Count('id'),
+    )
+    return {
+        'depth': {status: depth.get(status, 0) for status, _ in Job.STATUSES},
+        'oldest_seconds': (now - oldest).total_seconds() if oldest else 0.0,
+        'done_5m': recent['total'],
+        'wait_seconds': _seconds(recent['wait']),
+        'run_seconds': _seconds(recent['run']),
+    }
+
+
+def _duration(end, start):
+    return ExpressionWrapper(F(end) - F(start), output_field=DurationField())
+
+
+def _seconds(value):
+    if value is None:
+        return 0.0
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return value / 1e6
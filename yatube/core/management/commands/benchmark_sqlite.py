@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from core.benchmark import percentile
+
+CONFIGS = {
+    'django': {'ENGINE': 'django.db.backends.sqlite3'},
+    'tuned': {'ENGINE': 'core.db.sqlite3'},
+}
+
+SCHEMA = (
+    'CREATE TABLE bench_post ('
+    'id INTEGER PRIMARY KEY, author INTEGER, text TEXT, comments INTEGER)',
+    'CREATE INDEX bench_post_author ON bench_post (author, id)',
+    'CREATE TABLE bench_comment ('
+    'id INTEGER PRIMARY KEY, post INTEGER, text TEXT)',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite при одновременных '
+        'чтении и записи: стандартный бэкенд против core.db.sqlite3'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument(
+            '--config', action='append', choices=CONFIGS,
+            help='Какие настройки мерить (по умолчанию все)',
+        )
+
+    def handle(self, *args, readers, writers, seconds, rows, config,
+               **options):
+        directory = tempfile.mkdtemp()
+        try:
+            for name in config or CONFIGS:
+                result = self.measure(
+                    name, os.path.join(directory, f'{name}.sqlite3'),
+                    readers, writers, seconds, rows,
+                )
+                self.stdout.write(
+                    f'{name:>8}: чтений {result["reads"] / seconds:8.0f}/с '
+                    f'(p99 {result["read_p99"] * 1000:6.1f} мс), '
+                    f'записей {result["writes"] / seconds:6.0f}/с '
+                    f'(p99 {result["write_p99"] * 1000:6.1f} мс), '
+                    f'ошибок {result["errors"]}'
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def measure(self, name, path, readers, writers, seconds, rows):
+        alias = f'benchmark_{name}'
+        connections.databases[alias] = {
+            **CONFIGS[name], 'NAME': path, 'CONN_MAX_AGE': None,
+        }
+        try:
+            self.populate(alias, rows)
+            stop = threading.Event()
+            results = {'read': [], 'write': [], 'errors': 0}
+            lock = threading.Lock()
+            threads = [
+                threading.Thread(
+                    target=self.worker,
+                    args=(alias, kind, stop, results, lock, rows),
+                )
+                for kind in ['read'] * readers + ['write'] * writers
+            ]
+            for thread in threads:
+                thread.start()
+            time.sleep(seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            connections[alias].close()
+            del connections.databases[alias]
+        return {
+            'reads': len(results['read']),
+            'writes': len(results['write']),
+            'read_p99': percentile(sorted(results['read']), 0.99),
+            'write_p99': percentile(sorted(results['write']), 0.99),
+            'errors': results['errors'],
+        }
+
+    def populate(self, alias, rows):
+        with connections[alias].cursor() as cursor:
+            for statement in SCHEMA:
+                cursor.execute(statement)
+        with transaction.atomic(using=alias):
+            with connections[alias].cursor() as cursor:
+                cursor.executemany(
+                    'INSERT INTO bench_post (author, text, comments) '
+                    'VALUES (%s, %s, 0)',
+                    [(i % 100, 'x' * 200) for i in range(rows)],
+                )
+
+    def worker(self, alias, kind, stop, results, lock, rows):
+        operation = self.read if kind == 'read' else self.write
+        timings = []
+        errors = 0
+        number = 0
+        try:
+            while not stop.is_set():
+                number += 1
+                started = time.perf_counter()
+                try:
+                    operation(alias, number % rows + 1)
+                except OperationalError:
+                    errors += 1
+                    continue
+                timings.append(time.perf_counter() - started)
+        finally:
+            connections[alias].close()
+        with lock:
+            results[kind].extend(timings)
+            results['errors'] += errors
+
+    def read(self, alias, post_id):
+        """Как страница профиля: пост автора и его лента."""
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                'SELECT author FROM bench_post WHERE id = %s', [post_id]
+            )
+            author = cursor.fetchone()[0]
+            cursor.execute(
+                'SELECT id, text, comments FROM bench_post '
+                'WHERE author = %s ORDER BY id DESC LIMIT 10', [author]
+            )
+            cursor.fetchall()
+
+    def write(self, alias, post_id):
+        """Как add_comment: комментарий и счётчик в одной транзакции."""
+        with transaction.atomic(using=alias):
+            with connections[alias].cursor() as cursor:
+                cursor.execute(
+                    'INSERT INTO bench_comment (post, text) VALUES (%s, %s)',
+                    [post_id, 'comment'],
+                )
+                cursor.execute(
+                    'UPDATE bench_post SET comments = comments + 1 '
+                    'WHERE id = %s', [post_id],
+                )
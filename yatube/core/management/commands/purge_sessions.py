@@ -0,0 +1,56 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+def purge(batch_size, pause):
+    """Удаляет истёкшие сессии пачками по batch_size, делая между
+    ними паузу, чтобы не держать блокировку записи. Возвращает
+    число удалённых сессий."""
+    now = timezone.now()
+    deleted = 0
+    while True:
+        keys = list(
+            Session.objects.filter(expire_date__lt=now)
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not keys:
+            return deleted
+        deleted += Session.objects.filter(pk__in=keys).delete()[0]
+        time.sleep(pause)
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет истёкшие сессии пачками — замена clearsessions, '
+        'которая удаляет всё одним запросом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--pause', type=float, default=0.05,
+            help='Пауза между пачками, секунд',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые столько секунд (по умолчанию один раз)',
+        )
+
+    def handle(self, *args, batch_size, pause, interval, **options):
+        try:
+            while True:
+                started = time.monotonic()
+                deleted = purge(batch_size, pause)
+                if options['verbosity'] > 0:
+                    self.stdout.write(
+                        f'Удалено сессий: {deleted}, '
+                        f'{time.monotonic() - started:.1f} с'
+                    )
+                if not interval:
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
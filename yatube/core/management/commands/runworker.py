@@ -0,0 +1,94 @@
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core import jobs
+
+
+def run_job(job):
+    try:
+        return jobs.run(job)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Обработчик фоновых задач core.jobs с пулом потоков'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=4,
+            help='Сколько задач выполнять одновременно',
+        )
+        parser.add_argument(
+            '--poll', type=float, default=1.0,
+            help='Пауза между опросами пустой очереди, секунд',
+        )
+        parser.add_argument(
+            '--stats-interval', type=float, default=60.0,
+            help='Как часто печатать метрики очереди, секунд',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и выйти',
+        )
+
+    def handle(self, *args, threads, poll, stats_interval, once, **options):
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        stopping = threading.Event()
+        handlers = {
+            signum: signal.signal(signum, lambda *args: stopping.set())
+            for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+        try:
+            self.work(worker, stopping, threads, poll, stats_interval, once)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+    def work(self, worker, stopping, threads, poll, stats_interval, once):
+        running = set()
+        processed = 0
+        next_stats = time.monotonic()
+        self.stdout.write(f'Обработчик {worker}, потоков: {threads}')
+        with ThreadPoolExecutor(threads, thread_name_prefix='job') as pool:
+            while not stopping.is_set():
+                if time.monotonic() >= next_stats:
+                    jobs.requeue_stale()
+                    jobs.purge_finished()
+                    self.write_metrics(processed)
+                    next_stats = time.monotonic() + stats_interval
+                free = threads - len(running)
+                batch = jobs.claim(worker, free) if free else []
+                running.update(pool.submit(run_job, job) for job in batch)
+                if running:
+                    done, running = wait(
+                        running, timeout=poll, return_when=FIRST_COMPLETED
+                    )
+                    running = set(running)
+                    processed += len(done)
+                elif once:
+                    break
+                else:
+                    stopping.wait(poll)
+            wait(running)
+        self.write_metrics(processed)
+
+    def write_metrics(self, processed):
+        metrics = jobs.metrics()
+        depth = ', '.join(
+            f'{status} {count}' for status, count in metrics['depth'].items()
+        )
+        self.stdout.write(
+            f'Выполнено: {processed}; очередь: {depth}; '
+            f'старейшая ждёт {metrics["oldest_seconds"]:.1f} с; '
+            f'за 5 мин: {metrics["done_5m"]}, ожидание '
+            f'{metrics["wait_seconds"]:.2f} с, выполнение '
+            f'{metrics["run_seconds"]:.2f} с'
+        )
@@ -0,0 +1,58 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def sync(alias):
+    """Копирует default в реплику alias через backup API SQLite.
+
+    Копия делается одной транзакцией на реплике: читатели реплики
+    ждут её через busy_timeout и видят либо старый, либо новый
+    снимок, но не смесь. Возвращает число страниц базы.
+    """
+    source = connections[DEFAULT_DB_ALIAS]
+    target = connections[alias]
+    for connection in (source, target):
+        if connection.vendor != 'sqlite':
+            raise CommandError(
+                f'{connection.alias}: реплики копируются только для SQLite'
+            )
+        connection.ensure_connection()
+    source.connection.backup(target.connection)
+    with source.cursor() as cursor:
+        cursor.execute('PRAGMA page_count')
+        return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует базу default в реплики из DATABASE_REPLICAS — '
+        'локальная замена репликации для двух файлов SQLite'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять каждые столько секунд (по умолчанию один раз)',
+        )
+
+    def handle(self, *args, interval, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('DATABASE_REPLICAS пуст')
+        try:
+            while True:
+                for alias in settings.DATABASE_REPLICAS:
+                    started = time.monotonic()
+                    pages = sync(alias)
+                    if options['verbosity'] > 0:
+                        self.stdout.write(
+                            f'{alias}: {pages} страниц за '
+                            f'{time.monotonic() - started:.2f} с'
+                        )
+                if not interval:
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
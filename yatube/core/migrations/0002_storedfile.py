@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Имя файла')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+            ],
+            options={
+                'verbose_name': 'Файл',
+                'verbose_name_plural': 'Файлы',
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_storedfile'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'finished_at'], name='job_finished_idx'),
+        ),
+    ]
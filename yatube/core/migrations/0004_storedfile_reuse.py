@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_job_finished_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedfile',
+            name='released_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последняя ссылка убрана'),
+        ),
+        migrations.AddField(
+            model_name='storedfile',
+            name='reused_at',
+            field=models.DateTimeField(blank=True, help_text='Повторная загрузка откладывает удаление файла', null=True, verbose_name='Загружен повторно'),
+        ),
+    ]
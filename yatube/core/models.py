@@ -0,0 +1,106 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """Фоновая задача в очереди core.jobs."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    task = models.CharField(max_length=200, verbose_name='Задача')
+    payload = models.TextField(default='{}', verbose_name='Аргументы (JSON)')
+    priority = models.SmallIntegerField(
+        default=0, verbose_name='Приоритет',
+        help_text='Задачи с большим приоритетом выполняются раньше',
+    )
+    status = models.CharField(
+        max_length=10, choices=STATUSES, default=QUEUED,
+        verbose_name='Состояние',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0, verbose_name='Попыток'
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        default=3, verbose_name='Максимум попыток'
+    )
+    idempotency_key = models.CharField(
+        max_length=255, blank=True, null=True,
+        verbose_name='Ключ идемпотентности',
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now, verbose_name='Не раньше'
+    )
+    created = models.DateTimeField(
+        auto_now_add=True, verbose_name='Создана'
+    )
+    started_at = models.DateTimeField(
+        null=True, blank=True, verbose_name='Начата'
+    )
+    finished_at = models.DateTimeField(
+        null=True, blank=True, verbose_name='Завершена'
+    )
+    locked_by = models.CharField(
+        max_length=100, blank=True, verbose_name='Обработчик'
+    )
+    last_error = models.TextField(blank=True, verbose_name='Ошибка')
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(
+                fields=['status', '-priority', 'run_at', 'id'],
+                name='job_claim_idx',
+            ),
+            models.Index(
+                fields=['status', 'finished_at'], name='job_finished_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['idempotency_key'],
+                condition=Q(status__in=('queued', 'running')),
+                name='job_unique_active_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.task} #{self.pk} ({self.status})'
+
+
+class StoredFile(models.Model):
+    """Файл в ContentAddressedStorage и число ссылок на него.
+
+    Одинаковые загрузки попадают в один файл, поэтому удалять его
+    можно, только когда на него не ссылается ни одна запись.
+    """
+    name = models.CharField(
+        max_length=255, primary_key=True, verbose_name='Имя файла'
+    )
+    refcount = models.PositiveIntegerField(
+        default=0, verbose_name='Ссылок'
+    )
+    created = models.DateTimeField(auto_now_add=True, verbose_name='Создан')
+    released_at = models.DateTimeField(
+        null=True, blank=True, verbose_name='Последняя ссылка убрана'
+    )
+    reused_at = models.DateTimeField(
+        null=True, blank=True, verbose_name='Загружен повторно',
+        help_text='Повторная загрузка откладывает удаление файла',
+    )
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
@@ -0,0 +1,108 @@
+"""Кеш целых страниц для анонимных посетителей.
+
+Вьюха, помеченная @cache_for_anonymous, сообщает через depends_on(),
+от каких версий в кеше (например, версий лент из posts.cache)
+зависит страница. Ответ сохраняется вместе с этими версиями;
+при следующем запросе они сверяются одним get_many, и если сигналы
+моделей успели увеличить хоть одну, страница рендерится заново.
+
+Кешируются только GET/HEAD без cookie сессии и CSRF и только ответы
+200 без Set-Cookie. Ответы получают ETag, а на If-None-Match
+приходит 304 без рендеринга. Last-Modified не ставится: секундной
+точности не хватает, чтобы отличить страницу до и после правки.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import quote_etag
+
+from core.replicas import cache_timeout
+
+PAGE_KEY = 'page:{digest}'
+
+
+def cache_for_anonymous(view):
+    """Разрешает кешировать ответы вьюхи для анонимных посетителей."""
+    view.cache_for_anonymous = True
+    return view
+
+
+def depends_on(request, key, version):
+    """Запоминает, что страница действительна, пока в кеше по key
+    лежит version."""
+    dependencies = getattr(request, 'page_dependencies', None)
+    if dependencies is not None:
+        dependencies[key] = version
+
+
+def page_key(request):
+    digest = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return PAGE_KEY.format(digest=digest)
+
+
+class AnonymousPageCacheMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.is_cacheable(request):
+            return self.get_response(request)
+        key = page_key(request)
+        entry = cache.get(key)
+        if entry is not None and self.is_fresh(entry):
+            response = HttpResponse(entry['content'], status=entry['status'])
+            for header, value in entry['headers']:
+                response[header] = value
+        else:
+            request.page_dependencies = {}
+            response = self.get_response(request)
+            if not self.store(key, request, response):
+                return response
+        return get_conditional_response(
+            request, etag=response['ETag'], response=response,
+        )
+
+    def is_cacheable(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if (settings.SESSION_COOKIE_NAME in request.COOKIES
+                or settings.CSRF_COOKIE_NAME in request.COOKIES):
+            return False
+        if not settings.PAGE_CACHE_ENABLED:
+            return False
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return getattr(match.func, 'cache_for_anonymous', False)
+
+    def is_fresh(self, entry):
+        dependencies = entry['dependencies']
+        return cache.get_many(list(dependencies)) == dependencies
+
+    def store(self, key, request, response):
+        """Сохраняет ответ; False, если ответ кешировать нельзя."""
+        if (response.status_code != 200 or response.streaming
+                or response.cookies or not request.page_dependencies):
+            return False
+        # ETag, который выставила сама вьюха (condition()), сохраняется
+        # как есть.
+        if not response.has_header('ETag'):
+            response['ETag'] = quote_etag(
+                hashlib.md5(response.content).hexdigest()
+            )
+        patch_vary_headers(response, ('Cookie',))
+        patch_cache_control(response, max_age=0)
+        cache.set(key, {
+            'dependencies': request.page_dependencies,
+            'status': response.status_code,
+            'content': response.content,
+            'headers': list(response.items()),
+        }, cache_timeout(settings.PAGE_CACHE_TIMEOUT))
+        return True
@@ -0,0 +1,119 @@
+"""Чтение лент с реплик базы данных.
+
+Вьюха, помеченная @read_from_replica, и списки объектов в админке
+читают с одного из алиасов DATABASE_REPLICAS; всё остальное, в том
+числе любая запись, идёт в default. Решение принимает ReplicaMiddleware
+и кладёт выбранную реплику в contextvar, а ReplicaRouter её оттуда
+берёт, поэтому вне запросов (команды, фоновые задачи) всё читается
+с default.
+
+Реплика отстаёт от default, поэтому после записи пользователь
+на REPLICA_STICKY_SECONDS получает cookie, и его запросы читают
+с default — свой пост он увидит сразу. Пока запрос что-то пишет
+или находится внутри transaction.atomic(), он тоже читает с default.
+
+Запись, сбросившая версию ленты, может опередить реплику, и страница,
+отрисованная с реплики, ляжет в кеш под новой версией. Поэтому кеш,
+который заполняет такой запрос, получает TTL из cache_timeout() —
+не больше REPLICA_CACHE_TIMEOUT.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'primary'
+
+current = ContextVar('replica', default=None)
+
+
+def read_from_replica(view):
+    """Разрешает вьюхе читать с реплики."""
+    view.read_from_replica = True
+    return view
+
+
+def cache_timeout(timeout):
+    """TTL для кеша, который заполняет текущий запрос."""
+    state = current.get()
+    if state is None or state.replica is None:
+        return timeout
+    if timeout is None:
+        return settings.REPLICA_CACHE_TIMEOUT
+    return min(timeout, settings.REPLICA_CACHE_TIMEOUT)
+
+
+class State:
+    """Куда читает текущий запрос и писал ли он."""
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = current.get()
+        if (state is None or state.replica is None or state.wrote
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = current.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Объект, прочитанный с реплики, — та же строка, что в default.
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема приезжает на реплику вместе с данными (sync_replicas).
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        state = State()
+        token = current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        if state.wrote or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = current.get()
+        if state is not None and self.is_read_only(request, view_func):
+            state.replica = random.choice(settings.DATABASE_REPLICAS)
+
+    def is_read_only(self, request, view_func):
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if PIN_COOKIE in request.COOKIES:
+            return False
+        if getattr(view_func, 'read_from_replica', False):
+            return True
+        match = request.resolver_match
+        return (
+            match is not None and match.app_name == 'admin'
+            and match.url_name.endswith('_changelist')
+        )
@@ -0,0 +1,405 @@
+"""Общий для всех воркеров кеш в файлах SQLite, без внешнего сервиса.
+
+LocMemCache у каждого процесса gunicorn свой: попадания делятся на
+число воркеров, одно и то же считается по нескольку раз, а сброс
+версии ленты виден только процессу, который его сделал. SQLiteCache
+хранит записи в каталоге LOCATION, общем для процессов одной машины:
+
+* ключи раскладываются по OPTIONS['SHARDS'] файлам по crc32 ключа
+  (встроенный hash() в каждом процессе свой), поэтому запись в один
+  файл не блокирует остальные; файлы в режиме WAL, читатели не ждут
+  писателя;
+* число записей (MAX_ENTRIES) и объём значений (MAX_SIZE, байт)
+  ограничены; счётчики ведут триггеры, так что проверка после записи —
+  чтение одной строки. При переполнении удаляются истёкшие записи,
+  затем 1/CULL_FREQUENCY записей, дольше всех не читавшихся (LRU);
+  время чтения обновляется не чаще раза в TOUCH_INTERVAL секунд,
+  чтобы чтения не превращались в записи;
+* целые числа хранятся как INTEGER, и incr() — один атомарный UPDATE,
+  поэтому версии лент и блокировки cache.add() работают между
+  процессами; get_many()/set_many() делают по запросу на файл;
+* ошибка SQLite при чтении — промах, а обновление времени чтения
+  не ждёт занятого файла и пропускается.
+
+С OPTIONS['LOCAL_ENTRIES'] > 0 перед файлами встаёт маленький LRU
+в памяти процесса: прочитанное значение отдаётся из него ещё
+LOCAL_TIMEOUT секунд. Свои записи и удаления процесс видит сразу,
+чужие — не позже чем через LOCAL_TIMEOUT, поэтому он должен быть
+коротким.
+"""
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .timing import TimedCacheMixin
+
+logger = logging.getLogger(__name__)
+
+PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+}
+
+SCHEMA = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE TABLE IF NOT EXISTS stats (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO stats VALUES (0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE stats SET entries = entries + 1, size = size + length(new.value);
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE stats SET entries = entries - 1, size = size - length(old.value);
+END;
+CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF value ON cache
+BEGIN
+    UPDATE stats SET size = size + length(new.value) - length(old.value);
+END;
+COMMIT;
+"""
+
+LIVE = '(expires IS NULL OR expires > ?)'
+UPSERT = (
+    'INSERT INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?) '
+    'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+    'expires = excluded.expires, accessed = excluded.accessed'
+)
+# Параметров в одном запросе у старых SQLite не больше 999.
+BATCH_SIZE = 500
+INTEGER_RANGE = range(-2 ** 63, 2 ** 63)
+
+# Локальный уровень общий для потоков процесса, как у LocMemCache.
+_local_tiers = {}
+_local_locks = {}
+
+
+def encode(value):
+    if type(value) is int and value in INTEGER_RANGE:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def decode(raw):
+    return raw if isinstance(raw, int) else pickle.loads(raw)
+
+
+def batches(keys):
+    keys = list(keys)
+    for start in range(0, len(keys), BATCH_SIZE):
+        yield keys[start:start + BATCH_SIZE]
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        options = {'MAX_ENTRIES': 10000, **params.get('OPTIONS', {})}
+        super().__init__({**params, 'OPTIONS': options})
+        self.location = location
+        self.shards = int(options.get('SHARDS', 8))
+        self.shard_entries = max(1, self._max_entries // self.shards)
+        max_size = options.get('MAX_SIZE')
+        self.shard_size = max_size and max(1, int(max_size) // self.shards)
+        self.touch_interval = float(options.get('TOUCH_INTERVAL', 60))
+        self.local_entries = int(options.get('LOCAL_ENTRIES', 0))
+        self.local_timeout = float(options.get('LOCAL_TIMEOUT', 1))
+        self._local = _local_tiers.setdefault(location, OrderedDict())
+        self._local_lock = _local_locks.setdefault(location, threading.Lock())
+        self._connections = {}
+        self._pid = os.getpid()
+
+    def _shard(self, key):
+        return zlib.crc32(key.encode()) % self.shards
+
+    def _by_shard(self, keys):
+        grouped = {}
+        for key in keys:
+            grouped.setdefault(self._shard(key), []).append(key)
+        return grouped.items()
+
+    def _connect(self, shard):
+        if self._pid != os.getpid():
+            # После fork соединения родителя использовать нельзя.
+            self._connections = {}
+            self._pid = os.getpid()
+        connection = self._connections.get(shard)
+        if connection is None:
+            os.makedirs(self.location, exist_ok=True)
+            connection = sqlite3.connect(
+                os.path.join(self.location, f'{shard}.sqlite3'),
+                timeout=PRAGMAS['busy_timeout'] / 1000,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            for pragma, value in PRAGMAS.items():
+                connection.execute(f'PRAGMA {pragma} = {value}')
+            connection.executescript(SCHEMA)
+            self._connections[shard] = connection
+        return connection
+
+    @contextmanager
+    def _write(self, shard):
+        """Транзакция, которая сразу берёт блокировку записи файла."""
+        connection = self._connect(shard)
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _cull(self, connection, now):
+        entries, size = connection.execute(
+            'SELECT entries, size FROM stats'
+        ).fetchone()
+        if not self._over_limit(entries, size):
+            return
+        if self._cull_frequency == 0:
+            connection.execute('DELETE FROM cache')
+            return
+        connection.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        while True:
+            entries, size = connection.execute(
+                'SELECT entries, size FROM stats'
+            ).fetchone()
+            if not self._over_limit(entries, size):
+                return
+            connection.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (max(1, entries // self._cull_frequency),),
+            )
+
+    def _over_limit(self, entries, size):
+        return entries > self.shard_entries or bool(
+            self.shard_size and size > self.shard_size
+        )
+
+    def _remember(self, key, raw, expires):
+        if not self.local_entries:
+            return
+        local_expires = time.time() + self.local_timeout
+        if expires is not None:
+            local_expires = min(local_expires, expires)
+        with self._local_lock:
+            self._local[key] = (raw, local_expires)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_entries:
+                self._local.popitem(last=False)
+
+    def _recall(self, key):
+        if not self.local_entries:
+            return None
+        with self._local_lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+        return entry
+
+    def _forget(self, keys):
+        if not self.local_entries:
+            return
+        with self._local_lock:
+            for key in keys:
+                self._local.pop(key, None)
+
+    def _fetch(self, shard, keys, now):
+        """Живые записи по ключам одного файла: {key: (raw, expires)}.
+
+        Ошибка SQLite (например, «database is locked») считается
+        промахом: сбой кеша не должен ронять страницу.
+        """
+        found, stale = {}, []
+        try:
+            connection = self._connect(shard)
+            for batch in batches(keys):
+                rows = connection.execute(
+                    f'SELECT key, value, expires, accessed FROM cache '
+                    f'WHERE key IN ({", ".join("?" * len(batch))}) '
+                    f'AND {LIVE}',
+                    (*batch, now),
+                )
+                for key, raw, expires, accessed in rows:
+                    found[key] = (raw, expires)
+                    if now - accessed >= self.touch_interval:
+                        stale.append((now, key))
+        except sqlite3.Error:
+            logger.warning('Кеш: файл %s не прочитан', shard, exc_info=True)
+            return {}
+        if stale:
+            self._touch_accessed(connection, stale)
+        return found
+
+    def _touch_accessed(self, connection, stale):
+        """Обновляет время чтения, не дожидаясь чужой записи: занят
+        файл — LRU обойдётся без этого обновления."""
+        connection.execute('PRAGMA busy_timeout = 0')
+        try:
+            connection.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?', stale
+            )
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            connection.execute(
+                f'PRAGMA busy_timeout = {PRAGMAS["busy_timeout"]}'
+            )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        raw, expires = encode(value), self.get_backend_timeout(timeout)
+        now = time.time()
+        with self._write(self._shard(key)) as connection:
+            added = connection.execute(
+                f'{UPSERT} WHERE cache.expires <= excluded.accessed',
+                (key, raw, expires, now),
+            ).rowcount == 1
+            if added:
+                self._cull(connection, now)
+        if added:
+            self._remember(key, raw, expires)
+        return added
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        entry = self._recall(key)
+        if entry is None:
+            entry = self._fetch(self._shard(key), [key], time.time()).get(key)
+            if entry is None:
+                return default
+            self._remember(key, *entry)
+        return decode(entry[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._forget([key])
+        now = time.time()
+        return self._connect(self._shard(key)).execute(
+            f'UPDATE cache SET expires = ?, accessed = ? '
+            f'WHERE key = ? AND {LIVE}',
+            (self.get_backend_timeout(timeout), now, key, now),
+        ).rowcount == 1
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def get_many(self, keys, version=None):
+        made = {}
+        for key in keys:
+            made_key = self.make_key(key, version=version)
+            self.validate_key(made_key)
+            made[made_key] = key
+        found, missing = {}, []
+        for made_key in made:
+            entry = self._recall(made_key)
+            if entry is None:
+                missing.append(made_key)
+            else:
+                found[made_key] = entry
+        now = time.time()
+        for shard, shard_keys in self._by_shard(missing):
+            for made_key, entry in self._fetch(shard, shard_keys, now).items():
+                found[made_key] = entry
+                self._remember(made_key, *entry)
+        return {made[key]: decode(raw) for key, (raw, _) in found.items()}
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        if self._recall(key) is not None:
+            return True
+        try:
+            return self._connect(self._shard(key)).execute(
+                f'SELECT 1 FROM cache WHERE key = ? AND {LIVE}',
+                (key, time.time()),
+            ).fetchone() is not None
+        except sqlite3.Error:
+            logger.warning('Кеш: ключ %s не прочитан', key, exc_info=True)
+            return False
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        with self._write(self._shard(key)) as connection:
+            updated = connection.execute(
+                f'UPDATE cache SET value = value + ?, accessed = ? '
+                f"WHERE key = ? AND {LIVE} AND typeof(value) = 'integer'",
+                (delta, now, key, now),
+            ).rowcount
+            if not updated:
+                raise ValueError(f"Key '{key}' not found")
+            value, expires = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+        self._remember(key, value, expires)
+        return value
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        rows = {}
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            rows[key] = encode(value)
+        expires, now = self.get_backend_timeout(timeout), time.time()
+        for shard, keys in self._by_shard(rows):
+            with self._write(shard) as connection:
+                connection.executemany(
+                    UPSERT, ((key, rows[key], expires, now) for key in keys)
+                )
+                self._cull(connection, now)
+        for key, raw in rows.items():
+            self._remember(key, raw, expires)
+        return []
+
+    def delete_many(self, keys, version=None):
+        made = []
+        for key in keys:
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            made.append(key)
+        self._forget(made)
+        for shard, shard_keys in self._by_shard(made):
+            with self._write(shard) as connection:
+                connection.executemany(
+                    'DELETE FROM cache WHERE key = ?',
+                    ((key,) for key in shard_keys),
+                )
+
+    def clear(self):
+        with self._local_lock:
+            self._local.clear()
+        for shard in range(self.shards):
+            self._connect(shard).execute('DELETE FROM cache')
+
+
+class TimedSQLiteCache(TimedCacheMixin, SQLiteCache):
+    pass
@@ -0,0 +1,118 @@
+"""Хранилище медиафайлов с адресацией по содержимому.
+
+Файл сохраняется под именем из SHA-256 содержимого и раскладывается
+по вложенным каталогам: posts/ab/cd/abcd....png. Повторная загрузка
+той же картинки не пишет новый файл, а миниатюры sorl, которые
+зависят от имени исходника, переиспользуются.
+
+Сколько записей ссылается на файл, хранит StoredFile; acquire() и
+release() вызываются сигналами моделей, а когда ссылок не остаётся,
+фоновая задача удаляет файл вместе с миниатюрами.
+
+Повторная загрузка уже сохранённого файла ссылку ещё не берёт (это
+сделает post_save модели), поэтому _save() отмечает её в reused_at.
+delete_unused() проверяет отметку под блокировкой строки и не удаляет
+файл, загруженный после последней release(), пока не пройдёт
+STORAGE_REUSE_GRACE секунд.
+"""
+import logging
+import os
+import posixpath
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+from sorl import thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from . import jobs
+from .files import digest
+from .models import StoredFile
+
+logger = logging.getLogger(__name__)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, content):
+        content_hash, _ = digest(content)
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name), content_hash[:2], content_hash[2:4],
+            content_hash + extension,
+        )
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        # Отметка ждёт уже идущего удаления (оно держит строку) или
+        # откладывает ещё не начатое.
+        with transaction.atomic():
+            reused = StoredFile.objects.filter(name=name).update(
+                reused_at=timezone.now()
+            )
+        if reused or self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+def acquire(name):
+    """Добавляет ссылку на файл."""
+    if StoredFile.objects.filter(name=name).update(
+        refcount=F('refcount') + 1
+    ):
+        return
+    try:
+        with transaction.atomic():
+            StoredFile.objects.create(name=name, refcount=1)
+    except IntegrityError:
+        acquire(name)
+
+
+def release(name):
+    """Убирает ссылку на файл; после последней удаление файла
+    с миниатюрами ставится в очередь.
+
+    Файлы, загруженные до подсчёта ссылок, здесь не удаляются:
+    их убирает gc_media.
+    """
+    if StoredFile.objects.filter(name=name, refcount__gt=0).update(
+        refcount=F('refcount') - 1, released_at=timezone.now()
+    ):
+        jobs.enqueue('core.delete_unused_file', name=name, key=f'rm:{name}')
+
+
+def delete_unused(name):
+    """Удаляет файл и его миниатюры, если ссылок на него так и нет.
+
+    Если файл загрузили снова после последней release(), удаление
+    переносится на STORAGE_REUSE_GRACE секунд: за это время запись
+    с повторной загрузкой возьмёт ссылку.
+    """
+    now = timezone.now()
+    grace = timedelta(seconds=settings.STORAGE_REUSE_GRACE)
+    with transaction.atomic():
+        stored = StoredFile.objects.select_for_update().filter(
+            name=name, refcount=0
+        ).first()
+        if stored is None:
+            return False
+        if (stored.reused_at and stored.reused_at > now - grace
+                and stored.reused_at >= (stored.released_at or now)):
+            jobs.enqueue(
+                'core.delete_unused_file', name=name,
+                delay=grace.total_seconds(),
+            )
+            return False
+        try:
+            thumbnail.delete(ImageFile(name, default_storage))
+        except (SuspiciousFileOperation, OSError):
+            logger.exception('Файл %s не удалён', name)
+            return False
+        stored.delete()
+    return True
@@ -0,0 +1,13 @@
+from core import jobs, storage, thumbnails
+
+
+@jobs.task('core.generate_thumbnails')
+def generate_thumbnails(name):
+    timings = thumbnails.generate(name)
+    if None in timings.values():
+        raise RuntimeError(f'Не все миниатюры для {name} созданы')
+
+
+@jobs.task('core.delete_unused_file', priority=-5)
+def delete_unused_file(name):
+    storage.delete_unused(name)
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.template import Library
+
+from core import thumbnails
+
+register = Library()
+
+
+@register.inclusion_tag('includes/responsive_image.html')
+def responsive_image(image, alias, sizes=None, eager=False,
+                     css_class='card-img my-2'):
+    """<picture> с готовыми вариантами AVIF/WebP в srcset.
+
+    Размеры <img> берутся из геометрии алиаса (для оригинала — из
+    полей модели), чтобы страница не прыгала при загрузке. Первую
+    картинку ленты стоит грузить сразу (eager=True), остальные
+    грузятся лениво.
+    """
+    if not image:
+        return {'image': None}
+    geometry, _ = settings.THUMBNAIL_ALIASES[alias]
+    width, height = geometry.split('x')
+    thumbnail = thumbnails.prepared(image, alias)
+    if thumbnail is None:
+        # Пока миниатюры нет, отдаём оригинал с размерами, сохранёнными
+        # в модели при загрузке (если они есть), не открывая файл.
+        thumbnail = image
+        width = getattr(image.instance, 'image_width', None) or width
+        height = getattr(image.instance, 'image_height', None) or height
+    return {
+        'image': thumbnail,
+        'sources': [
+            (mime_type, ', '.join(
+                f'{thumbnail.url} {variant_width}w'
+                for variant_width, thumbnail in files
+            ))
+            for mime_type, files in thumbnails.prepared_sources(image, alias)
+        ],
+        'sizes': sizes or f'(max-width: {width}px) 100vw, {width}px',
+        'width': width,
+        'height': height,
+        'eager': eager,
+        'css_class': css_class,
+    }
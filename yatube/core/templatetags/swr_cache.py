@@ -0,0 +1,54 @@
+from django.core.cache.utils import make_template_fragment_key
+from django.template import (
+    Library, Node, TemplateSyntaxError, VariableDoesNotExist,
+)
+
+from core.cache import get_or_compute
+
+register = Library()
+
+
+class SwrCacheNode(Node):
+    def __init__(self, nodelist, expire_time_var, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.expire_time_var = expire_time_var
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        try:
+            expire_time = int(self.expire_time_var.resolve(context))
+        except (VariableDoesNotExist, ValueError, TypeError):
+            raise TemplateSyntaxError(
+                '"swr_cache" tag got a bad timeout: %r'
+                % self.expire_time_var.var
+            )
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        return get_or_compute(
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(context),
+            expire_time,
+        )
+
+
+@register.tag('swr_cache')
+def do_swr_cache(parser, token):
+    """Как {% cache %}, но через core.cache.get_or_compute: при
+    истечении фрагмент пересчитывает один запрос, остальные получают
+    прежнюю версию.
+
+    {% swr_cache [expire_time] [fragment_name] [var1] [var2] .. %}
+    """
+    nodelist = parser.parse(('endswr_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise TemplateSyntaxError(
+            '%r tag requires at least 2 arguments.' % tokens[0]
+        )
+    return SwrCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+    )
@@ -0,0 +1,15 @@
+import logging
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Тестам нужен настоящий рендер с контекстом шаблонов, поэтому
+    кеш страниц выключен; test_page_cache включает его сам. Время
+    миниатюр в выводе тестов не нужно."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.PAGE_CACHE_ENABLED = False
+        logging.getLogger('core.thumbnails').setLevel(logging.WARNING)
@@ -0,0 +1,79 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+User = get_user_model()
+
+
+class CachedUserTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='cached', password='old-password-1'
+        )
+        self.client.force_login(self.user)
+        self.url = reverse('posts:create_post')
+
+    def get(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        return response, ' '.join(query['sql'] for query in context)
+
+    def test_session_and_user_read_from_cache(self):
+        """Повторная страница не читает ни сессию, ни пользователя"""
+        self.get()
+        response, sql = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('django_session', sql)
+        self.assertNotIn('auth_user', sql)
+
+    def test_user_save_invalidates_cache(self):
+        """Сохранение пользователя сбрасывает его копию в кеше"""
+        self.get()
+        self.user.first_name = 'Новое имя'
+        self.user.save()
+        response, sql = self.get()
+        self.assertIn('auth_user', sql)
+        self.assertEqual(response.context['user'].first_name, 'Новое имя')
+
+    def test_password_change_logs_out_other_sessions(self):
+        """После смены пароля старая сессия больше не действует"""
+        self.get()
+        self.user.set_password('new-password-2')
+        self.user.save()
+        response, _ = self.get()
+        self.assertRedirects(
+            response, f'{reverse("users:login")}?next={self.url}'
+        )
+
+
+class PurgeSessionsTest(TestCase):
+    def create_session(self, expire_date):
+        store = SessionStore()
+        store.create()
+        Session.objects.filter(pk=store.session_key).update(
+            expire_date=expire_date
+        )
+
+    def test_expired_sessions_deleted_in_batches(self):
+        """purge_sessions удаляет только истёкшие сессии"""
+        now = timezone.now()
+        for days in range(5):
+            self.create_session(now - timedelta(days=days + 1))
+        self.create_session(now + timedelta(days=1))
+        out = StringIO()
+        call_command(
+            'purge_sessions', batch_size=2, pause=0, stdout=out
+        )
+        self.assertIn('Удалено сессий: 5', out.getvalue())
+        self.assertEqual(Session.objects.count(), 1)
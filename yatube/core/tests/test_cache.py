@@ -0,0 +1,76 @@
+import time
+
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import LOCK_KEY, get_or_compute
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.calls
+
+
+class GetOrComputeTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.compute = Counter()
+
+    def expire(self, key):
+        value, expires, delta = cache.get(key)
+        cache.set(key, (value, time.time() - 1, delta))
+
+    def test_fresh_value_is_not_recomputed(self):
+        """Свежее значение отдаётся из кеша"""
+        for _ in range(3):
+            self.assertEqual(get_or_compute('k', self.compute, 60, 0), 1)
+        self.assertEqual(self.compute.calls, 1)
+
+    def test_expired_value_is_recomputed_by_lock_owner(self):
+        """Истёкшее значение пересчитывает тот, кто взял блокировку"""
+        get_or_compute('k', self.compute, 60)
+        self.expire('k')
+        self.assertEqual(get_or_compute('k', self.compute, 60), 2)
+        self.assertIsNone(cache.get(LOCK_KEY.format(key='k')))
+
+    def test_stale_value_while_revalidating(self):
+        """Пока другой запрос пересчитывает, отдаётся старое значение"""
+        get_or_compute('k', self.compute, 60)
+        self.expire('k')
+        cache.add(LOCK_KEY.format(key='k'), True, 60)
+        self.assertEqual(get_or_compute('k', self.compute, 60), 1)
+        self.assertEqual(self.compute.calls, 1)
+
+    def test_probabilistic_early_expiration(self):
+        """С большим beta значение пересчитывается до истечения"""
+        get_or_compute('k', self.compute, 60)
+        value, expires, delta = cache.get('k')
+        cache.set('k', (value, expires, 1.0))
+        self.assertEqual(get_or_compute('k', self.compute, 60, beta=0), 1)
+        self.assertEqual(get_or_compute('k', self.compute, 60, beta=1e9), 2)
+
+    @override_settings(CACHE_LOCK_TIMEOUT=1)
+    def test_cold_miss_waits_for_lock_owner(self):
+        """Без значения в кеше запрос ждёт блокировку, затем считает сам"""
+        cache.add(LOCK_KEY.format(key='k'), True, 1)
+        self.assertEqual(get_or_compute('k', self.compute, 60), 1)
+        self.assertEqual(self.compute.calls, 1)
+
+    def test_swr_cache_tag(self):
+        """Фрагмент шаблона кешируется с учётом vary_on"""
+        template = Template(
+            '{% load swr_cache %}'
+            '{% swr_cache 60 fragment key %}{{ value }}{% endswr_cache %}'
+        )
+        for key, value, expected in ((1, 'a', 'a'), (1, 'b', 'a'),
+                                     (2, 'b', 'b')):
+            with self.subTest(key=key, value=value):
+                self.assertEqual(
+                    template.render(Context({'key': key, 'value': value})),
+                    expected
+                )
@@ -0,0 +1,179 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+calls = []
+
+
+@jobs.task('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@jobs.task('tests.fail', max_attempts=2)
+def fail():
+    raise ValueError('boom')
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueued_job_runs_once(self):
+        """Задача выполняется обработчиком и помечается выполненной"""
+        job = jobs.enqueue('tests.record', value=1)
+        self.assertEqual(jobs.work_off(), 1)
+        self.assertEqual(calls, [1])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(jobs.work_off(), 0)
+
+    def test_idempotency_key(self):
+        """Пока задача в очереди, повтор с тем же ключом её возвращает"""
+        first = jobs.enqueue('tests.record', value=1, key='same')
+        second = jobs.enqueue('tests.record', value=2, key='same')
+        self.assertEqual(first.pk, second.pk)
+        jobs.work_off()
+        third = jobs.enqueue('tests.record', value=3, key='same')
+        self.assertNotEqual(third.pk, first.pk)
+
+    def test_priority_order(self):
+        """Задачи с большим приоритетом забираются первыми"""
+        jobs.enqueue('tests.record', value='low', priority=-1)
+        jobs.enqueue('tests.record', value='high', priority=5)
+        jobs.enqueue('tests.record', value='normal')
+        jobs.work_off()
+        self.assertEqual(calls, ['high', 'normal', 'low'])
+
+    def test_claimed_jobs_are_not_given_twice(self):
+        """Забранную задачу не получает другой обработчик"""
+        jobs.enqueue('tests.record', value=1)
+        self.assertEqual(len(jobs.claim('first', 10)), 1)
+        self.assertEqual(jobs.claim('second', 10), [])
+
+    def test_retry_with_backoff_then_fail(self):
+        """Упавшая задача повторяется позже, затем помечается ошибкой"""
+        job = jobs.enqueue('tests.fail')
+        with self.assertLogs('core.jobs', 'WARNING') as logs:
+            jobs.work_off()
+        self.assertIn('упала, повтор', logs.output[0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('boom', job.last_error)
+        self.assertEqual(jobs.work_off(), 0)
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR') as logs:
+            jobs.work_off()
+        self.assertIn(f'{job.task} #{job.pk}', logs.output[0])
+        self.assertIn('упала окончательно', logs.output[0])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    @override_settings(JOB_RETENTION_DAYS=7)
+    def test_old_finished_jobs_purged(self):
+        """purge_finished удаляет только давно завершённые задачи"""
+        old = jobs.enqueue('tests.record', value='old')
+        jobs.enqueue('tests.record', value='recent')
+        jobs.work_off()
+        queued = jobs.enqueue('tests.record', value='queued')
+        Job.objects.filter(pk=old.pk).update(
+            finished_at=timezone.now() - timezone.timedelta(days=8)
+        )
+        self.assertEqual(jobs.purge_finished(batch_size=1), 1)
+        self.assertEqual(Job.objects.count(), 2)
+        self.assertTrue(Job.objects.filter(pk=queued.pk).exists())
+
+    def test_stale_running_jobs_are_requeued(self):
+        """Задачи упавшего обработчика возвращаются в очередь"""
+        job = jobs.enqueue('tests.record', value=1)
+        jobs.claim('dead', 1)
+        Job.objects.update(started_at=timezone.now() - timezone.timedelta(
+            days=1
+        ))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        jobs.work_off()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+
+    def test_stale_job_without_attempts_left_fails(self):
+        """Зависшая задача с исчерпанными попытками не возвращается
+        в очередь"""
+        job = jobs.enqueue('tests.record', value=1)
+        Job.objects.update(attempts=2)
+        jobs.claim('dead', 1)
+        Job.objects.update(started_at=timezone.now() - timezone.timedelta(
+            days=1
+        ))
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertEqual(jobs.requeue_stale(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.locked_by, '')
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(jobs.work_off(), 0)
+
+
+class RunWorkerTest(TransactionTestCase):
+    """Пул потоков работает со своими соединениями, поэтому задачи
+    должны быть закоммичены."""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_runworker_once_and_metrics(self):
+        """runworker --once выполняет очередь и печатает метрики"""
+        for value in range(5):
+            jobs.enqueue('tests.record', value=value)
+        self.assertEqual(jobs.metrics()['depth'][Job.QUEUED], 5)
+        out = StringIO()
+        call_command('runworker', once=True, threads=2, stdout=out)
+        self.assertEqual(sorted(calls), list(range(5)))
+        self.assertIn('Выполнено: 5', out.getvalue())
+        metrics = jobs.metrics()
+        self.assertEqual(metrics['depth'][Job.DONE], 5)
+        self.assertEqual(metrics['done_5m'], 5)
+        self.assertIsInstance(metrics['run_seconds'], float)
+
+
+class QueuedWorkTest(TestCase):
+    def test_password_reset_mail_is_sent_by_worker(self):
+        """Письмо сброса пароля отправляет обработчик, а не запрос"""
+        User.objects.create_user(
+            username='forgetful', email='f@example.com', password='secret'
+        )
+        self.client.post(
+            reverse('users:password_reset_form'), {'email': 'f@example.com'}
+        )
+        self.assertEqual(len(mail.outbox), 0)
+        payload = Job.objects.get().payload
+        self.assertNotIn('/reset/', payload)
+        self.assertNotIn('token', payload)
+        jobs.work_off()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['f@example.com'])
+        self.assertIn('/reset/', mail.outbox[0].body)
+
+    @override_settings(TIMELINE_INLINE_FANOUT=0)
+    def test_large_fan_out_goes_to_queue(self):
+        """Раскладку поста популярного автора делает фоновая задача"""
+        author = User.objects.create_user(username='popular')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=author)
+        post = Post.objects.create(text='text', author=author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        jobs.work_off()
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=reader, post=post).exists()
+        )
@@ -0,0 +1,95 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve
+from django.utils.http import http_date
+
+from core.page_cache import AnonymousPageCacheMiddleware
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='page_author')
+        cls.post = Post.objects.create(text='Первый пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.rendered = 0
+        self.middleware = AnonymousPageCacheMiddleware(self.render)
+
+    def render(self, request):
+        self.rendered += 1
+        request.user = AnonymousUser()
+        match = resolve(request.path_info)
+        return match.func(request, *match.args, **match.kwargs)
+
+    def get(self, path, **headers):
+        return self.middleware(RequestFactory().get(path, **headers))
+
+    def test_second_request_served_from_cache(self):
+        """Повторный анонимный запрос не рендерит страницу"""
+        first = self.get('/')
+        second = self.get('/')
+        self.assertEqual(self.rendered, 1)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertIn('Cookie', second['Vary'])
+
+    def test_not_modified_without_rendering(self):
+        """Совпавший ETag даёт 304 без рендеринга"""
+        etag = self.get('/').get('ETag')
+        response = self.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.rendered, 1)
+
+    def test_only_etag_validates(self):
+        """Кешированная страница без Last-Modified, If-Modified-Since
+        не даёт 304"""
+        self.assertFalse(self.get('/').has_header('Last-Modified'))
+        response = self.get(
+            '/', HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 3600)
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_content_change_invalidates_page(self):
+        """Новый пост и комментарий сбрасывают зависящие страницы"""
+        self.get('/')
+        self.get(f'/posts/{self.post.pk}/')
+        Post.objects.create(text='Второй пост', author=self.author)
+        self.assertContains(self.get('/'), 'Второй пост')
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий'
+        )
+        self.assertContains(
+            self.get(f'/posts/{self.post.pk}/'), 'Комментарий'
+        )
+        self.assertEqual(self.rendered, 4)
+
+    def test_session_cookie_bypasses_cache(self):
+        """Посетителей с cookie сессии кеш не обслуживает"""
+        self.get('/', HTTP_COOKIE='sessionid=abc')
+        self.get('/', HTTP_COOKIE='sessionid=abc')
+        self.assertEqual(self.rendered, 2)
+
+    def test_full_stack_serves_cached_page(self):
+        """Через весь стек middleware второй запрос не рендерит шаблон"""
+        first = self.client.get('/')
+        second = self.client.get('/')
+        self.assertIsNotNone(first.context)
+        self.assertIsNone(second.context)
+        self.assertEqual(second.content, first.content)
+
+    @override_settings(PAGE_CACHE_ENABLED=False)
+    def test_disabled_by_setting(self):
+        """PAGE_CACHE_ENABLED = False выключает кеш страниц"""
+        self.get('/')
+        self.get('/')
+        self.assertEqual(self.rendered, 2)
@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.replicas import PIN_COOKIE
+from posts.models import Post
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Реплика — копия файла SQLite')
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_CACHE_TIMEOUT=0)
+class ReplicaRoutingTest(TransactionTestCase):
+    # backup API не копирует базу, пока на ней открыта транзакция,
+    # поэтому без обёртки TestCase.
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Алиас добавляется после super().setUpClass(), чтобы тест
+        # не закрыл к нему доступ.
+        cls.directory = tempfile.mkdtemp()
+        connections.databases['replica'] = {
+            **connections.databases['default'],
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+            'TEST': {},
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections.databases['replica']
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='replica_author')
+        Post.objects.create(text='Старый пост', author=self.author)
+        self.client.force_login(self.author)
+        self.sync()
+
+    def sync(self):
+        out = StringIO()
+        call_command('sync_replicas', stdout=out)
+        return out.getvalue()
+
+    def get(self, url):
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(url)
+        return response, len(replica)
+
+    def test_feed_read_from_replica(self):
+        """Лента читается с реплики и не видит несинхронизированный пост"""
+        Post.objects.create(text='Новый пост', author=self.author)
+        response, queries = self.get(reverse('posts:index'))
+        self.assertGreater(queries, 0)
+        self.assertNotContains(response, 'Новый пост')
+        self.assertContains(response, 'Старый пост')
+        self.sync()
+        self.assertContains(self.get(reverse('posts:index'))[0], 'Новый пост')
+
+    def test_reads_stick_to_primary_after_write(self):
+        """После записи пользователь читает с default и видит свой пост"""
+        response = self.client.post(
+            reverse('posts:create_post'), {'text': 'Свой пост'}
+        )
+        self.assertIn(PIN_COOKIE, response.cookies)
+        response, queries = self.get(
+            reverse('posts:profile', args=[self.author.username])
+        )
+        self.assertEqual(queries, 0)
+        self.assertContains(response, 'Свой пост')
+
+    def test_other_views_read_primary(self):
+        """Страницы без пометки читают с default"""
+        _, queries = self.get(reverse('posts:create_post'))
+        self.assertEqual(queries, 0)
+
+    def test_admin_changelist_read_from_replica(self):
+        """Список объектов в админке читается с реплики"""
+        self.author.is_staff = self.author.is_superuser = True
+        self.author.save()
+        self.sync()
+        response, queries = self.get(reverse('admin:posts_post_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(queries, 0)
+
+    def test_sync_reports_pages(self):
+        """sync_replicas копирует базу и сообщает её размер"""
+        self.assertRegex(self.sync(), r'^replica: \d+ страниц за ')
+
+
+class NoReplicasTest(TestCase):
+    def test_no_sticky_cookie_without_replicas(self):
+        """Без реплик cookie после записи не ставится"""
+        user = User.objects.create_user(username='no_replicas')
+        self.client.force_login(user)
+        response = self.client.post(
+            reverse('posts:create_post'), {'text': 'Пост'}
+        )
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_sync_requires_replicas(self):
+        """sync_replicas без реплик — ошибка"""
+        with self.assertRaises(CommandError):
+            call_command('sync_replicas', stdout=StringIO())
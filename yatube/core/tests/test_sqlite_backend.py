@@ -0,0 +1,64 @@
+import sqlite3
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from core.db.sqlite3.base import SQLiteCursorWrapper
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Бэкенд core.db.sqlite3')
+class SQLiteBackendTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_to_connection(self):
+        """На соединении выставлены PRAGMA из бэкенда"""
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+
+    def test_benchmark_compares_backends(self):
+        """Бенчмарк меряет оба бэкенда без ошибок блокировки"""
+        out = StringIO()
+        call_command(
+            'benchmark_sqlite', seconds=0.3, rows=200, readers=2, writers=2,
+            stdout=out,
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('tuned', lines[1])
+        self.assertIn('ошибок 0', lines[1])
+
+
+class LockRetryTest(SimpleTestCase):
+    def retry(self, in_atomic_block, failures):
+        database = mock.Mock(
+            in_atomic_block=in_atomic_block, lock_retries=3,
+            lock_retry_delay=0,
+        )
+        execute = mock.Mock(side_effect=[
+            *[sqlite3.OperationalError('database is locked')] * failures,
+            'done',
+        ])
+        cursor = SQLiteCursorWrapper.__new__(SQLiteCursorWrapper)
+        cursor.database = database
+        return cursor.retry(execute), execute.call_count
+
+    def test_locked_statement_retried(self):
+        """Запрос вне транзакции повторяется, пока база занята"""
+        self.assertEqual(self.retry(False, 2), ('done', 3))
+
+    def test_gives_up_after_retries(self):
+        """После lock_retries повторов ошибка пробрасывается"""
+        with self.assertRaises(sqlite3.OperationalError):
+            self.retry(False, 4)
+
+    def test_not_retried_inside_transaction(self):
+        """В транзакции повтор оставлен atomic()"""
+        with self.assertRaises(sqlite3.OperationalError):
+            self.retry(True, 1)
@@ -0,0 +1,145 @@
+import itertools
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.sqlite_cache import SQLiteCache
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def backend(self, **options):
+        """Ещё один «процесс»: своё соединение к тем же файлам."""
+        return SQLiteCache(self.directory, {'OPTIONS': options})
+
+    def test_shared_between_instances(self):
+        """Запись одного экземпляра видна другому, включая get_many"""
+        writer, reader = self.backend(), self.backend()
+        writer.set_many({f'key{number}': [number] for number in range(20)})
+        writer.set('none', None)
+        self.assertEqual(reader.get('key3'), [3])
+        self.assertEqual(
+            reader.get_many(['key1', 'key2', 'missing']),
+            {'key1': [1], 'key2': [2]},
+        )
+        self.assertIsNone(reader.get('none', 'default'))
+        reader.delete('key1')
+        self.assertFalse(writer.has_key('key1'))
+        reader.clear()
+        self.assertEqual(writer.get_many(['key2', 'key3']), {})
+
+    def test_expiry_add_and_touch(self):
+        """Истёкшая запись не читается, add() занимает только свободный
+        ключ"""
+        cache = self.backend()
+        cache.set('gone', 'value', 0)
+        self.assertIsNone(cache.get('gone'))
+        self.assertTrue(cache.add('gone', 'new'))
+        self.assertFalse(self.backend().add('gone', 'other'))
+        self.assertEqual(cache.get('gone'), 'new')
+        self.assertTrue(cache.touch('gone', 0))
+        self.assertFalse(cache.has_key('gone'))
+        self.assertFalse(cache.touch('missing'))
+
+    def test_incr_is_atomic_between_instances(self):
+        """incr() из нескольких соединений не теряет приращений"""
+        self.backend().set('counter', 0)
+
+        def work():
+            cache = self.backend()
+            for _ in range(50):
+                cache.incr('counter')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        cache = self.backend()
+        self.assertEqual(cache.get('counter'), 200)
+        self.assertEqual(cache.decr('counter', 10), 190)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+    def test_least_recently_read_evicted(self):
+        """При переполнении удаляется дольше всех не читавшаяся запись"""
+        cache = self.backend(SHARDS=1, MAX_ENTRIES=4, TOUCH_INTERVAL=0)
+        clock = itertools.count(time.time())
+        with mock.patch('core.sqlite_cache.time') as fake_time:
+            fake_time.time.side_effect = clock.__next__
+            for key in 'abcd':
+                cache.set(key, key)
+            cache.get('a')
+            cache.set('e', 'e')
+        self.assertEqual(
+            sorted(cache.get_many('abcde')), ['a', 'c', 'd', 'e']
+        )
+
+    def test_size_bounded(self):
+        """Объём значений в файле не превышает MAX_SIZE"""
+        cache = self.backend(SHARDS=1, MAX_SIZE=10000)
+        for number in range(20):
+            cache.set(f'blob{number}', b'x' * 1000)
+        entries, size = cache._connect(0).execute(
+            'SELECT entries, size FROM stats'
+        ).fetchone()
+        self.assertLessEqual(size, 10000)
+        self.assertEqual(
+            len(cache.get_many(f'blob{number}' for number in range(20))),
+            entries,
+        )
+        self.assertIsNotNone(cache.get('blob19'))
+
+    def test_local_tier(self):
+        """Локальный уровень отвечает без файла до LOCAL_TIMEOUT, свои
+        удаления видны сразу"""
+        cache = self.backend(LOCAL_ENTRIES=10, LOCAL_TIMEOUT=60)
+        other = self.backend()
+        cache.set('shared', 'old')
+        other.set('shared', 'new')
+        self.assertEqual(cache.get('shared'), 'old')
+        self.assertEqual(other.get('shared'), 'new')
+        cache.delete('shared')
+        self.assertIsNone(cache.get('shared'))
+        other.set('shared', 'new')
+        self.assertEqual(cache.get('shared'), 'new')
+        other.set('shared', 'newer')
+        self.assertEqual(cache.get('shared'), 'new')
+
+    def test_read_does_not_wait_for_writer(self):
+        """get() при чужой транзакции записи отдаёт значение сразу,
+        пропуская обновление времени чтения"""
+        cache = self.backend(SHARDS=1, TOUCH_INTERVAL=0)
+        cache.set('busy', 'value')
+        writer = sqlite3.connect(
+            os.path.join(self.directory, '0.sqlite3'), isolation_level=None
+        )
+        self.addCleanup(writer.close)
+        writer.execute('BEGIN IMMEDIATE')
+        try:
+            started = time.monotonic()
+            self.assertEqual(cache.get('busy'), 'value')
+            self.assertEqual(cache.get_many(['busy']), {'busy': 'value'})
+            self.assertLess(time.monotonic() - started, 1)
+        finally:
+            writer.execute('ROLLBACK')
+
+    def test_read_errors_are_misses(self):
+        """Ошибка SQLite при чтении — промах, а не исключение"""
+        cache = self.backend()
+        cache.set('key', 'value')
+        locked = sqlite3.OperationalError('database is locked')
+        with mock.patch.object(cache, '_connect', side_effect=locked), \
+                self.assertLogs('core.sqlite_cache', 'WARNING'):
+            self.assertEqual(cache.get('key', 'default'), 'default')
+            self.assertEqual(cache.get_many(['key']), {})
+            self.assertFalse(cache.has_key('key'))
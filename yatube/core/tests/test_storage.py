@@ -0,0 +1,101 @@
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import jobs, thumbnails
+from core.models import Job, StoredFile
+from posts.models import Post
+from .utils import TempMediaMixin, png
+
+User = get_user_model()
+
+
+class ContentAddressedStorageTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='storage_author')
+
+    def post(self, image):
+        return Post.objects.create(
+            text='text', author=self.author, image=image
+        )
+
+    def test_identical_uploads_share_one_sharded_file(self):
+        """Одинаковые загрузки хранятся одним файлом в подкаталогах"""
+        upload = png()
+        digest = hashlib.sha256(upload.read()).hexdigest()
+        first = self.post(upload)
+        second = self.post(png(name='copy.PNG'))
+        self.assertEqual(
+            first.image.name, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.png'
+        )
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(
+            default_storage.listdir(f'posts/{digest[:2]}/{digest[2:4]}')[1],
+            [f'{digest}.png'],
+        )
+        self.assertEqual(StoredFile.objects.get().refcount, 2)
+
+    def test_file_deleted_with_last_reference(self):
+        """Файл удаляется фоновой задачей после последней ссылки"""
+        first = self.post(png())
+        second = self.post(png())
+        name = first.image.name
+        first.delete()
+        jobs.work_off()
+        self.assertTrue(default_storage.exists(name))
+        second.delete()
+        jobs.work_off()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_reupload_after_last_release_keeps_file(self):
+        """Файл, загруженный снова до того, как новая запись взяла
+        ссылку, не удаляет уже поставленная задача"""
+        first = self.post(png())
+        name = first.image.name
+        first.delete()
+        # Повторная загрузка: файл уже сохранён, ссылки ещё нет.
+        self.assertEqual(default_storage.save('posts/again.png', png()), name)
+        jobs.work_off()
+        self.assertTrue(default_storage.exists(name))
+        second = self.post(name)
+        Job.objects.update(run_at=timezone.now())
+        jobs.work_off()
+        self.assertTrue(default_storage.exists(second.image.name))
+        self.assertEqual(StoredFile.objects.get(name=name).refcount, 1)
+
+    @override_settings(STORAGE_REUSE_GRACE=0)
+    def test_unclaimed_reupload_deleted_after_grace(self):
+        """Повторная загрузка без записи не держит файл дольше
+        STORAGE_REUSE_GRACE"""
+        first = self.post(png())
+        name = first.image.name
+        first.delete()
+        default_storage.save('posts/again.png', png())
+        jobs.work_off()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_replaced_image_is_released(self):
+        """Замена картинки убирает ссылку на прежнюю"""
+        post = self.post(png(color='red'))
+        old_name = post.image.name
+        post.image = png(color='blue')
+        post.save()
+        jobs.work_off()
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertEqual(
+            StoredFile.objects.get(name=post.image.name).refcount, 1
+        )
+
+    def test_thumbnails_reused_for_identical_sources(self):
+        """Миниатюры одинаковых картинок делаются один раз"""
+        first = self.post(png())
+        thumbnails.generate(first.image.name)
+        second = self.post(png())
+        self.assertIsNotNone(thumbnails.prepared(second.image, 'feed'))
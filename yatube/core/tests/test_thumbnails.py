@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+
+from core import thumbnails
+from posts.models import Post
+from .utils import TempMediaMixin, png
+
+User = get_user_model()
+ALIASES = {'feed': ('960x339', {'crop': 'center', 'upscale': True})}
+
+
+@override_settings(
+    THUMBNAIL_ALIASES=ALIASES,
+    THUMBNAIL_WIDTHS=(320, 640, 960),
+    THUMBNAIL_FORMATS=('AVIF', 'WEBP', 'NOSUCHFORMAT'),
+)
+class PreparedThumbnailTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='thumb_author')
+        cls.post = Post.objects.create(
+            text='text', author=author, image=png((1200, 800), color=None)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_generate_prepares_every_alias(self):
+        """generate() готовит все алиасы и варианты"""
+        timings = thumbnails.generate(self.post.image.name)
+        formats = [format_.lower() for format_ in thumbnails.formats()]
+        self.assertNotIn('nosuchformat', formats)
+        self.assertEqual(set(timings), {'feed'} | {
+            f'feed:{format_}:{width}'
+            for format_ in formats for width in (320, 640, 960)
+        })
+        self.assertNotIn(None, timings.values())
+        thumbnail = thumbnails.prepared(self.post.image, 'feed')
+        self.assertEqual(list(thumbnail.size), [960, 339])
+        self.assertNotEqual(thumbnail.url, self.post.image.url)
+
+    def test_responsive_image_lists_prepared_variants(self):
+        """responsive_image отдаёт srcset готовых вариантов"""
+        template = Template(
+            '{% load prepared_thumbnail %}'
+            "{% responsive_image post.image 'feed' eager=eager %}"
+        )
+        html = template.render(Context({'post': self.post}))
+        self.assertNotIn('<source', html)
+        self.assertIn(f'src="{self.post.image.url}"', html)
+        thumbnails.generate(self.post.image.name)
+        html = template.render(Context({'post': self.post}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('320w', html)
+        self.assertIn('960w', html)
+        self.assertIn('width="960" height="339"', html)
+        self.assertIn('loading="lazy"', html)
+        html = template.render(Context({'post': self.post, 'eager': True}))
+        self.assertNotIn('loading="lazy"', html)
+
+    def test_webp_variant_is_smaller(self):
+        """Узкий WebP-вариант заметно легче основной миниатюры"""
+        thumbnails.generate(self.post.image.name)
+        webp = dict(dict(thumbnails.prepared_sources(
+            self.post.image, 'feed'
+        ))['image/webp'])
+        fallback = thumbnails.prepared(self.post.image, 'feed')
+        self.assertLess(webp[640].size[0], fallback.size[0])
+        self.assertLess(
+            webp[640].storage.size(webp[640].name) * 2,
+            fallback.storage.size(fallback.name),
+        )
@@ -0,0 +1,60 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from core.timing import ServerTimingMiddleware
+
+User = get_user_model()
+
+
+class ServerTimingTest(TestCase):
+    def timed(self, view):
+        middleware = ServerTimingMiddleware(view)
+        return middleware(RequestFactory().get('/timed/'))
+
+    def metrics(self, response):
+        return dict(
+            (part.split(';')[0], part)
+            for part in response['Server-Timing'].split(', ')
+        )
+
+    def test_page_reports_db_template_and_total(self):
+        """Страница получает Server-Timing с SQL, шаблонами и итогом"""
+        metrics = self.metrics(self.client.get('/'))
+        self.assertIn('db', metrics)
+        self.assertIn('tpl', metrics)
+        self.assertTrue(metrics['total'].startswith('total;dur='))
+
+    def test_duplicates_and_cache_counted(self):
+        """Повторы SQL и операции кеша считаются"""
+        def view(request):
+            User.objects.filter(username='timing').exists()
+            User.objects.filter(username='timing').exists()
+            User.objects.filter(username='other').exists()
+            cache.get('timing')
+            cache.get_many(['timing', 'other'])
+            return HttpResponse()
+
+        metrics = self.metrics(self.timed(view))
+        self.assertEqual(metrics['dup'], 'dup;desc="1"')
+        self.assertTrue(metrics['db'].endswith('desc="3"'))
+        self.assertTrue(metrics['cache'].endswith('desc="2"'))
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0, SLOW_REQUEST_QUERIES=2)
+    def test_slow_request_logged_with_slowest_queries(self):
+        """Медленный запрос пишется в лог с самыми медленными SQL"""
+        def view(request):
+            for username in ('a', 'b', 'c'):
+                User.objects.filter(username=username).exists()
+            return HttpResponse()
+
+        with self.assertLogs('core.timing', 'WARNING') as logs:
+            self.timed(view)
+        report = json.loads(logs.records[0].getMessage().split(' ', 2)[2])
+        self.assertEqual(report['path'], '/timed/')
+        self.assertEqual(report['queries'], 3)
+        self.assertEqual(len(report['slowest']), 2)
+        self.assertEqual(report, logs.records[0].timing)
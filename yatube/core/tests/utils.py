@@ -0,0 +1,49 @@
+"""Общие заготовки для тестов с загрузкой картинок."""
+import io
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from PIL import Image
+
+
+def png(size=(40, 30), color='green', name='pic.png'):
+    """PNG для загрузки; с color=None — градиент, который сжимается
+    похоже на фотографию, а не в пару байт."""
+    if color is None:
+        image = Image.linear_gradient('L').resize(size).convert('RGB')
+    else:
+        image = Image.new('RGB', size, color)
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+class TempMediaMixin:
+    """MEDIA_ROOT во временном каталоге, который удаляется после
+    класса. Подмешивается перед TestCase, чтобы каталог был готов
+    к setUpClass/setUpTestData."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls._media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls._media_settings.enable()
+        try:
+            super().setUpClass()
+        except Exception:
+            cls._remove_media()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls._remove_media()
+
+    @classmethod
+    def _remove_media(cls):
+        cls._media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
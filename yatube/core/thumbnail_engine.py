@@ -0,0 +1,9 @@
+from PIL import Image
+from sorl.thumbnail.engines.pil_engine import Engine as PILEngine
+
+
+class Engine(PILEngine):
+    """PIL-движок sorl-thumbnail для Pillow 10+, где нет ANTIALIAS."""
+
+    def _scale(self, image, width, height):
+        return image.resize((width, height), resample=Image.LANCZOS)
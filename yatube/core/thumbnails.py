@@ -0,0 +1,157 @@
+"""Миниатюры, подготовленные заранее.
+
+Геометрии перечислены в settings.THUMBNAIL_ALIASES. Для каждого
+алиаса дополнительно готовятся варианты шириной THUMBNAIL_WIDTHS
+в форматах THUMBNAIL_FORMATS (те, что умеет установленный Pillow)
+для srcset. generate() делает все миниатюры картинки фоновой задачей
+сразу после загрузки, а шаблоны через prepared() и prepared_sources()
+только читают готовые записи из key-value store sorl-thumbnail
+и никогда не запускают PIL в запросе.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile
+
+from core import jobs
+
+logger = logging.getLogger(__name__)
+
+
+MIME_TYPES = {'AVIF': 'image/avif', 'WEBP': 'image/webp'}
+
+
+class PreparedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет искать миниатюру без генерации
+    и сохранять AVIF."""
+    extensions = {**EXTENSIONS, 'AVIF': 'avif'}
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        key = tokey(source.key, geometry_string, serialize(options))
+        return '%s%s/%s/%s.%s' % (
+            thumbnail_settings.THUMBNAIL_PREFIX, key[:2], key[2:4], key,
+            self.extensions[options['format']],
+        )
+
+    def _normalize(self, source, options):
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def get_prepared(self, file_, geometry_string, **options):
+        """Готовая миниатюра из key-value store или None."""
+        source = ImageFile(file_)
+        name = self._get_thumbnail_filename(
+            source, geometry_string, self._normalize(source, options)
+        )
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = PreparedThumbnailBackend()
+
+
+def formats():
+    """Форматы вариантов, которые поддерживает установленный Pillow."""
+    Image.init()
+    return [
+        format_ for format_ in settings.THUMBNAIL_FORMATS
+        if format_ in Image.SAVE
+    ]
+
+
+def variants(alias):
+    """Варианты алиаса для srcset: (формат, ширина, геометрия, опции)."""
+    geometry, options = settings.THUMBNAIL_ALIASES[alias]
+    width, height = map(int, geometry.split('x'))
+    for format_ in formats():
+        for variant_width in settings.THUMBNAIL_WIDTHS:
+            if variant_width > width:
+                continue
+            variant_height = round(height * variant_width / width)
+            yield (
+                format_, variant_width, f'{variant_width}x{variant_height}',
+                {**options, 'format': format_},
+            )
+
+
+def thumbnails_for(alias):
+    """Все миниатюры алиаса: (имя для лога, геометрия, опции)."""
+    geometry, options = settings.THUMBNAIL_ALIASES[alias]
+    yield alias, geometry, options
+    for format_, width, geometry, options in variants(alias):
+        yield f'{alias}:{format_.lower()}:{width}', geometry, options
+
+
+def prepared(image, alias):
+    """Готовая миниатюра картинки для алиаса или None."""
+    if not image:
+        return None
+    geometry, options = settings.THUMBNAIL_ALIASES[alias]
+    return backend.get_prepared(image, geometry, **options)
+
+
+def prepared_sources(image, alias):
+    """Готовые варианты для <source>: [(MIME-тип, [(ширина, файл)])]."""
+    sources = {}
+    for format_, width, geometry, options in variants(alias):
+        thumbnail = backend.get_prepared(image, geometry, **options)
+        if thumbnail is not None:
+            sources.setdefault(format_, []).append((width, thumbnail))
+    return [
+        (MIME_TYPES[format_], files) for format_, files in sources.items()
+    ]
+
+
+def generate(name):
+    """Делает все миниатюры картинки; возвращает время по вариантам.
+
+    Неудавшиеся варианты пишутся в лог и получают None.
+    """
+    # Исходник лежит в хранилище модели, а не в хранилище миниатюр.
+    source = ImageFile(name, default_storage)
+    timings = {}
+    started = time.monotonic()
+    for alias in settings.THUMBNAIL_ALIASES:
+        for variant, geometry, options in thumbnails_for(alias):
+            variant_started = time.monotonic()
+            try:
+                backend.get_thumbnail(source, geometry, **options)
+            except Exception:
+                logger.exception(
+                    'Миниатюра %s для %s не создана', variant, name
+                )
+                timings[variant] = None
+                continue
+            timings[variant] = time.monotonic() - variant_started
+            logger.info(
+                'Миниатюра %s для %s: %.1f мс',
+                variant, name, timings[variant] * 1000,
+            )
+    logger.info(
+        'Миниатюры для %s готовы за %.1f мс',
+        name, (time.monotonic() - started) * 1000,
+    )
+    return timings
+
+
+def schedule(image):
+    """Ставит генерацию миниатюр картинки в очередь фоновых задач."""
+    if image:
+        jobs.enqueue(
+            'core.generate_thumbnails', name=image.name,
+            key=f'thumbnails:{image.name}',
+        )
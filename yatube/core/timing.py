@@ -0,0 +1,206 @@
+"""Во что обходится запрос: время, SQL, шаблоны и кеш.
+
+ServerTimingMiddleware заводит на запрос объект Timing и кладёт его
+в contextvar; SQL считается через connection.execute_wrapper, время
+шаблонов — бэкендом TimedDjangoTemplates, время кеша — бэкендами
+с TimedCacheMixin. Итог уходит в заголовок Server-Timing, а запросы
+дольше SLOW_REQUEST_THRESHOLD пишутся в лог core.timing одной
+JSON-строкой с самыми медленными SQL и повторами.
+
+Накладные расходы — пара вызовов perf_counter на операцию, поэтому
+middleware можно держать включённым в продакшене.
+"""
+import heapq
+import json
+import logging
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import (
+    DjangoTemplates, Template, reraise,
+)
+
+logger = logging.getLogger(__name__)
+
+current = ContextVar('timing', default=None)
+
+
+class Timing:
+    """Счётчики одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self.counts = {}
+        self.slowest = []
+        self.statements = {}
+        self.active = set()
+
+    def add(self, metric, duration):
+        self.durations[metric] = self.durations.get(metric, 0.0) + duration
+        self.counts[metric] = self.counts.get(metric, 0) + 1
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.add('db', duration)
+            entry = (duration, len(self.statements), sql)
+            if len(self.slowest) < settings.SLOW_REQUEST_QUERIES:
+                heapq.heappush(self.slowest, entry)
+            else:
+                heapq.heappushpop(self.slowest, entry)
+            if not many:
+                # Одинаковый запрос к разным шардам — не повтор.
+                key = (context['connection'].alias, sql, repr(params))
+                self.statements[key] = self.statements.get(key, 0) + 1
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def duplicates(self):
+        """Одинаковые запросы с одинаковыми параметрами: [(sql, раз)]."""
+        return sorted(
+            ((sql, count) for (_, sql, _), count in self.statements.items()
+             if count > 1),
+            key=lambda item: -item[1],
+        )
+
+    def header(self, total):
+        metrics = [
+            f'{metric};dur={self.durations[metric] * 1000:.1f};'
+            f'desc="{self.counts[metric]}"'
+            for metric in ('db', 'tpl', 'cache') if metric in self.counts
+        ]
+        duplicated = sum(count - 1 for _, count in self.duplicates())
+        if duplicated:
+            metrics.append(f'dup;desc="{duplicated}"')
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+    def report(self, request, response, total):
+        return {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            **{
+                f'{metric}_ms': round(duration * 1000, 1)
+                for metric, duration in self.durations.items()
+            },
+            'queries': self.counts.get('db', 0),
+            'slowest': [
+                {'ms': round(duration * 1000, 1), 'sql': sql}
+                for duration, _, sql in sorted(self.slowest, reverse=True)
+            ],
+            'duplicates': [
+                {'count': count, 'sql': sql}
+                for sql, count in self.duplicates()
+            ],
+        }
+
+
+class measure:
+    """Добавляет время блока к метрике текущего запроса.
+
+    Вложенные блоки той же метрики (get_many, который зовёт get)
+    не считаются повторно.
+    """
+
+    def __init__(self, metric):
+        self.metric = metric
+
+    def __enter__(self):
+        self.timing = current.get()
+        if self.timing is None or self.metric in self.timing.active:
+            self.timing = None
+            return
+        self.timing.active.add(self.metric)
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.timing is not None:
+            self.timing.active.discard(self.metric)
+            self.timing.add(self.metric, time.perf_counter() - self.started)
+
+
+class ServerTimingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = Timing()
+        token = current.set(timing)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timing.record_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            current.reset(token)
+        total = timing.total
+        response['Server-Timing'] = timing.header(total)
+        if total >= settings.SLOW_REQUEST_THRESHOLD:
+            report = timing.report(request, response, total)
+            logger.warning(
+                'Медленный запрос %s', json.dumps(report, ensure_ascii=False),
+                extra={'timing': report},
+            )
+        return response
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with measure('tpl'):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django, который считает время рендеринга."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+CACHE_METHODS = (
+    'add', 'get', 'set', 'touch', 'delete', 'get_many', 'set_many',
+    'delete_many', 'has_key', 'incr', 'decr', 'clear',
+)
+
+
+class TimedCacheMixin:
+    """Считает время операций кеш-бэкенда в метрике cache."""
+
+
+def _timed(name):
+    def method(self, *args, **kwargs):
+        with measure('cache'):
+            return getattr(super(TimedCacheMixin, self), name)(
+                *args, **kwargs
+            )
+    method.__name__ = name
+    return method
+
+
+for _name in CACHE_METHODS:
+    setattr(TimedCacheMixin, _name, _timed(_name))
+
+
+class TimedLocMemCache(TimedCacheMixin, LocMemCache):
+    pass
@@ -0,0 +1,57 @@
+"""Загрузки с ограничением размера.
+
+Файл любого размера пишется кусками во временный файл, а не в
+память. Всё, что сверх UPLOAD_MAX_BYTES, отбрасывается: файл
+получает truncated=True, и check_image() отклоняет его, не читая.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.images import get_image_dimensions
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.truncated = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= settings.UPLOAD_MAX_BYTES:
+            return super().receive_data_chunk(raw_data, start)
+        if not self.truncated:
+            # Остаток запроса дочитывается, но никуда не пишется.
+            self.truncated = True
+            self.file.seek(0)
+            self.file.truncate()
+        return None
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.truncated = self.truncated
+        return file
+
+
+def check_image(upload):
+    """Проверяет загруженную картинку по размеру файла и заголовку,
+    не декодируя её; при нарушении лимитов бросает ValidationError."""
+    if getattr(upload, 'truncated', False) or (
+        upload.size > settings.UPLOAD_MAX_BYTES
+    ):
+        raise ValidationError(
+            'Файл больше %(limit)s.', code='too_large',
+            params={'limit': filesizeformat(settings.UPLOAD_MAX_BYTES)},
+        )
+    width, height = get_image_dimensions(upload)
+    if width and height and width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка %(width)s×%(height)s слишком большая, допустимо '
+            'не больше %(limit)s мегапикселей.',
+            code='too_many_pixels',
+            params={
+                'width': width, 'height': height,
+                'limit': settings.IMAGE_MAX_PIXELS // 1_000_000,
+            },
+        )
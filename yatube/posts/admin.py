@@ -1,5 +1,7 @@
 from django.contrib import admin
+
 from .models import Group, Post, Follow, Comment
+from .search import SearchResults, is_supported
 
 
 @admin.register(Post)
@@ -16,6 +18,19 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        results = SearchResults(search_term)
+        if not (results.match and is_supported()):
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        # pk__in=RawSQL(...) даёт IN ((SELECT ...)), и SQLite берёт
+        # из подзапроса только первую строку.
+        sql, params = results.ids()
+        return queryset.extra(
+            where=[f'{Post._meta.db_table}.id IN ({sql})'], params=params
+        ), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
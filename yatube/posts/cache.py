@@ -0,0 +1,76 @@
+"""Версионированный кеш лент.
+
+Фрагменты лент кешируются под ключом, в который входит версия ленты.
+Сигналы моделей увеличивают версию, и следующий запрос просто
+не находит старый фрагмент, поэтому TTL можно держать большим.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import urlencode
+
+from core import page_cache, replicas
+
+VERSION_KEY = 'feed-version:{feed}:{scope}'
+POSITION_PARAMS = ('page', 'before', 'after')
+
+
+def _initial_version():
+    # Версия, вытесненная из кеша, не должна начаться заново с
+    # числа, под которым ещё могут лежать старые фрагменты.
+    return int(time.time() * 1000)
+
+
+def feed_version(feed, scope=''):
+    key = VERSION_KEY.format(feed=feed, scope=scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), None)
+        version = cache.get(key, 0)
+    return version
+
+
+def bump_feed_version(feed, scope=''):
+    key = VERSION_KEY.format(feed=feed, scope=scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_version(), None)
+
+
+def feed_cache_key(request, feed, scope=''):
+    """Ключ фрагмента ленты: тип, группа/автор, версия и страница."""
+    position = urlencode([
+        (param, request.GET[param])
+        for param in POSITION_PARAMS if param in request.GET
+    ])
+    return f'{feed}:{scope}:{feed_version(feed, scope)}:{position}'
+
+
+def feed_count_key(feed, scope=''):
+    """Ключ числа постов в ленте для пагинатора."""
+    return f'feed-count:{feed}:{scope}:{feed_version(feed, scope)}'
+
+
+def comments_cache_key(post_id, cursor=''):
+    """Ключ фрагмента комментариев поста для страницы cursor."""
+    return f'{feed_version("comments", post_id)}:{cursor}'
+
+
+def depend_on_feed(request, feed, scope=''):
+    """Страница из кеша анонимных страниц сбрасывается вместе с лентой."""
+    page_cache.depends_on(
+        request, VERSION_KEY.format(feed=feed, scope=scope),
+        feed_version(feed, scope),
+    )
+
+
+def feed_cache_context(request, feed, scope=''):
+    depend_on_feed(request, feed, scope)
+    return {
+        'feed_cache_key': feed_cache_key(request, feed, scope),
+        'feed_cache_timeout': replicas.cache_timeout(
+            settings.FEED_CACHE_TIMEOUT
+        ),
+    }
@@ -0,0 +1,129 @@
+"""Валидаторы условных GET для лент и страницы поста.
+
+ETag складывается из версий лент (их увеличивают сигналы моделей
+при любом изменении постов, групп, подписок и комментариев),
+даты последнего поста или комментария и пользователя, для
+которого рендерится страница. Дата берётся одним запросом по индексу
+до основного queryset'а, и если клиент прислал совпадающий
+If-None-Match, вьюха не вызывается вовсе.
+
+Last-Modified не отдаётся: дата последнего поста не меняется при
+правке, удалении или подписке, и If-Modified-Since без ETag получал
+бы устаревший 304.
+
+С шардами (posts.sharding) посты лежат не в default, поэтому дата
+берётся отдельным запросом на каждом нужном шарде.
+"""
+import hashlib
+
+from django.db.models import OuterRef, Subquery
+from django.views.decorators.http import condition
+
+from . import sharding
+from .cache import feed_version
+from .models import Comment, Group, Post, TimelineEntry, User
+
+
+def conditional(validators):
+    """condition(), для которого validators(request, ...) возвращает
+    ETag страницы или None."""
+    return condition(etag_func=validators)
+
+
+def _latest(queryset, field='pub_date'):
+    return Subquery(queryset.order_by(f'-{field}').values(field)[:1])
+
+
+def _on_shards(queryset, author_ids=None):
+    """queryset на шардах с постами author_ids; без шардов — он сам,
+    и базу выбирают роутеры (например, реплика)."""
+    if not sharding.enabled():
+        return [queryset]
+    return [queryset.using(alias) for alias in sharding.shards_of(author_ids)]
+
+
+def _last_modified(posts, author_ids=None):
+    dates = [
+        queryset.order_by('-pub_date').values_list('pub_date', flat=True)
+        .first()
+        for queryset in _on_shards(posts, author_ids)
+    ]
+    return max(filter(None, dates), default=None)
+
+
+def _validators(request, last_modified, *feeds):
+    user = request.user.pk if request.user.is_authenticated else None
+    state = (
+        [feed_version(feed, scope) for feed, scope in feeds],
+        last_modified, user,
+    )
+    return hashlib.md5(repr(state).encode()).hexdigest()
+
+
+def index(request):
+    last_modified = _last_modified(Post.objects.all())
+    return _validators(request, last_modified, ('index', ''))
+
+
+def group(request, slug):
+    groups = Group.objects.filter(slug=slug)
+    if sharding.enabled():
+        # Подзапросом посты на другой базе не достать.
+        group_id = groups.values_list('pk', flat=True).first()
+        row = group_id and (
+            group_id, _last_modified(Post.objects.filter(group=group_id))
+        )
+    else:
+        row = groups.annotate(
+            last_modified=_latest(Post.objects.filter(group=OuterRef('pk')))
+        ).values_list('pk', 'last_modified').first()
+    if row is not None:
+        group_id, last_modified = row
+        return _validators(request, last_modified, ('group', group_id))
+
+
+def profile(request, username):
+    users = User.objects.filter(username=username)
+    if sharding.enabled():
+        author_id = users.values_list('pk', flat=True).first()
+        row = author_id and (author_id, _last_modified(
+            Post.objects.filter(author=author_id), [author_id]
+        ))
+    else:
+        row = users.annotate(
+            last_modified=_latest(Post.objects.filter(author=OuterRef('pk')))
+        ).values_list('pk', 'last_modified').first()
+    if row is not None:
+        author_id, last_modified = row
+        return _validators(request, last_modified, ('profile', author_id))
+
+
+def follow(request):
+    last_modified = (
+        TimelineEntry.objects.filter(user=request.user)
+        .order_by('-pub_date').values_list('pub_date', flat=True).first()
+    )
+    # Посты популярных авторов не раскладываются во входящие, но
+    # любой новый пост увеличивает версию общей ленты, а подписка
+    # и отписка — версию профиля читателя.
+    return _validators(
+        request, last_modified, ('index', ''), ('profile', request.user.pk)
+    )
+
+
+def post_detail(request, post_id):
+    # Комментарии лежат на шарде поста, так что подзапрос работает.
+    posts = Post.objects.filter(pk=post_id).annotate(
+        last_comment=_latest(
+            Comment.objects.filter(post=OuterRef('pk')), 'created'
+        )
+    ).values_list('author_id', 'pub_date', 'last_comment')
+    row = next(filter(None, (
+        queryset.first() for queryset in _on_shards(posts)
+    )), None)
+    if row is not None:
+        author_id, pub_date, last_comment = row
+        return _validators(
+            request, max(pub_date, last_comment or pub_date),
+            ('comments', post_id), ('profile', author_id),
+        )
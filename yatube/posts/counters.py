@@ -0,0 +1,97 @@
+"""Денормализованные счётчики: AuthorStats и Post.comment_count.
+
+Сигналы меняют их атомарными UPDATE ... SET x = x + 1 через F(),
+а rebuild_* пересчитывают пачками, если счётчики разошлись с данными
+(например, после bulk_create или ручных правок в базе).
+"""
+from collections import Counter
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F
+
+from . import sharding
+from .models import AuthorStats, Comment, Follow, Post
+
+
+def change_author_stats(user_id, **deltas):
+    """Атомарно прибавляет deltas к счётчикам пользователя.
+
+    Строка статистики создаётся только при увеличении: уменьшение
+    приходит и при каскадном удалении самого пользователя.
+    """
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    floor = {
+        f'{field}__gte': -delta for field, delta in deltas.items()
+        if delta < 0
+    }
+    stats = AuthorStats.objects.filter(user_id=user_id)
+    if stats.filter(**floor).update(**changes):
+        return
+    if all(delta > 0 for delta in deltas.values()):
+        AuthorStats.objects.get_or_create(user_id=user_id)
+        stats.update(**changes)
+
+
+def change_comment_count(post_id, delta, using=DEFAULT_DB_ALIAS):
+    Post.objects.using(using).filter(
+        pk=post_id, comment_count__gte=max(-delta, 0)
+    ).update(comment_count=F('comment_count') + delta)
+
+
+def _count_by(queryset, field, ids):
+    return dict(
+        queryset.filter(**{f'{field}__in': ids})
+        .order_by().values(field)
+        .annotate(total=Count('id'))
+        .values_list(field, 'total')
+    )
+
+
+def rebuild_author_stats(user_ids):
+    """Пересчитывает AuthorStats для пачки пользователей."""
+    posts = Counter()
+    for alias in sharding.aliases():
+        posts.update(
+            _count_by(Post.objects.using(alias), 'author', user_ids)
+        )
+    followers = _count_by(Follow.objects, 'author', user_ids)
+    following = _count_by(Follow.objects, 'user', user_ids)
+    stats = [
+        AuthorStats(
+            user_id=user_id,
+            post_count=posts.get(user_id, 0),
+            follower_count=followers.get(user_id, 0),
+            following_count=following.get(user_id, 0),
+        )
+        for user_id in user_ids
+    ]
+    AuthorStats.objects.bulk_create(stats, ignore_conflicts=True)
+    AuthorStats.objects.bulk_update(
+        stats, ['post_count', 'follower_count', 'following_count']
+    )
+
+
+def rebuild_comment_counts(post_ids, using=DEFAULT_DB_ALIAS):
+    """Пересчитывает Post.comment_count для пачки постов базы using."""
+    comments = _count_by(Comment.objects.using(using), 'post', post_ids)
+    Post.objects.using(using).bulk_update(
+        [
+            Post(pk=post_id, comment_count=comments.get(post_id, 0))
+            for post_id in post_ids
+        ],
+        ['comment_count'],
+    )
+
+
+def id_batches(queryset, batch_size):
+    """Id записей queryset'а пачками по batch_size, по возрастанию pk."""
+    last_id = 0
+    while True:
+        batch = list(
+            queryset.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
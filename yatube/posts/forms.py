@@ -1,5 +1,7 @@
 from django import forms
+from django.core.exceptions import ValidationError
 
+from core.uploads import check_image
 from .models import Post, Comment
 
 
@@ -8,6 +10,27 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ['text', 'group', 'image']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Слишком большая картинка отклоняется до того, как ImageField
+        # откроет её в Pillow: файл убирается из формы, а ошибку
+        # выдаёт clean_image().
+        self.image_error = None
+        name = self.add_prefix('image')
+        upload = self.files.get(name)
+        if upload:
+            try:
+                check_image(upload)
+            except ValidationError as error:
+                self.image_error = error
+                self.files = self.files.copy()
+                del self.files[name]
+
+    def clean_image(self):
+        if self.image_error is not None:
+            raise self.image_error
+        return self.cleaned_data['image']
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.files import image_metadata
+from posts import counters, sharding
+from posts.models import Post
+
+FIELDS = ('image_width', 'image_height', 'image_bytes', 'image_hash')
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет размеры, вес и хеш картинок постов, загруженных '
+        'до появления этих полей'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, batch_size, **options):
+        self.missing = 0
+        updated = 0
+        for alias in sharding.aliases():
+            pending = (
+                Post.objects.using(alias).exclude(image='')
+                .filter(image_hash='')
+            )
+            for batch in counters.id_batches(pending, batch_size):
+                posts = self.measure(
+                    Post.objects.using(alias).filter(pk__in=batch)
+                    .only('image')
+                )
+                with transaction.atomic(using=alias):
+                    Post.objects.using(alias).bulk_update(posts, FIELDS)
+                updated += len(posts)
+        self.stdout.write(self.style.SUCCESS(
+            f'Заполнено постов: {updated}, без файла: {self.missing}'
+        ))
+
+    def measure(self, posts):
+        """Посты, которым удалось заполнить поля картинки."""
+        measured = []
+        for post in posts:
+            try:
+                with post.image.open('rb') as file:
+                    metadata = image_metadata(file)
+            except (OSError, ValueError):
+                self.stderr.write(f'Нет файла {post.image.name}')
+                self.missing += 1
+                continue
+            for field, value in metadata.items():
+                setattr(post, field, value)
+            measured.append(post)
+        return measured
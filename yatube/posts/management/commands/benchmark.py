@@ -0,0 +1,98 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from core import benchmark
+from posts.models import AuthorStats, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон основных страниц: req/s, p50/p95/p99 '
+        'и число SQL-запросов; результат сохраняется как база '
+        'для сравнения. Сценарий add_comment пишет в базу.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Прогнать только указанные сценарии',
+        )
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--save', help='Сохранить результат в JSON')
+        parser.add_argument('--compare', help='Сравнить с сохранённым JSON')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый рост p95 при сравнении, доля',
+        )
+
+    def scenarios(self):
+        """Сценарии на самых нагруженных данных: популярный автор,
+        самый активный читатель и самый обсуждаемый пост."""
+        stats = AuthorStats.objects.select_related('user')
+        author = stats.order_by('-follower_count').first()
+        reader = stats.order_by('-following_count').first()
+        post = Post.objects.order_by('-comment_count', '-pk').first()
+        if not (author and reader and post):
+            raise CommandError('Нет данных: сначала запустите seed_data')
+        reader = reader.user
+        return [
+            benchmark.Scenario('index', 'get', reverse('posts:index')),
+            benchmark.Scenario(
+                'index_deep', 'get', reverse('posts:index'), {'page': 50}
+            ),
+            benchmark.Scenario(
+                'follow_index', 'get', reverse('posts:follow_index'),
+                user=reader,
+            ),
+            benchmark.Scenario(
+                'profile', 'get',
+                reverse('posts:profile', args=(author.user.username,)),
+            ),
+            benchmark.Scenario(
+                'post_detail', 'get',
+                reverse('posts:post_detail', args=(post.pk,)),
+            ),
+            benchmark.Scenario(
+                'add_comment', 'post',
+                reverse('posts:add_comment', args=(post.pk,)),
+                {'text': 'benchmark'}, reader,
+            ),
+        ]
+
+    def handle(self, *args, **options):
+        scenarios = self.scenarios()
+        if options['scenarios']:
+            scenarios = [
+                scenario for scenario in scenarios
+                if scenario.name in options['scenarios']
+            ]
+        results = {}
+        for scenario in scenarios:
+            result = benchmark.run_scenario(
+                scenario, options['requests'], options['warmup'],
+                options['host'],
+            )
+            results[scenario.name] = result
+            self.stdout.write(
+                f'{scenario.name:14} {result["rps"]:8} req/s  '
+                f'p50 {result["p50_ms"]:7} мс  p95 {result["p95_ms"]:7} мс  '
+                f'p99 {result["p99_ms"]:7} мс  '
+                f'запросов {result["queries"]} (макс. '
+                f'{result["max_queries"]})  коды {result["statuses"]}'
+            )
+        if options['save']:
+            benchmark.save(options['save'], results)
+            self.stdout.write(self.style.SUCCESS(
+                f'База сохранена в {options["save"]}'
+            ))
+        if options['compare']:
+            lines, regressions = benchmark.compare(
+                benchmark.load(options['compare']), results,
+                options['threshold'],
+            )
+            self.stdout.write('\n'.join(lines))
+            if regressions:
+                raise CommandError('Регрессии: ' + '; '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
@@ -0,0 +1,153 @@
+import heapq
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+
+from core import cleanup
+from posts import sharding
+from posts.models import Post
+
+
+def referenced_among(names):
+    """Имена из names, на которые ссылаются посты на любом шарде."""
+    used = set()
+    for alias in sharding.aliases():
+        used.update(
+            Post.objects.using(alias).filter(image__in=names)
+            .values_list('image', flat=True)
+        )
+    return used
+
+
+def referenced_names(chunk_size):
+    """Имена картинок постов со всех шардов по возрастанию."""
+    return heapq.merge(*(
+        Post.objects.using(alias).filter(image__startswith='posts/')
+        .order_by('image').values_list('image', flat=True)
+        .distinct().iterator(chunk_size=chunk_size)
+        for alias in sharding.aliases()
+    ))
+
+
+class Counter:
+    """Считает файлы и байты, прошедшие через поток."""
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+
+    def count(self, files):
+        for name, size in files:
+            self.files += 1
+            self.bytes += size
+            yield name, size
+
+    def add(self, files):
+        self.files += len(files)
+        self.bytes += sum(size for _, size in files)
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, на которые никто не ссылается, '
+        'и миниатюры sorl без исходников'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, ничего не удаляя',
+        )
+        parser.add_argument(
+            '--quarantine', metavar='DIR',
+            help='Переносить файлы в этот каталог вместо удаления',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Не трогать файлы моложе стольких секунд',
+        )
+
+    def handle(self, *args, dry_run, quarantine, batch_size, min_age,
+               **options):
+        self.verbosity = options['verbosity']
+        self.dry_run = dry_run
+        self.quarantine = quarantine
+        self.batch_size = batch_size
+        self.min_age = min_age
+        self.collect_sources()
+        self.collect_kvstore()
+        self.collect_thumbnails()
+
+    def collect_sources(self):
+        started = time.monotonic()
+        scanned = Counter()
+        referenced = referenced_names(self.batch_size)
+        files = scanned.count(
+            cleanup.walk(default_storage, 'posts', self.min_age)
+        )
+        found = Counter()
+        for batch in cleanup.batches(
+            cleanup.orphans(files, referenced), self.batch_size
+        ):
+            # Пока шёл обход, на файл мог сослаться новый пост
+            # с такой же картинкой.
+            used = referenced_among([name for name, _ in batch])
+            batch = [(name, size) for name, size in batch if name not in used]
+            found.add(batch)
+            names = [name for name, _ in batch]
+            self.log(names)
+            if not self.dry_run:
+                cleanup.remove_sources(names, self.quarantine)
+        self.report('Картинки постов', scanned, found, started)
+
+    def collect_kvstore(self):
+        started = time.monotonic()
+        found = Counter()
+        for sources in cleanup.stale_sources(
+            referenced_among, self.batch_size
+        ):
+            found.files += len(sources)
+            self.log([source.name for source in sources])
+            if not self.dry_run:
+                cleanup.forget_sources(sources)
+        self.report('Записи sorl без файлов', None, found, started)
+
+    def collect_thumbnails(self):
+        started = time.monotonic()
+        scanned = Counter()
+        found = Counter()
+        files = scanned.count(cleanup.walk(
+            default.storage, cleanup.thumbnail_prefix(), self.min_age
+        ))
+        for batch in cleanup.batches(files, self.batch_size):
+            orphans = cleanup.unregistered(batch)
+            found.add(orphans)
+            names = [name for name, _ in orphans]
+            self.log(names)
+            if not self.dry_run:
+                cleanup.remove_files(default.storage, names, self.quarantine)
+        self.report('Миниатюры', scanned, found, started)
+
+    def log(self, names):
+        if self.verbosity > 1:
+            for name in names:
+                self.stdout.write(name)
+
+    def report(self, label, scanned, found, started):
+        elapsed = time.monotonic() - started
+        action = (
+            'найдено' if self.dry_run
+            else 'в карантин' if self.quarantine else 'удалено'
+        )
+        line = f'{label}: {action} {found.files}'
+        if scanned is not None:
+            line += f' из {scanned.files}'
+        if found.bytes:
+            line += f', {found.bytes / 2 ** 20:.1f} МБ'
+        line += f', {elapsed:.1f} с'
+        if scanned is not None:
+            line += f', {scanned.files / max(elapsed, 1e-6):.0f} файлов/с'
+        self.stdout.write(line)
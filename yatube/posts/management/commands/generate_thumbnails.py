@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core import thumbnails
+from posts import sharding
+from posts.models import Post
+
+
+def generate(name):
+    try:
+        return thumbnails.generate(name)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Готовит миниатюры для всех картинок постов, у которых их нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, workers, **options):
+        # Одна и та же картинка может быть у постов на разных шардах.
+        names = [
+            name for name in dict.fromkeys(
+                name for database in sharding.aliases()
+                for name in Post.objects.using(database).exclude(image='')
+                .values_list('image', flat=True).distinct().iterator()
+            )
+            if any(
+                thumbnails.prepared(name, alias) is None
+                for alias in settings.THUMBNAIL_ALIASES
+            )
+        ]
+        failed = 0
+        with ThreadPoolExecutor(workers) as pool:
+            for name, timings in zip(names, pool.map(generate, names)):
+                failed += None in timings.values()
+                self.stdout.write(f'{name}: ' + ', '.join(
+                    f'{alias} {seconds * 1000:.0f} мс'
+                    if seconds is not None else f'{alias} ошибка'
+                    for alias, seconds in timings.items()
+                ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок обработано: {len(names)}, с ошибками: {failed}'
+        ))
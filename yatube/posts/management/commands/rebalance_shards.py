@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from posts import sharding
+from posts.models import Comment, Post, TimelineEntry
+
+
+def move_author(author_id, source, target, batch_size):
+    """Переносит посты автора и комментарии к ним с source на target.
+
+    Сначала строки с теми же id пишутся на target, потом удаляются
+    с source, поэтому при сбое посередине повторный запуск просто
+    доделает перенос. Сигналы не отправляются: счётчики, ссылки
+    на картинки и версии лент от переезда не меняются.
+    """
+    posts = Post.objects.using(source).filter(author_id=author_id)
+    comments = Comment.objects.using(source).filter(post__author_id=author_id)
+    post_rows, comment_rows = list(posts), list(comments)
+    with transaction.atomic(using=target):
+        Post.objects.using(target).bulk_create(
+            post_rows, batch_size, ignore_conflicts=True
+        )
+        Comment.objects.using(target).bulk_create(
+            comment_rows, batch_size, ignore_conflicts=True
+        )
+    with transaction.atomic(using=source):
+        if source == DEFAULT_DB_ALIAS:
+            # Входящие со ссылками на эти посты есть только в default.
+            TimelineEntry.objects.filter(
+                post__author_id=author_id
+            )._raw_delete(source)
+        comments._raw_delete(source)
+        posts._raw_delete(source)
+    return len(post_rows), len(comment_rows)
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит посты и комментарии авторов на шарды, которые им '
+        'назначает POST_SHARDS, в том числе из default'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать авторов, которых нужно перенести',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, dry_run, batch_size, **options):
+        if not sharding.enabled():
+            raise CommandError('POST_SHARDS пуст')
+        started = time.monotonic()
+        authors = posts = comments = 0
+        for source in {DEFAULT_DB_ALIAS, *sharding.shards_of()}:
+            misplaced = [
+                author_id for author_id in
+                Post.objects.using(source).order_by()
+                .values_list('author_id', flat=True).distinct()
+                if sharding.shard_for(author_id) != source
+            ]
+            for author_id in misplaced:
+                target = sharding.shard_for(author_id)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{author_id}: {source} -> {target}')
+                if not dry_run:
+                    moved = move_author(author_id, source, target, batch_size)
+                    posts += moved[0]
+                    comments += moved[1]
+            authors += len(misplaced)
+        action = 'нужно перенести' if dry_run else 'перенесено'
+        line = f'Авторов {action}: {authors}'
+        if not dry_run:
+            line += f', постов {posts}, комментариев {comments}'
+        self.stdout.write(f'{line}, {time.monotonic() - started:.1f} с')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters, sharding
+from posts.models import Post, User
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, подписок и комментариев пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько пользователей или постов пересчитывать за раз',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        users = posts = 0
+        for batch in counters.id_batches(User.objects.all(), batch_size):
+            with transaction.atomic():
+                counters.rebuild_author_stats(batch)
+            users += len(batch)
+        for alias in sharding.aliases():
+            for batch in counters.id_batches(
+                Post.objects.using(alias), batch_size
+            ):
+                with transaction.atomic(using=alias):
+                    counters.rebuild_comment_counts(batch, alias)
+                posts += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано: пользователей {users}, постов {posts}'
+        ))
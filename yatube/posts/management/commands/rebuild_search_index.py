@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.search import is_supported, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов (SQLite FTS5)'
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            raise CommandError('Полнотекстовый индекс есть только в SQLite')
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен'))
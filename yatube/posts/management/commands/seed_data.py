@@ -0,0 +1,226 @@
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+
+from posts import timeline
+from posts.models import Comment, Follow, Group, Post, User
+
+TEXT_POOL_SIZE = 1000
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Отключает auto_now_add, чтобы bulk_create сохранил свои даты."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def zipf_weights(count, alpha):
+    """Накопленные веса степенного распределения для random.choices."""
+    return list(itertools.accumulate(
+        1 / rank ** alpha for rank in range(1, count + 1)
+    ))
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими данными: пользователи, группы, '
+        'посты со степенным распределением авторства, подписки '
+        'и комментарии'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Сколько авторов читает пользователь в среднем',
+        )
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель степенного закона для авторов и подписок',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределить даты постов',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс имён пользователей и слагов групп',
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.texts = [
+            self.fake.paragraph(nb_sentences=3)
+            for _ in range(TEXT_POOL_SIZE)
+        ]
+
+        users = self.step('Пользователи', self.create_users, options)
+        groups = self.step('Группы', self.create_groups, options)
+        weights = zipf_weights(len(users), options['alpha'])
+        posts = self.step(
+            'Посты', self.create_posts, options, users, groups, weights
+        )
+        self.step('Подписки', self.create_follows, options, users, weights)
+        self.step('Комментарии', self.create_comments, options, users, posts)
+        self.step(
+            'Счётчики', call_command, 'rebuild_counters',
+            batch_size=self.batch_size, stdout=self.stdout,
+        )
+        self.step('Ленты подписок', self.rebuild_timelines, users)
+        cache.clear()
+
+    def step(self, title, function, *args, **kwargs):
+        started = time.monotonic()
+        result = function(*args, **kwargs)
+        self.stdout.write(
+            f'{title}: {time.monotonic() - started:.1f} с'
+        )
+        return result
+
+    def bulk_create(self, model, objects, **kwargs):
+        objects = iter(objects)
+        for batch in iter(
+            lambda: list(itertools.islice(objects, self.batch_size)), []
+        ):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, **kwargs)
+
+    def create_users(self, options):
+        prefix = options['prefix']
+        self.bulk_create(
+            User,
+            (
+                User(
+                    username=f'{prefix}_user{i}',
+                    first_name=self.fake.first_name(),
+                    last_name=self.fake.last_name(),
+                    password='!',
+                )
+                for i in range(options['users'])
+            ),
+            ignore_conflicts=True,
+        )
+        return list(
+            User.objects.filter(username__startswith=f'{prefix}_user')
+            .order_by('pk').values_list('pk', flat=True)
+        )
+
+    def create_groups(self, options):
+        prefix = options['prefix']
+        self.bulk_create(
+            Group,
+            (
+                Group(
+                    title=self.fake.catch_phrase()[:200],
+                    slug=f'{prefix}-group{i}',
+                    description=self.fake.sentence(),
+                )
+                for i in range(options['groups'])
+            ),
+            ignore_conflicts=True,
+        )
+        return list(
+            Group.objects.filter(slug__startswith=f'{prefix}-group')
+            .values_list('pk', flat=True)
+        )
+
+    def create_posts(self, options, users, groups, weights):
+        seconds = options['days'] * 24 * 3600
+        authors = self.random.choices(
+            users, cum_weights=weights, k=options['posts']
+        )
+        first_id = (Post.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0) + 1
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            self.bulk_create(Post, (
+                Post(
+                    text=self.random.choice(self.texts),
+                    author_id=author_id,
+                    group_id=(
+                        self.random.choice(groups)
+                        if groups and self.random.random() < 0.5 else None
+                    ),
+                    pub_date=self.now - timedelta(
+                        seconds=self.random.randrange(seconds)
+                    ),
+                )
+                for author_id in authors
+            ))
+        return list(
+            Post.objects.filter(pk__gte=first_id)
+            .order_by('-pub_date').values_list('pk', flat=True)
+        )
+
+    def create_follows(self, options, users, weights):
+        if len(users) < 2:
+            return
+
+        def follows():
+            for user_id in users:
+                count = min(
+                    int(self.random.expovariate(1 / options['follows'])),
+                    len(users) - 1,
+                )
+                authors = set()
+                candidates = self.random.choices(
+                    users, cum_weights=weights, k=count * 3
+                )
+                for author_id in candidates:
+                    if len(authors) == count:
+                        break
+                    if author_id != user_id:
+                        authors.add(author_id)
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self.bulk_create(Follow, follows(), ignore_conflicts=True)
+
+    def create_comments(self, options, users, posts):
+        if not posts:
+            return
+        weights = zipf_weights(len(posts), options['alpha'])
+        targets = self.random.choices(
+            posts, cum_weights=weights, k=options['comments']
+        )
+        with explicit_dates(Comment._meta.get_field('created')):
+            self.bulk_create(Comment, (
+                Comment(
+                    post_id=post_id,
+                    author_id=self.random.choice(users),
+                    text=self.fake.sentence(),
+                    created=self.now - timedelta(
+                        seconds=self.random.randrange(3600 * 24)
+                    ),
+                )
+                for post_id in targets
+            ))
+
+    def rebuild_timelines(self, users):
+        for user_id in users:
+            with transaction.atomic():
+                timeline.rebuild(user_id)
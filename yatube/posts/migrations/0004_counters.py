@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def count_by(model, field):
+    return dict(
+        model.objects.order_by().values(field)
+        .annotate(total=Count('id'))
+        .values_list(field, 'total')
+    )
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    Comment = apps.get_model('posts', 'Comment')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    posts = count_by(Post, 'author')
+    followers = count_by(Follow, 'author')
+    following = count_by(Follow, 'user')
+    AuthorStats.objects.bulk_create(
+        (
+            AuthorStats(
+                user_id=user_id,
+                post_count=posts.get(user_id, 0),
+                follower_count=followers.get(user_id, 0),
+                following_count=following.get(user_id, 0),
+            )
+            for user_id in User.objects.values_list('id', flat=True)
+        ),
+        batch_size=500,
+    )
+    for post_id, comments in count_by(Comment, 'post').items():
+        Post.objects.filter(pk=post_id).update(comment_count=comments)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0003_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('post_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('follower_count', models.PositiveIntegerField(db_index=True, default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
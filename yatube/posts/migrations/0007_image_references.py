@@ -0,0 +1,30 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def count_image_references(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    StoredFile = apps.get_model('core', 'StoredFile')
+    references = (
+        Post.objects.exclude(image='').order_by().values('image')
+        .annotate(total=Count('id')).values_list('image', 'total')
+    )
+    StoredFile.objects.bulk_create(
+        (StoredFile(name=name, refcount=total) for name, total in references),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_storedfile'),
+        ('posts', '0006_image_metadata'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            count_image_references, migrations.RunPython.noop
+        ),
+    ]
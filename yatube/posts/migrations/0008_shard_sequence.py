@@ -0,0 +1,20 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_image_references'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardSequence',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('next_id', models.BigIntegerField(verbose_name='Следующий свободный id')),
+            ],
+        ),
+    ]
@@ -1,8 +1,45 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .sharding import ShardQuerySetMixin, ShardedQuerySet, enabled, shards_of
+
 User = get_user_model()
 
+FEED_FIELDS = (
+    'text',
+    'pub_date',
+    'image',
+    'image_width',
+    'image_height',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'comment_count',
+    'group__slug',
+    'group__title',
+)
+
+
+class PostQuerySet(ShardQuerySetMixin, models.QuerySet):
+    def for_feed(self):
+        """Посты для ленты: автор и группа одним запросом,
+        без неиспользуемых в шаблонах колонок."""
+        return self.select_related('author', 'group').only(*FEED_FIELDS)
+
+    def across_shards(self, author_ids=None):
+        """Тот же запрос на всех шардах постов (или только на тех,
+        где лежат посты author_ids); без шардов — сам queryset."""
+        if not enabled():
+            return self
+        shards = shards_of(author_ids)
+        if not shards:
+            return self.none()
+        return ShardedQuerySet([self.using(alias) for alias in shards])
+
+
+class CommentQuerySet(ShardQuerySetMixin, models.QuerySet):
+    pass
+
 
 class Post(models.Model):
     text = models.TextField(
@@ -24,18 +61,52 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    # Заполняются сигналом один раз при загрузке, чтобы не открывать
+    # файл при показе: за одно чтение считаются и размеры, и объём,
+    # и хеш, а width_field/height_field дают только размеры.
+    image_width = models.PositiveIntegerField(
+        null=True, editable=False, verbose_name='Ширина картинки'
+    )
+    image_height = models.PositiveIntegerField(
+        null=True, editable=False, verbose_name='Высота картинки'
+    )
+    image_bytes = models.PositiveIntegerField(
+        null=True, editable=False, verbose_name='Размер картинки, байт'
+    )
+    image_hash = models.CharField(
+        max_length=64, blank=True, editable=False, db_index=True,
+        verbose_name='SHA-256 картинки',
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='posts',
         verbose_name='Автор'
     )
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Комментариев',
+    )
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:15]
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx',
+            ),
+            models.Index(fields=['-pub_date', '-id'], name='post_date_id_idx'),
+        ]
 
 
 class Group(models.Model):
@@ -70,6 +141,15 @@ class Comment(models.Model):
     )
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='comment_post_created_idx'
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -88,3 +168,76 @@ class Follow(models.Model):
         related_name='following',
         verbose_name='Автор',
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='follow_unique_user_author'
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост автора во входящих
+    у подписчика. pub_date дублирует Post.pub_date, чтобы лента
+    читалась одним диапазоном по индексу (user, -pub_date)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='timeline_unique_user_post'
+            ),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Счётчики пользователя, которые поддерживаются сигналами, чтобы
+    страницы не считали COUNT(*) при каждом показе."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    post_count = models.PositiveIntegerField(
+        default=0, verbose_name='Постов'
+    )
+    follower_count = models.PositiveIntegerField(
+        default=0, db_index=True, verbose_name='Подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписок'
+    )
+
+    def __str__(self):
+        return f'{self.user}'
+
+
+class ShardSequence(models.Model):
+    """Счётчик id модели, общий для всех шардов постов."""
+    name = models.CharField(max_length=100, primary_key=True)
+    next_id = models.BigIntegerField(verbose_name='Следующий свободный id')
+
+    def __str__(self):
+        return f'{self.name}: {self.next_id}'
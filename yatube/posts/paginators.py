@@ -0,0 +1,160 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from core.cache import get_or_compute
+from core.replicas import cache_timeout
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который берёт COUNT(*) из кеша по ключу count_key."""
+
+    def __init__(self, object_list, per_page, count_key, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        return get_or_compute(
+            self.count_key,
+            lambda: Paginator.count.func(self),
+            cache_timeout(settings.FEED_CACHE_TIMEOUT),
+        )
+
+
+class CursorPage:
+    """Страница ленты, построенная по курсору, без номера и COUNT(*).
+
+    Запрос выполняется при первом обращении к записям, поэтому
+    страница, отрисованная из кеша фрагментов, базу не трогает.
+    """
+    is_cursor = True
+
+    def __init__(self, paginator, fetch):
+        self.paginator = paginator
+        self._fetch = fetch
+
+    @cached_property
+    def _result(self):
+        return self._fetch()
+
+    @property
+    def object_list(self):
+        return self._result[0]
+
+    def __repr__(self):
+        return '<Cursor page of %s objects>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._result[1]
+
+    def has_previous(self):
+        return self._result[2]
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self):
+        if self.has_next():
+            return self.paginator.encode_cursor(self.object_list[-1])
+        return ''
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous():
+            return self.paginator.encode_cursor(self.object_list[0])
+        return ''
+
+
+class CursorPaginator:
+    """Keyset-пагинация по убыванию пары (дата, id).
+
+    Вместо OFFSET страница ищется по индексу от последней показанной
+    записи, поэтому глубина страницы не влияет на время запроса.
+    Ключи берутся из явной сортировки queryset'а (два поля по
+    убыванию, например ('-created', '-id')), по умолчанию
+    ('-pub_date', '-id'); допускаются и F('...').desc(). Ключи из
+    связанных моделей ('-timeline_entries__pub_date') аннотируются,
+    чтобы их значения можно было прочитать из объектов страницы.
+    """
+    is_cursor = True
+    default_ordering = ('-pub_date', '-id')
+
+    def __init__(self, queryset, per_page):
+        ordering = queryset.query.order_by or self.default_ordering
+        keys, annotations = [], {}
+        for position, field in enumerate(ordering):
+            if hasattr(field, 'expression'):
+                field = field.expression.name
+            field = field.lstrip('-')
+            if '__' in field:
+                annotations[f'cursor_{position}'] = F(field)
+                field = f'cursor_{position}'
+            keys.append(field)
+        self.keys = tuple(keys)
+        self.queryset = queryset.annotate(**annotations).order_by(
+            *(f'-{key}' for key in keys)
+        )
+        self.per_page = int(per_page)
+
+    def encode_cursor(self, obj):
+        date_key, id_key = self.keys
+        value = getattr(obj, date_key).isoformat()
+        return urlsafe_base64_encode(
+            force_bytes(f'{value}|{getattr(obj, id_key)}')
+        )
+
+    def decode_cursor(self, cursor):
+        """Возвращает (дата, id) или None для битого курсора."""
+        try:
+            value, pk = urlsafe_base64_decode(cursor).decode().split('|')
+            value, pk = parse_datetime(value), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            return None
+        if value is None:
+            return None
+        return value, pk
+
+    def _seek(self, position, older):
+        date_key, id_key = self.keys
+        value, pk = position
+        lookup = 'lt' if older else 'gt'
+        return self.queryset.filter(
+            Q(**{f'{date_key}__{lookup}': value})
+            | Q(**{date_key: value, f'{id_key}__{lookup}': pk})
+        )
+
+    def get_page(self, before=None, after=None):
+        """Страница записей старше `before` или новее `after`.
+
+        Без курсора (или с битым курсором) возвращает первую страницу.
+        """
+        before = before and self.decode_cursor(before)
+        after = not before and after and self.decode_cursor(after)
+        return CursorPage(self, lambda: self._fetch(before, after))
+
+    def _fetch(self, before, after):
+        if after:
+            rows = list(
+                self._seek(after, older=False)
+                .reverse()[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            return rows[:self.per_page][::-1], True, has_previous
+        queryset = self._seek(before, older=True) if before else self.queryset
+        rows = list(queryset[:self.per_page + 1])
+        return rows[:self.per_page], len(rows) > self.per_page, bool(before)
@@ -0,0 +1,167 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+posts_post_fts — external content таблица над posts_post: текст не
+дублируется, а индекс поддерживают триггеры на вставку, изменение
+и удаление поста. Триггеры пропадают, когда миграция пересоздаёт
+таблицу posts_post, поэтому ensure_search_index() вызывается после
+каждого migrate и создаёт недостающее.
+
+На других СУБД и с шардами постов (индекс есть только в default)
+поиск деградирует до icontains по всем шардам.
+"""
+import re
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from . import sharding
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+SNIPPET_TOKENS = 16
+HIGHLIGHT_START, HIGHLIGHT_END = '\x02', '\x03'
+
+SCHEMA = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text, content='posts_post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+        AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+        AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+        AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END""",
+)
+
+
+def is_supported(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def ensure_search_index(using=connection):
+    """Создаёт таблицу FTS5 и триггеры, если их ещё нет."""
+    if not is_supported(using):
+        return
+    with using.cursor() as cursor:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+
+
+def drop_search_index(using=connection):
+    if not is_supported(using):
+        return
+    with using.cursor() as cursor:
+        for suffix in ('insert', 'delete', 'update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def rebuild_search_index(using=connection):
+    """Перестраивает индекс целиком по содержимому posts_post."""
+    if not is_supported(using):
+        return
+    ensure_search_index(using)
+    with using.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+        )
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"
+        )
+
+
+def match_expression(query):
+    """Запрос пользователя в выражение MATCH: все слова, по префиксу.
+
+    Каждое слово берётся в кавычки, поэтому синтаксис FTS5 (OR, NEAR,
+    скобки) из пользовательского ввода не интерпретируется.
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(HIGHLIGHT_START, '<mark>')
+        .replace(HIGHLIGHT_END, '</mark>')
+    )
+
+
+class SearchResults:
+    """Найденные посты по релевантности с подсветкой в post.snippet.
+
+    Ведёт себя как последовательность для Paginator: count() и срезы
+    выполняются отдельными запросами к индексу, а посты страницы
+    дочитываются одним запросом по id.
+    """
+
+    def __init__(self, query):
+        self.match = match_expression(query)
+        self.query = query
+
+    def indexed(self):
+        return is_supported() and not sharding.enabled()
+
+    def count(self):
+        if not self.match:
+            return 0
+        if not self.indexed():
+            return self._fallback().count()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s',
+                [self.match],
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.match:
+            return []
+        if not self.indexed():
+            return list(self._fallback()[index])
+        offset = index.start or 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({FTS_TABLE}, 0, %s, %s, '…', %s) "
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                'ORDER BY rank LIMIT %s OFFSET %s',
+                [HIGHLIGHT_START, HIGHLIGHT_END, SNIPPET_TOKENS,
+                 self.match, index.stop - offset, offset],
+            )
+            rows = cursor.fetchall()
+        posts = Post.objects.for_feed().in_bulk([pk for pk, _ in rows])
+        results = []
+        for pk, snippet in rows:
+            if pk in posts:
+                posts[pk].snippet = highlight(snippet)
+                results.append(posts[pk])
+        return results
+
+    def _fallback(self):
+        return Post.objects.across_shards().for_feed().filter(
+            text__icontains=self.query
+        )
+
+    def ids(self):
+        """Подзапрос с id всех найденных постов (для админки)."""
+        return (
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [self.match],
+        )
@@ -0,0 +1,290 @@
+"""Шардирование постов и комментариев по автору.
+
+Если POST_SHARDS не пуст, посты автора лежат на алиасе
+shard_for(author_id), а комментарии — рядом со своим постом, поэтому
+страница поста и профиль читают один шард. Шард выбирается
+rendezvous-хешированием: при добавлении алиаса на него переезжает
+примерно 1/N авторов, остальные остаются на месте
+(rebalance_shards переносит именно их).
+
+* ShardRouter отправляет запросы Post и Comment на шард по подсказке
+  instance (сам пост, комментарий или автор в author.posts);
+* PostQuerySet.across_shards() возвращает ShardedQuerySet — один
+  и тот же запрос на нескольких шардах, страницы которого сливаются
+  heapq.merge по сортировке запроса; так читаются общая лента, лента
+  группы и подписок;
+* id постов и комментариев выдаёт allocate_id() блоками из счётчика
+  ShardSequence в default, чтобы они не пересекались между шардами.
+
+Пользователи, группы и всё остальное остаются в default, поэтому на
+шардах проверка внешних ключей выключается (OPTIONS['pragmas']),
+а select_related на автора и группу заменяется prefetch из default.
+
+Не шардируются: материализованные ленты (лента подписок собирается
+при чтении), индекс полнотекстового поиска (с шардами поиск идёт
+подстрокой по всем шардам) и админка постов — она видит только
+default. bulk_create постов id не получает и пишет в default.
+"""
+import hashlib
+import heapq
+import threading
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Max, prefetch_related_objects
+
+SHARDED_MODELS = ('posts.post', 'posts.comment')
+
+_blocks = {}
+_blocks_lock = threading.Lock()
+
+
+def enabled():
+    return bool(settings.POST_SHARDS)
+
+
+def aliases():
+    """Базы, где лежат посты: шарды или только default."""
+    return list(settings.POST_SHARDS) or [DEFAULT_DB_ALIAS]
+
+
+def _weight(alias, author_id):
+    return hashlib.md5(f'{alias}:{author_id}'.encode()).digest()
+
+
+def shard_for(author_id):
+    return max(
+        settings.POST_SHARDS, key=lambda alias: _weight(alias, author_id)
+    )
+
+
+def shards_of(author_ids=None):
+    """Шарды, на которых лежат посты author_ids (или все)."""
+    if author_ids is None:
+        return list(settings.POST_SHARDS)
+    shards = {shard_for(author_id) for author_id in author_ids}
+    return [alias for alias in settings.POST_SHARDS if alias in shards]
+
+
+def needs_prefetch(alias):
+    # На шардах нет пользователей и групп, JOIN к ним пуст.
+    return alias in settings.POST_SHARDS and alias != DEFAULT_DB_ALIAS
+
+
+def related_lookups(select_related, prefix=''):
+    """{'author': {'stats': {}}} -> ['author', 'author__stats']."""
+    lookups = []
+    for field, nested in select_related.items():
+        lookups.append(prefix + field)
+        lookups += related_lookups(nested, f'{prefix}{field}__')
+    return lookups
+
+
+class ShardQuerySetMixin:
+    """QuerySet, который создаёт объекты на шарде по роутеру и на
+    шарде подгружает связанные объекты из default вместо
+    select_related."""
+
+    def create(self, **kwargs):
+        # QuerySet.create() выбирает базу без подсказки instance,
+        # а шард зависит от автора создаваемого объекта.
+        if self._db is not None or not enabled():
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+    def _fetch_all(self):
+        if (self._result_cache is None
+                and isinstance(self.query.select_related, dict)
+                and needs_prefetch(self.db)):
+            lookups = related_lookups(self.query.select_related)
+            self.query.select_related = False
+            self._prefetch_related_lookups += tuple(lookups)
+        super()._fetch_all()
+
+
+def _model_label(obj):
+    return obj._meta.label_lower
+
+
+class ShardRouter:
+    def shard(self, model, instance):
+        if not enabled() or _model_label(model) not in SHARDED_MODELS:
+            return None
+        label = instance is not None and _model_label(instance)
+        if label == 'posts.post':
+            return shard_for(instance.author_id)
+        if label == 'posts.comment':
+            if instance._state.db in settings.POST_SHARDS:
+                return instance._state.db
+            if type(instance).post.is_cached(instance):
+                return shard_for(instance.post.author_id)
+        if (label == settings.AUTH_USER_MODEL.lower()
+                and _model_label(model) == 'posts.post'):
+            return shard_for(instance.pk)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self.shard(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        return self.shard(model, hints.get('instance'))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Пост на шарде ссылается на автора и группу в default.
+        if {obj1._state.db, obj2._state.db} & set(settings.POST_SHARDS):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # На шардах только таблицы постов и комментариев; RunPython
+        # миграций работает с данными default.
+        if needs_prefetch(db):
+            return f'{app_label}.{model_name}' in SHARDED_MODELS
+        return None
+
+
+class ShardedQuerySet:
+    """Один запрос на нескольких шардах.
+
+    Поддерживает то, что нужно пагинаторам: цепочки filter/order_by/...,
+    count(), get() и срезы. Срез [a:b] берёт первые b строк каждого
+    шарда и сливает их по сортировке запроса, поэтому глубокие
+    страницы дороже — для лент лучше курсорная пагинация.
+    """
+
+    def __init__(self, querysets):
+        self.querysets = querysets
+        self.model = querysets[0].model
+
+    def __repr__(self):
+        return f'<ShardedQuerySet of {len(self.querysets)} shards>'
+
+    @property
+    def query(self):
+        return self.querysets[0].query
+
+    @property
+    def ordered(self):
+        return all(queryset.ordered for queryset in self.querysets)
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def exists(self):
+        return any(queryset.exists() for queryset in self.querysets)
+
+    def first(self):
+        rows = self.fetch(0, 1)
+        return rows[0] if rows else None
+
+    def get(self, *args, **kwargs):
+        for queryset in self.querysets:
+            try:
+                return queryset.get(*args, **kwargs)
+            except self.model.DoesNotExist:
+                pass
+        raise self.model.DoesNotExist(
+            f'{self.model._meta.object_name} matching query does not exist.'
+        )
+
+    def ordering(self):
+        """Ключ и направление слияния по сортировке запроса."""
+        query = self.query
+        fields, descending = [], False
+        for position, field in enumerate(
+            query.order_by or query.get_meta().ordering
+        ):
+            if hasattr(field, 'expression'):
+                name, desc = field.expression.name, field.descending
+            else:
+                name, desc = field.lstrip('-'), field.startswith('-')
+            fields.append(name)
+            if position == 0:
+                descending = desc
+        if not query.standard_ordering:
+            descending = not descending
+        return fields and attrgetter(*fields), descending
+
+    def fetch(self, start, stop):
+        select_related = self.query.select_related
+        querysets = [
+            queryset.select_related(None)
+            if isinstance(select_related, dict) else queryset
+            for queryset in self.querysets
+        ]
+        if stop is not None:
+            querysets = [queryset[:stop] for queryset in querysets]
+        key, descending = self.ordering()
+        if key:
+            rows = heapq.merge(*querysets, key=key, reverse=descending)
+        else:
+            rows = (row for queryset in querysets for row in queryset)
+        rows = list(islice(rows, start, stop))
+        if isinstance(select_related, dict):
+            prefetch_related_objects(rows, *related_lookups(select_related))
+        return rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.fetch(index.start or 0, index.stop)
+        return self.fetch(index, index + 1)[0]
+
+    def __iter__(self):
+        return iter(self.fetch(0, None))
+
+    def __len__(self):
+        return len(self.fetch(0, None))
+
+
+CHAINED = (
+    'all', 'filter', 'exclude', 'annotate', 'order_by', 'reverse',
+    'select_related', 'prefetch_related', 'only', 'defer', 'for_feed',
+)
+
+
+def _chained(name):
+    def method(self, *args, **kwargs):
+        return ShardedQuerySet([
+            getattr(queryset, name)(*args, **kwargs)
+            for queryset in self.querysets
+        ])
+    method.__name__ = name
+    return method
+
+
+for _name in CHAINED:
+    setattr(ShardedQuerySet, _name, _chained(_name))
+
+
+def allocate_id(model):
+    """Следующий id для model, общий для всех шардов."""
+    label = _model_label(model)
+    with _blocks_lock:
+        next_id, end = _blocks.get(label, (0, 0))
+        if next_id >= end:
+            next_id, end = _reserve(model, label)
+        _blocks[label] = (next_id + 1, end)
+    return next_id
+
+
+def _reserve(model, label):
+    """Забирает из ShardSequence блок из POST_SHARD_ID_BLOCK id."""
+    from .models import ShardSequence
+
+    size = settings.POST_SHARD_ID_BLOCK
+    sequence = ShardSequence.objects.using(DEFAULT_DB_ALIAS)
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        if sequence.filter(name=label).update(next_id=F('next_id') + size):
+            end = sequence.get(name=label).next_id
+            return end - size, end
+        # Первый блок начинается после всех уже существующих id.
+        start = 1 + max(
+            model.objects.using(alias).aggregate(last=Max('pk'))['last'] or 0
+            for alias in {DEFAULT_DB_ALIAS, *settings.POST_SHARDS}
+        )
+        sequence.create(name=label, next_id=start + size)
+        return start, start + size
@@ -0,0 +1,177 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core import jobs, storage
+from core.files import image_metadata
+from . import counters, sharding, timeline
+from .cache import bump_feed_version
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    """Раскладывает новый пост по лентам подписчиков; большую
+    раскладку откладывает в фоновую задачу"""
+    if not created or sharding.enabled():
+        return
+    if timeline.is_large_fan_out(instance.author_id):
+        jobs.enqueue(
+            'posts.fan_out', post_id=instance.pk,
+            key=f'fan-out:{instance.pk}',
+        )
+    else:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    """Заполняет ленту постами нового автора подписки"""
+    if created and not sharding.enabled():
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    """Чистит ленту от постов автора после отписки"""
+    if not sharding.enabled():
+        timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Comment)
+def allocate_sharded_id(sender, instance, raw=False, **kwargs):
+    """На шардах id берётся из общего счётчика, а не из автоинкремента
+    своей базы"""
+    if sharding.enabled() and instance.pk is None and not raw:
+        instance.pk = sharding.allocate_id(sender)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_state(sender, instance, using, **kwargs):
+    """Запоминает прежние группу и картинку: ленту группы нужно
+    сбросить, а на картинку — убрать ссылку"""
+    if not instance._state.adding:
+        instance.previous_group_id, instance.previous_image = (
+            Post.objects.using(using).filter(pk=instance.pk)
+            .values_list('group_id', 'image').first() or (None, '')
+        )
+
+
+@receiver(pre_save, sender=Post)
+def store_image_metadata(sender, instance, raw=False, **kwargs):
+    """Запоминает размеры, вес и хеш новой картинки поста"""
+    if raw:
+        return
+    image = instance.image
+    if not image:
+        instance.image_width = instance.image_height = None
+        instance.image_bytes = None
+        instance.image_hash = ''
+    elif not image._committed:
+        for field, value in image_metadata(image.file).items():
+            setattr(instance, field, value)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    """Сбрасывает ленты, в которых виден пост"""
+    bump_feed_version('index')
+    bump_feed_version('profile', instance.author_id)
+    groups = {instance.group_id, getattr(instance, 'previous_group_id', None)}
+    for group_id in groups - {None}:
+        bump_feed_version('group', group_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    """Ссылки на группу есть в общей ленте и в ленте группы"""
+    bump_feed_version('index')
+    bump_feed_version('group', instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments(sender, instance, **kwargs):
+    """Сбрасывает кеш комментариев поста"""
+    bump_feed_version('comments', instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_counts(sender, instance, **kwargs):
+    """Число подписчиков и подписок видно на страницах профилей"""
+    bump_feed_version('profile', instance.author_id)
+    bump_feed_version('profile', instance.user_id)
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, created, **kwargs):
+    """Ссылки на файл картинки в хранилище с дедупликацией"""
+    previous = getattr(instance, 'previous_image', '')
+    if instance.image.name == previous:
+        return
+    if instance.image:
+        storage.acquire(instance.image.name)
+    if previous:
+        storage.release(previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    if instance.image:
+        storage.release(instance.image.name)
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_author_stats(instance.author_id, post_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_author_stats(instance.author_id, post_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_author_stats(instance.author_id, follower_count=1)
+        counters.change_author_stats(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_author_stats(instance.author_id, follower_count=-1)
+    counters.change_author_stats(instance.user_id, following_count=-1)
+
+
+@receiver(post_delete, sender=Follow)
+def backfill_demoted_author(sender, instance, **kwargs):
+    """Автор, только что опустившийся до TIMELINE_FANOUT_LIMIT
+    подписчиков, получает раскладку пропущенных постов"""
+    if not sharding.enabled() and AuthorStats.objects.filter(
+        user_id=instance.author_id,
+        follower_count=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists():
+        timeline.demote(instance.author_id)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, using, **kwargs):
+    if created:
+        counters.change_comment_count(instance.post_id, 1, using)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, using, **kwargs):
+    counters.change_comment_count(instance.post_id, -1, using)
@@ -0,0 +1,66 @@
+import posixpath
+
+from django.conf import settings
+from django.core.management import call_command
+
+from core import jobs, thumbnails
+from core.files import image_metadata, normalize_image
+from . import timeline
+from .models import Follow, Post
+
+IMAGE_FIELDS = ('image_width', 'image_height', 'image_bytes', 'image_hash')
+
+
+@jobs.task('posts.fan_out', max_attempts=5, priority=5)
+def fan_out(post_id):
+    post = Post.objects.across_shards().filter(pk=post_id).first()
+    if post is not None:
+        timeline.fan_out(post)
+
+
+@jobs.task('posts.backfill_followers', priority=-1)
+def backfill_followers(author_id):
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True
+    )
+    for user_id in followers.iterator():
+        timeline.backfill(user_id, author_id)
+
+
+@jobs.task('posts.rebuild_counters', max_attempts=1, priority=-10)
+def rebuild_counters(batch_size=1000):
+    call_command('rebuild_counters', batch_size=batch_size)
+
+
+@jobs.task('posts.normalize_image', priority=5)
+def normalize_post_image(post_id):
+    post = (
+        Post.objects.across_shards().exclude(image='').filter(pk=post_id)
+        .first()
+    )
+    if post is None:
+        return
+    with post.image.open('rb') as file:
+        content = normalize_image(file, settings.IMAGE_MAX_SIDE)
+    if content is not None:
+        for field, value in image_metadata(content).items():
+            setattr(post, field, value)
+        post.image.save(
+            posixpath.basename(post.image.name), content, save=False
+        )
+        post.save(update_fields=['image', *IMAGE_FIELDS])
+    thumbnails.schedule(post.image)
+
+
+def process_image(post):
+    """Ставит в очередь обработку новой картинки поста: уменьшение
+    (если включено IMAGE_NORMALIZE) и миниатюры."""
+    if not post.image:
+        return
+    if settings.IMAGE_NORMALIZE:
+        jobs.enqueue(
+            'posts.normalize_image', post_id=post.pk,
+            key=f'normalize:{post.pk}',
+        )
+    else:
+        thumbnails.schedule(post.image)
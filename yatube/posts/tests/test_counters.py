@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import AuthorStats, Comment, Follow, Post
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='counter_author')
+        cls.reader = User.objects.create_user(username='counter_reader')
+
+    def setUp(self):
+        cache.clear()
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_post_count(self):
+        """Счётчик постов меняется при создании и удалении поста"""
+        post = Post.objects.create(author=self.author, text='text')
+        Post.objects.create(author=self.author, text='text')
+        self.assertEqual(self.stats(self.author).post_count, 2)
+        post.delete()
+        self.assertEqual(self.stats(self.author).post_count, 1)
+
+    def test_follow_counts(self):
+        """Подписка меняет счётчики подписчиков и подписок"""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).follower_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).follower_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_comment_count(self):
+        """Счётчик комментариев поста"""
+        post = Post.objects.create(author=self.author, text='text')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='comment'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+
+    def test_counters_do_not_go_negative(self):
+        """Уменьшение разошедшегося счётчика не уходит ниже нуля"""
+        post = Post.objects.create(author=self.author, text='text')
+        AuthorStats.objects.filter(user=self.author).update(post_count=0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).post_count, 0)
+
+    def test_rebuild_counters(self):
+        """Команда rebuild_counters исправляет разошедшиеся счётчики"""
+        post = Post.objects.create(author=self.author, text='text')
+        Post.objects.bulk_create(
+            Post(author=self.author, text='bulk') for _ in range(3)
+        )
+        Follow.objects.bulk_create([
+            Follow(user=self.reader, author=self.author)
+        ])
+        Comment.objects.bulk_create([
+            Comment(post=post, author=self.reader, text='bulk')
+        ])
+        AuthorStats.objects.filter(user=self.reader).delete()
+        call_command('rebuild_counters', batch_size=1, stdout=StringIO())
+        author, reader = self.stats(self.author), self.stats(self.reader)
+        self.assertEqual(author.post_count, 4)
+        self.assertEqual(author.follower_count, 1)
+        self.assertEqual(reader.following_count, 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+    def test_pages_render_without_aggregates(self):
+        """Профиль и пост при прогретом кеше не выполняют COUNT(*)"""
+        post = Post.objects.create(author=self.author, text='text')
+        Follow.objects.create(user=self.reader, author=self.author)
+        client = Client()
+        urls = (
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(post.pk,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                client.get(url)
+                with CaptureQueriesContext(connection) as context:
+                    response = client.get(url)
+                for query in context.captured_queries:
+                    self.assertNotIn('COUNT(', query['sql'])
+                self.assertContains(response, 'Всего постов')
@@ -1,8 +1,11 @@
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
-from ..models import Follow
+from core import jobs
+from .. import timeline
+from ..models import Follow, Post, TimelineEntry
 
 User = get_user_model()
 
@@ -64,3 +67,114 @@ class FollowTest(TestCase):
             author=FollowTest.author,
             user=FollowTest.follower)
         self.assertFalse(follows)
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='TimelineAuthor')
+        cls.follower = User.objects.create(username='TimelineFollower')
+
+    def setUp(self):
+        cache.clear()
+        self.client_follower = Client()
+        self.client_follower.force_login(TimelineTest.follower)
+
+    def follow_feed(self):
+        response = self.client_follower.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_new_post_is_fanned_out(self):
+        """Новый пост попадает во входящие подписчика"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(author=self.author, text='fan_out')
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=self.follower, post=post, pub_date=post.pub_date
+            ).exists()
+        )
+        self.assertEqual(self.follow_feed(), ['fan_out'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка заполняет входящие, отписка их чистит"""
+        Post.objects.create(author=self.author, text='old_post')
+        self.client_follower.get(
+            reverse('posts:profile_follow', args=(self.author.username,))
+        )
+        self.assertEqual(self.follow_feed(), ['old_post'])
+        self.client_follower.get(
+            reverse('posts:profile_unfollow', args=(self.author.username,))
+        )
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.follow_feed(), [])
+
+    @override_settings(TIMELINE_SIZE=3)
+    def test_timeline_is_capped(self):
+        """Входящие обрезаются до TIMELINE_SIZE последних постов"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f'capped{i}')
+            for i in range(5)
+        ]
+        self.assertEqual(
+            list(
+                TimelineEntry.objects.filter(user=self.follower)
+                .order_by('post_id').values_list('post_id', flat=True)
+            ),
+            [post.id for post in posts[2:]]
+        )
+
+    @override_settings(TIMELINE_SIZE=2)
+    def test_fan_out_trims_all_followers_at_once(self):
+        """Обрезка входящих всех подписчиков — один запрос"""
+        followers = [self.follower] + [
+            User.objects.create(username=f'TimelineReader{i}')
+            for i in range(3)
+        ]
+        for follower in followers:
+            Follow.objects.create(user=follower, author=self.author)
+        posts = [
+            Post.objects.create(author=self.author, text=f'trimmed{i}')
+            for i in range(2)
+        ]
+        post = Post.objects.create(author=self.author, text='newest')
+        TimelineEntry.objects.filter(post=post).delete()
+        timeline.read_authors()
+        # Подписчики, вставка во входящие и обрезка.
+        with self.assertNumQueries(3):
+            timeline.fan_out(post)
+        for follower in followers:
+            self.assertEqual(
+                list(
+                    TimelineEntry.objects.filter(user=follower)
+                    .order_by('post_id').values_list('post_id', flat=True)
+                ),
+                [posts[1].id, post.id]
+            )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_is_read_on_request(self):
+        """Посты популярного автора читаются без раскладки по лентам"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        cache.clear()
+        Post.objects.create(author=self.author, text='popular')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.follow_feed(), ['popular'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_posts_kept_when_author_drops_below_limit(self):
+        """Посты, опубликованные, пока автор был выше лимита, остаются
+        в ленте, когда он опускается до лимита"""
+        other = User.objects.create(username='OtherFollower')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        cache.clear()
+        Post.objects.create(author=self.author, text='while_popular')
+        self.assertFalse(TimelineEntry.objects.exists())
+        Follow.objects.filter(user=other).delete()
+        jobs.work_off()
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.follower).exists()
+        )
+        self.assertEqual(self.follow_feed(), ['while_popular'])
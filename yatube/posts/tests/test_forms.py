@@ -1,3 +1,4 @@
+import hashlib
 import tempfile
 import shutil
 
@@ -82,7 +83,10 @@ class PostFormTests(TestCase):
         self.assertEqual(Post.objects.count(), count_posts + 1)
         post = Post.objects.latest('id')
         self.assertEqual(response.status_code, HTTPStatus.OK)
-        self.assertEqual(post.image.name, 'posts/small.gif')
+        digest = hashlib.sha256(small_gif).hexdigest()
+        self.assertEqual(
+            post.image.name, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif'
+        )
         self.assertEqual(post.author, self.post_author)
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.group_id, form_data['group'])
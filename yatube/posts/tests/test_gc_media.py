@@ -0,0 +1,114 @@
+import os
+import shutil
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.test import TestCase
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from core import cleanup, thumbnails
+from core.models import StoredFile
+from core.tests.utils import TempMediaMixin, png
+from ..models import Post
+
+User = get_user_model()
+
+
+class GcMediaTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='gc_author')
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        self.kept = Post.objects.create(
+            text='kept', author=self.author, image=png()
+        )
+        orphan = Post.objects.create(
+            text='orphan', author=self.author, image=png(color='red')
+        )
+        self.orphan = orphan.image.name
+        thumbnails.generate(self.kept.image.name)
+        thumbnails.generate(self.orphan)
+        # Удаление поста, не дождавшись фоновой задачи, и старый файл
+        # с обычным именем, загруженный до подсчёта ссылок.
+        Post.objects.filter(pk=orphan.pk).delete()
+        self.legacy = FileSystemStorage().save(
+            'posts/legacy.png', ContentFile(b'legacy')
+        )
+        self.stray = default.storage.save(
+            'cache/zz/zz/stray.webp', ContentFile(b'stray')
+        )
+
+    def gc(self, *args):
+        out = StringIO()
+        call_command('gc_media', '--min-age=0', *args, stdout=out)
+        return out.getvalue()
+
+    def orphan_thumbnails(self):
+        source = ImageFile(self.orphan, default_storage)
+        keys = default.kvstore._get(source.key, identity='thumbnails') or []
+        return [default.kvstore._get(key).name for key in keys]
+
+    def test_walk_matches_database_order(self):
+        """Обход каталога выдаёт имена в порядке сортировки строк"""
+        for name in ('posts/a-b/1.png', 'posts/a/b.png', 'posts/a.png'):
+            FileSystemStorage().save(name, ContentFile(b'x'))
+        names = [name for name, _ in cleanup.walk(default_storage, 'posts')]
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(len(names), 6)
+
+    def test_orphans_removed_with_thumbnails(self):
+        """Файлы без постов удаляются вместе с миниатюрами"""
+        thumbnail_names = self.orphan_thumbnails()
+        self.assertTrue(thumbnail_names)
+        self.assertTrue(StoredFile.objects.filter(name=self.orphan).exists())
+        output = self.gc()
+        self.assertIn('Картинки постов: удалено 2 из 3', output)
+        self.assertIn('Миниатюры: удалено 1', output)
+        self.assertTrue(default_storage.exists(self.kept.image.name))
+        for name in (self.orphan, self.legacy):
+            self.assertFalse(default_storage.exists(name))
+        for name in thumbnail_names + [self.stray]:
+            self.assertFalse(default.storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=self.orphan).exists())
+        self.assertIsNotNone(thumbnails.prepared(self.kept.image, 'feed'))
+
+    def test_dry_run_keeps_files(self):
+        """В пробном режиме ничего не удаляется"""
+        output = self.gc('--dry-run')
+        self.assertIn('Картинки постов: найдено 2 из 3', output)
+        self.assertTrue(default_storage.exists(self.orphan))
+        self.assertTrue(default_storage.exists(self.legacy))
+        self.assertTrue(default.storage.exists(self.stray))
+
+    def test_quarantine_moves_files(self):
+        """Карантин переносит файлы с сохранением пути"""
+        quarantine = os.path.join(self.media_root, 'quarantine')
+        self.gc(f'--quarantine={quarantine}')
+        self.assertFalse(default_storage.exists(self.orphan))
+        self.assertTrue(os.path.exists(os.path.join(quarantine, self.orphan)))
+        self.assertTrue(os.path.exists(os.path.join(quarantine, self.stray)))
+        self.assertEqual(self.orphan_thumbnails(), [])
+
+    def test_young_files_kept(self):
+        """Свежие файлы не трогаются: пост может быть ещё не сохранён"""
+        call_command('gc_media', stdout=StringIO())
+        self.assertTrue(default_storage.exists(self.orphan))
+
+    def test_kvstore_entries_without_files_forgotten(self):
+        """Записи sorl об удалённых исходниках убираются"""
+        os.remove(default_storage.path(self.orphan))
+        thumbnail_names = self.orphan_thumbnails()
+        output = self.gc()
+        self.assertIn('Записи sorl без файлов: удалено 1', output)
+        self.assertEqual(self.orphan_thumbnails(), [])
+        for name in thumbnail_names:
+            self.assertFalse(default.storage.exists(name))
@@ -0,0 +1,60 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.tests.utils import TempMediaMixin, png
+from ..models import Post
+
+User = get_user_model()
+
+
+class ImageMetadataTest(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='meta_author')
+
+    def test_metadata_stored_on_upload(self):
+        """Размеры, вес и хеш картинки сохраняются при загрузке"""
+        upload = png()
+        post = Post.objects.create(
+            text='text', author=self.author, image=upload
+        )
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (40, 30))
+        self.assertEqual(post.image_bytes, upload.size)
+        self.assertEqual(len(post.image_hash), 64)
+        post.image = None
+        post.save()
+        post.refresh_from_db()
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_hash, '')
+
+    def test_feed_does_not_open_images(self):
+        """Лента читает размеры из базы, не открывая файлы"""
+        Post.objects.create(text='text', author=self.author, image=png())
+        post = Post.objects.for_feed().get()
+        with self.assertNumQueries(0):
+            self.assertEqual(post.image_width, 40)
+
+    def test_backfill_command(self):
+        """Команда заполняет поля для уже загруженных картинок"""
+        post = Post.objects.create(
+            text='text', author=self.author, image=png((7, 5))
+        )
+        Post.objects.filter(pk=post.pk).update(
+            image_width=None, image_height=None, image_bytes=None,
+            image_hash='',
+        )
+        Post.objects.create(text='lost', author=self.author)
+        Post.objects.filter(text='lost').update(image='posts/lost.png')
+        err = StringIO()
+        call_command(
+            'backfill_image_metadata', stdout=StringIO(), stderr=err
+        )
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (7, 5))
+        self.assertEqual(len(post.image_hash), 64)
+        self.assertIn('posts/lost.png', err.getvalue())
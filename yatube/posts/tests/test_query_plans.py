@@ -0,0 +1,75 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from ..paginators import CursorPaginator
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class FeedQueryPlanTest(TestCase):
+    """Запросы лент идут по индексам, без полного скана и сортировки"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='plan_author')
+        cls.reader = User.objects.create_user(username='plan_reader')
+        cls.group = Group.objects.create(
+            title='plan_group', slug='plan_slug', description=''
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = None
+        for i in range(3):
+            cls.post = Post.objects.create(
+                text=f'plan_text{i}', group=cls.group, author=cls.author
+            )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='plan_comment'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexedPlan(self, sql):
+        for step in self.explain(sql):
+            self.assertNotIn('TEMP B-TREE', step, sql)
+            if step.startswith('SCAN '):
+                self.assertIn('INDEX', step, sql)
+
+    def test_feed_queries_use_indexes(self):
+        cursor = CursorPaginator(Post.objects.all(), 1).encode_cursor(
+            self.post
+        )
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            for params in ({}, {'page': 2}, {'before': cursor}):
+                cache.clear()
+                with CaptureQueriesContext(connection) as context:
+                    self.reader_client.get(url, params)
+                for query in context.captured_queries:
+                    with self.subTest(url=url, params=params):
+                        self.assertIndexedPlan(query['sql'])
+
+    def test_follow_is_unique(self):
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=self.reader, author=self.author)
@@ -0,0 +1,90 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post
+from ..search import FTS_TABLE, SearchResults, match_expression
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    """Тест полнотекстового поиска по постам"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_superuser(
+            username='searcher', email='s@example.com', password='pass'
+        )
+        cls.cats = Post.objects.create(
+            text='Коты спят на подоконнике весь день', author=cls.user
+        )
+        cls.dogs = Post.objects.create(
+            text='Собаки гуляют, коты смотрят <b>свысока</b>',
+            author=cls.user
+        )
+        cls.other = Post.objects.create(text='Про погоду', author=cls.user)
+
+    def search(self, query):
+        return self.client.get(reverse('posts:search'), {'q': query})
+
+    def test_search_finds_posts_by_word_prefix(self):
+        """Поиск находит посты по началу слова"""
+        found = self.search('кот').context['page_obj']
+        self.assertEqual(
+            {post.pk for post in found}, {self.cats.pk, self.dogs.pk}
+        )
+        self.assertEqual(found.paginator.count, 2)
+
+    def test_snippet_highlighted_and_escaped(self):
+        """Совпадения подсвечены, разметка из текста поста экранирована"""
+        response = self.search('свысока')
+        self.assertContains(response, '<mark>свысока</mark>')
+        self.assertNotContains(response, '<b>')
+
+    def test_user_syntax_is_quoted(self):
+        """Операторы FTS5 во вводе пользователя не ломают запрос"""
+        self.assertEqual(match_expression('NEAR(" OR кот*'), (
+            '"NEAR"* "OR"* "кот"*'
+        ))
+        response = self.search('"коты" OR (')
+        self.assertEqual(response.status_code, 200)
+
+    def test_empty_query(self):
+        """Пустой запрос ничего не ищет"""
+        self.assertEqual(self.search('  ').context['page_obj'], '')
+        self.assertEqual(SearchResults('!!!').count(), 0)
+
+    def test_index_follows_edit_and_delete(self):
+        """Триггеры обновляют индекс при изменении и удалении поста"""
+        Post.objects.filter(pk=self.other.pk).update(text='Про котов')
+        self.assertEqual(SearchResults('котов').count(), 1)
+        self.assertEqual(SearchResults('погоду').count(), 0)
+        Post.objects.filter(pk=self.dogs.pk).delete()
+        self.assertEqual(SearchResults('собаки').count(), 0)
+
+    def test_rebuild_search_index(self):
+        """Команда перестраивает индекс из таблицы постов"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')"
+            )
+        self.assertEqual(SearchResults('коты').count(), 0)
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(SearchResults('коты').count(), 2)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по тому же индексу"""
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'коты'}
+        )
+        self.assertEqual(
+            set(response.context['cl'].result_list), {self.cats, self.dogs}
+        )
@@ -0,0 +1,53 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import AuthorStats, Comment, Follow, Post, TimelineEntry
+
+
+class SeedAndBenchmarkTest(TestCase):
+    """Тест генератора данных и нагрузочного прогона"""
+
+    def test_seed_data_builds_consistent_dataset(self):
+        """seed_data создаёт данные и пересчитывает счётчики и ленты"""
+        call_command(
+            'seed_data', users=30, groups=3, posts=300, comments=100,
+            follows=5, stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Comment.objects.count(), 100)
+        top = AuthorStats.objects.order_by('-post_count').first()
+        self.assertEqual(top.post_count, top.user.posts.count())
+        self.assertGreater(top.post_count, 300 / 30)
+        follow = Follow.objects.first()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=follow.user, post__author=follow.author
+        ).exists())
+
+    def test_benchmark_saves_and_compares_baseline(self):
+        """benchmark сохраняет базу и сравнивается с ней"""
+        call_command(
+            'seed_data', users=10, posts=50, comments=20, stdout=StringIO()
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            call_command(
+                'benchmark', requests=3, warmup=0, save=path,
+                host='testserver', scenarios=['index', 'post_detail'],
+                stdout=StringIO(),
+            )
+            with open(path, encoding='utf-8') as file:
+                scenarios = json.load(file)['scenarios']
+            self.assertEqual(set(scenarios), {'index', 'post_detail'})
+            self.assertEqual(scenarios['index']['statuses'], [200])
+            out = StringIO()
+            call_command(
+                'benchmark', requests=3, warmup=0, compare=path,
+                host='testserver', threshold=100, scenarios=['index'],
+                stdout=out,
+            )
+            self.assertIn('Регрессий нет', out.getvalue())
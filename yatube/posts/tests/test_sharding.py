@@ -0,0 +1,286 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import jobs
+from core.tests.utils import png
+from .. import sharding
+from ..models import Comment, Follow, Post
+from ..search import SearchResults
+from ..tasks import process_image
+
+User = get_user_model()
+SHARDS = ['shard_a', 'shard_b']
+
+
+@override_settings(POST_SHARDS=SHARDS)
+class ShardingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Шарды добавляются после super().setUpClass(), чтобы тест
+        # не закрыл к ним доступ; таблицы — только постов и комментариев.
+        cls.directory = tempfile.mkdtemp()
+        for alias in SHARDS:
+            connections.databases[alias] = {
+                **connections.databases['default'],
+                'NAME': os.path.join(cls.directory, f'{alias}.sqlite3'),
+                'OPTIONS': {'pragmas': {'foreign_keys': 'off'}},
+                'TEST': {},
+            }
+            with connections[alias].schema_editor() as editor:
+                editor.create_model(Post)
+                editor.create_model(Comment)
+            # schema_editor снова включает внешние ключи на соединении.
+            connections[alias].close()
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in SHARDS:
+            connections[alias].close()
+            del connections.databases[alias]
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username='reader')
+        self.client.force_login(self.reader)
+        # По автору на каждый шард.
+        self.authors = {}
+        number = 0
+        while len(self.authors) < len(SHARDS):
+            author = User.objects.create_user(username=f'author{number}')
+            self.authors.setdefault(sharding.shard_for(author.pk), author)
+            number += 1
+
+    def tearDown(self):
+        # Шарды не входят в транзакцию теста.
+        for alias in SHARDS:
+            Comment.objects.using(alias)._raw_delete(alias)
+            Post.objects.using(alias)._raw_delete(alias)
+
+    def on_shard(self, alias):
+        return set(
+            Post.objects.using(alias).values_list('text', flat=True)
+        )
+
+    def test_placement_moves_authors_only_to_new_shard(self):
+        """С новым шардом авторы либо остаются, либо переезжают на него"""
+        before = {author_id: sharding.shard_for(author_id)
+                  for author_id in range(1000)}
+        with self.settings(POST_SHARDS=SHARDS + ['shard_c']):
+            after = {author_id: sharding.shard_for(author_id)
+                     for author_id in range(1000)}
+        moved = [author_id for author_id in before
+                 if before[author_id] != after[author_id]]
+        self.assertTrue(all(after[author_id] == 'shard_c'
+                            for author_id in moved))
+        self.assertLess(abs(len(moved) - 333), 100)
+
+    def test_posts_and_comments_stored_on_author_shard(self):
+        """Пост лежит на шарде автора, комментарий — рядом с постом"""
+        posts = []
+        for alias, author in self.authors.items():
+            posts.append(Post.objects.create(text=alias, author=author))
+            self.assertEqual(self.on_shard(alias), {alias})
+        self.assertNotEqual(posts[0].pk, posts[1].pk)
+        self.assertFalse(Post.objects.using('default').exists())
+        post = posts[0]
+        response = self.client.post(
+            reverse('posts:add_comment', args=[post.pk]), {'text': 'Ответ'}
+        )
+        self.assertEqual(response.status_code, 302)
+        alias = sharding.shard_for(post.author_id)
+        comment = Comment.objects.using(alias).get()
+        self.assertEqual(comment.author, self.reader)
+        post = Post.objects.using(alias).get(pk=post.pk)
+        self.assertEqual(post.comment_count, 1)
+
+    def test_index_merges_shards_by_date(self):
+        """Общая лента сливает шарды по дате публикации"""
+        for number in range(3):
+            for author in self.authors.values():
+                Post.objects.create(text=f'Пост {number}', author=author)
+        response = self.client.get(reverse('posts:index'))
+        page = response.context['page_obj']
+        self.assertEqual(page.paginator.count, 6)
+        dates = [post.pub_date for post in page]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+        self.assertEqual(
+            {post.author for post in page}, set(self.authors.values())
+        )
+
+    def test_cursor_pages_across_shards(self):
+        """Курсорная пагинация идёт по всем шардам без пропусков"""
+        for number in range(4):
+            for author in self.authors.values():
+                Post.objects.create(text=f'Пост {number}', author=author)
+        seen = []
+        before = ''
+        with self.settings(FEED_PAGINATION='cursor', PAGE_POSTS=3):
+            while True:
+                page = self.client.get(
+                    reverse('posts:index'), {'before': before}
+                ).context['page_obj']
+                seen += [post.pk for post in page]
+                if not page.has_next():
+                    break
+                before = page.next_cursor
+        expected = Post.objects.across_shards().order_by('-pub_date', '-id')
+        self.assertEqual(seen, [post.pk for post in expected])
+
+    def test_post_detail_found_on_any_shard(self):
+        """Страница поста ищет его по всем шардам"""
+        for alias, author in self.authors.items():
+            post = Post.objects.create(text=f'Текст {alias}', author=author)
+            response = self.client.get(
+                reverse('posts:post_detail', args=[post.pk])
+            )
+            self.assertContains(response, f'Текст {alias}')
+            self.assertEqual(response.context['post'].author, author)
+
+    def test_follow_index_reads_followed_shards(self):
+        """Лента подписок собирается с шардов авторов подписок"""
+        for alias, author in self.authors.items():
+            Post.objects.create(text=f'Подписка {alias}', author=author)
+            Follow.objects.create(user=self.reader, author=author)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            {post.text for post in response.context['page_obj']},
+            {f'Подписка {alias}' for alias in SHARDS},
+        )
+
+    def test_profile_conditional_get_reads_author_shard(self):
+        """ETag профиля считается по шарду автора"""
+        author = self.authors[SHARDS[0]]
+        Post.objects.create(text='Первый', author=author)
+        url = reverse('posts:profile', args=[author.username])
+        response = self.client.get(url)
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        Post.objects.create(text='Второй', author=author)
+        fresh = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(fresh.status_code, 200)
+
+    def test_search_finds_posts_on_all_shards(self):
+        """С шардами поиск идёт по всем шардам"""
+        for alias, author in self.authors.items():
+            Post.objects.create(text=f'Находка {alias}', author=author)
+        results = SearchResults('Находка')
+        self.assertEqual(results.count(), 2)
+        self.assertEqual(
+            {post.text for post in results[0:10]},
+            {f'Находка {alias}' for alias in SHARDS},
+        )
+
+    def test_image_job_finds_post_on_shard(self):
+        """Фоновая обработка картинки находит пост на шарде"""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        alias, author = next(iter(self.authors.items()))
+        with self.settings(MEDIA_ROOT=media_root, IMAGE_NORMALIZE=True,
+                           IMAGE_MAX_SIDE=100):
+            post = Post.objects.create(
+                text='text', author=author, image=png((400, 200))
+            )
+            process_image(post)
+            jobs.work_off()
+        post = Post.objects.using(alias).get(pk=post.pk)
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+
+    def test_gc_media_keeps_images_on_all_shards(self):
+        """gc_media не удаляет картинки постов ни с одного шарда"""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with self.settings(MEDIA_ROOT=media_root):
+            names = []
+            for color, author in zip(('red', 'green'), self.authors.values()):
+                names.append(Post.objects.create(
+                    text=color, author=author, image=png(color=color)
+                ).image.name)
+            orphan = default_storage.save(
+                'posts/orphan.png', ContentFile(b'orphan')
+            )
+            out = StringIO()
+            call_command('gc_media', '--min-age=0', stdout=out)
+            self.assertIn('Картинки постов: удалено 1 из 3', out.getvalue())
+            for name in names:
+                self.assertTrue(default_storage.exists(name))
+            self.assertFalse(default_storage.exists(orphan))
+
+    def test_image_commands_read_all_shards(self):
+        """Досчёт метаданных и миниатюр проходит по всем шардам"""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with self.settings(MEDIA_ROOT=media_root):
+            for color, (alias, author) in zip(
+                ('red', 'green'), self.authors.items()
+            ):
+                Post.objects.create(
+                    text=color, author=author, image=png(color=color)
+                )
+                Post.objects.using(alias).update(
+                    image_width=None, image_height=None, image_hash=''
+                )
+            out = StringIO()
+            call_command('backfill_image_metadata', stdout=out)
+            self.assertIn('Заполнено постов: 2', out.getvalue())
+            for alias in SHARDS:
+                post = Post.objects.using(alias).get()
+                self.assertEqual((post.image_width, post.image_height),
+                                 (40, 30))
+            # Миниатюры готовятся в потоках, вне транзакции теста.
+            with mock.patch(
+                'posts.management.commands.generate_thumbnails.generate',
+                return_value={'feed': 0.01},
+            ) as generate:
+                call_command('generate_thumbnails', stdout=StringIO())
+            self.assertEqual(
+                {call.args[0] for call in generate.call_args_list},
+                {Post.objects.using(alias).get().image.name
+                 for alias in SHARDS},
+            )
+
+    def test_rebalance_moves_misplaced_authors(self):
+        """rebalance_shards переносит авторов из default на их шарды"""
+        with self.settings(POST_SHARDS=[]):
+            for alias, author in self.authors.items():
+                post = Post.objects.create(text=alias, author=author)
+                Comment.objects.create(
+                    post=post, author=self.reader, text='Ответ'
+                )
+        out = StringIO()
+        call_command('rebalance_shards', stdout=out)
+        self.assertIn(
+            'Авторов перенесено: 2, постов 2, комментариев 2', out.getvalue()
+        )
+        self.assertFalse(Post.objects.using('default').exists())
+        for alias in SHARDS:
+            self.assertEqual(self.on_shard(alias), {alias})
+            self.assertEqual(Comment.objects.using(alias).count(), 1)
+        post = Post.objects.create(text='Новый', author=self.reader)
+        self.assertGreater(post.pk, max(
+            Post.objects.using(alias).exclude(pk=post.pk)
+            .values_list('pk', flat=True).get()
+            for alias in SHARDS
+        ))
+
+
+class WithoutShardsTest(TestCase):
+    def test_across_shards_is_plain_queryset(self):
+        """Без шардов across_shards() — обычный queryset default"""
+        queryset = Post.objects.across_shards()
+        self.assertEqual(queryset.db, connection.alias)
+        self.assertEqual(str(queryset.query), str(Post.objects.all().query))
@@ -0,0 +1,94 @@
+import io
+import struct
+import tracemalloc
+import zlib
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from PIL import Image
+
+from core import jobs
+from core.models import Job
+from core.tests.utils import TempMediaMixin
+from ..forms import PostForm
+from ..models import Post
+from ..tasks import process_image
+
+User = get_user_model()
+
+
+def png_header(width, height):
+    """Только заголовок PNG: сигнатура, IHDR и IEND."""
+    def chunk(kind, data):
+        return (
+            struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data))
+        )
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        + chunk(b'IEND', b'')
+    )
+
+
+class UploadLimitsTest(TempMediaMixin, TestCase):
+    def validate(self, name, content):
+        """Разбирает multipart-запрос и проверяет форму; возвращает
+        ошибки и пик памяти на разбор и проверку."""
+        request = RequestFactory().post('/create/', {
+            'text': 'text',
+            'image': SimpleUploadedFile(name, content, 'image/png'),
+        })
+        tracemalloc.start()
+        try:
+            form = PostForm(request.POST, request.FILES)
+            form.is_valid()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return form.errors, peak
+
+    @override_settings(UPLOAD_MAX_BYTES=1024 * 1024)
+    def test_oversized_upload_truncated_and_rejected(self):
+        """Слишком большой файл не читается в память и отклоняется"""
+        content = png_header(10, 10) + b'\0' * (8 * 1024 * 1024)
+        errors, peak = self.validate('big.png', content)
+        self.assertEqual(
+            errors['image'][0], 'Файл больше 1,0\xa0МБ.'
+        )
+        self.assertLess(peak, 512 * 1024)
+
+    def test_too_many_pixels_rejected_by_header(self):
+        """Огромная по размерам картинка отклоняется по заголовку"""
+        errors, peak = self.validate('huge.png', png_header(10000, 8000))
+        self.assertIn('10000×8000', errors['image'][0])
+        self.assertLess(peak, 512 * 1024)
+
+    @override_settings(IMAGE_NORMALIZE=True, IMAGE_MAX_SIDE=100)
+    def test_background_downscale_strips_exif(self):
+        """Фоновая задача уменьшает картинку и убирает EXIF"""
+        buffer = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        Image.new('RGB', (400, 200), 'red').save(buffer, 'JPEG', exif=exif)
+        post = Post.objects.create(
+            text='text', author=User.objects.create_user(username='upl'),
+            image=SimpleUploadedFile(
+                'photo.jpg', buffer.getvalue(), 'image/jpeg'
+            ),
+        )
+        original = post.image.name
+        process_image(post)
+        jobs.work_off()
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, original)
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertFalse(image.getexif())
+        self.assertEqual(
+            set(Job.objects.values_list('task', flat=True)),
+            {'posts.normalize_image', 'core.generate_thumbnails',
+             'core.delete_unused_file'},
+        )
@@ -1,13 +1,20 @@
+import time
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
+from django.utils.http import http_date, urlsafe_base64_encode
 from django import forms
 
-from posts.models import Group, Post
+from posts.models import Comment, Follow, Group, Post
+from posts.paginators import CursorPaginator
 
 PAGINATOR_TEST_PAGE_1: int = 10
 PAGINATOR_TEST_PAGE_2: int = 3
 PAGINATOR_TEST_ALL_POSTS: int = 13
+FEED_TEST_ALL_POSTS: int = 25
+COMMENTS_TEST_ALL: int = 25
 User = get_user_model()
 
 
@@ -90,6 +97,7 @@ class PostsPagesTests(TestCase):
             group=cls.group,
             author=cls.author
         )
+        cache.clear()
         cls.templ_names = {
             reverse('posts:index'): 'posts/index.html',
             reverse('posts:create_post'): 'posts/create_post.html',
@@ -171,11 +179,334 @@ class PostsPagesTests(TestCase):
         response_1 = self.authorized_not_author_client.get(
             reverse('posts:index')
         )
-        first_resp_content = response_1.content
-        post_deleted = Post.objects.get(id=1)
-        post_deleted.delete()
+        Post.objects.filter(pk=self.post.pk).update(text='not_in_cache')
         response_2 = self.authorized_not_author_client.get(
             reverse('posts:index')
         )
-        second_resp_content = response_2.content
-        self.assertTrue(first_resp_content == second_resp_content)
+        self.assertEqual(response_1.content, response_2.content)
+
+    def test_cache_index_invalidated_by_signals(self):
+        """Сохранение и удаление поста сбрасывают кеш ленты"""
+        self.authorized_not_author_client.get(reverse('posts:index'))
+        post = Post.objects.create(text='fresh_post', author=self.author)
+        response = self.authorized_not_author_client.get(
+            reverse('posts:index')
+        )
+        self.assertContains(response, 'fresh_post')
+        post.delete()
+        response = self.authorized_not_author_client.get(
+            reverse('posts:index')
+        )
+        self.assertNotContains(response, 'fresh_post')
+
+    def test_cache_feeds_vary_on_page(self):
+        """Разные страницы ленты кешируются отдельно"""
+        Post.objects.bulk_create(
+            Post(text=f'page_text{i}', author=self.author, group=self.group)
+            for i in range(PAGINATOR_TEST_PAGE_1)
+        )
+        cache.clear()
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url, {'page': 1})
+                second = self.guest_client.get(url, {'page': 2})
+                self.assertContains(first, 'page_text')
+                self.assertNotContains(second, 'page_text')
+                self.assertContains(second, self.post.text)
+
+
+class FeedQueriesTest(TestCase):
+    """Тест фиксированного числа запросов на страницу ленты"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='feed_author', first_name='Имя', last_name='Фамилия'
+        )
+        cls.reader = User.objects.create_user(username='feed_reader')
+        cls.group = Group.objects.create(
+            title='feed_group',
+            slug='feed_slug',
+            description='feed_description'
+        )
+        Post.objects.bulk_create(
+            Post(text=f'feed_text{i}', group=cls.group, author=cls.author)
+            for i in range(FEED_TEST_ALL_POSTS)
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_anonymous_feed_queries(self):
+        """Число запросов ленты не зависит от числа постов на странице"""
+        feeds = {
+            reverse('posts:index'): 3,
+            reverse('posts:group_list', args=(self.group.slug,)): 4,
+            reverse('posts:profile', args=(self.author.username,)): 4,
+        }
+        for url, queries in feeds.items():
+            for page in (1, 2):
+                with self.subTest(url=url, page=page):
+                    cache.clear()
+                    with self.assertNumQueries(queries):
+                        self.client.get(url, {'page': page})
+
+    def test_follow_feed_queries(self):
+        """Лента подписок: валидатор для условного GET, COUNT
+        и страница; сессия и пользователь берутся из кеша"""
+        self.reader_client.get(reverse('posts:follow_index'))
+        with self.assertNumQueries(3):
+            response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            len(response.context['page_obj']), PAGINATOR_TEST_PAGE_1
+        )
+
+
+class CursorPaginatorViewsTest(TestCase):
+    """Тест keyset-пагинации лент"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='cursor_author')
+        cls.group = Group.objects.create(
+            title='cursor_group',
+            slug='cursor_slug',
+            description='cursor_description'
+        )
+        Post.objects.bulk_create(
+            Post(text=f'cursor_text{i}', group=cls.group, author=cls.author)
+            for i in range(FEED_TEST_ALL_POSTS)
+        )
+        cls.expected = list(
+            Post.objects.order_by('-pub_date', '-id')
+            .values_list('id', flat=True)
+        )
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(cls.group.slug,)),
+            reverse('posts:profile', args=(cls.author.username,)),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, url, param, cursor=''):
+        """Идёт по ленте курсорами, пока есть куда идти"""
+        pages = []
+        while True:
+            cache.clear()
+            page = self.client.get(url, {param: cursor}).context['page_obj']
+            pages.append([post.id for post in page])
+            if param == 'before' and page.has_next():
+                cursor = page.next_cursor
+            elif param == 'after' and page.has_previous():
+                cursor = page.previous_cursor
+            else:
+                return pages, page
+
+    def test_walk_forward_and_back(self):
+        """Проход по курсорам вперёд и назад видит все посты по порядку"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                forward, last_page = self.walk(url, 'before')
+                self.assertEqual(
+                    [len(page) for page in forward],
+                    [PAGINATOR_TEST_PAGE_1, PAGINATOR_TEST_PAGE_1, 5]
+                )
+                self.assertEqual(sum(forward, []), self.expected)
+                backward, first_page = self.walk(
+                    url, 'after', last_page.previous_cursor
+                )
+                self.assertEqual(sum(backward[::-1], []), self.expected[:-5])
+                self.assertFalse(first_page.has_previous())
+
+    def test_cursor_page_does_not_count(self):
+        """Страница по курсору не выполняет COUNT(*) и OFFSET"""
+        cursor = CursorPaginator(Post.objects.all(), 1).encode_cursor(
+            Post.objects.get(pk=self.expected[9])
+        )
+        # Первый запрос — дата последнего поста для условного GET.
+        with self.assertNumQueries(2) as context:
+            self.client.get(reverse('posts:index'), {'before': cursor})
+        self.assertNotIn('COUNT', context.captured_queries[1]['sql'])
+        self.assertNotIn('OFFSET', context.captured_queries[1]['sql'])
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор отдаёт первую страницу"""
+        response = self.client.get(reverse('posts:index'), {'before': '%%'})
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            self.expected[:PAGINATOR_TEST_PAGE_1]
+        )
+
+    def test_cursor_with_bad_date_returns_first_page(self):
+        """Курсор правильного формата с неверной датой — тоже первая
+        страница"""
+        cursor = urlsafe_base64_encode(b'garbage|5')
+        response = self.client.get(reverse('posts:index'), {'before': cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            self.expected[:PAGINATOR_TEST_PAGE_1]
+        )
+
+
+class PostCommentsViewTest(TestCase):
+    """Тест постраничной загрузки комментариев поста"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='comments_author')
+        cls.post = Post.objects.create(text='post', author=cls.author)
+        commentators = [
+            User.objects.create_user(username=f'commentator{i}')
+            for i in range(COMMENTS_TEST_ALL)
+        ]
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=author, text=f'comment{i}')
+            for i, author in enumerate(commentators)
+        )
+        cls.url = reverse('posts:post_detail', args=(cls.post.pk,))
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def test_newest_comments_then_load_more(self):
+        """Сначала новые комментарии, остальные по ссылке «ещё»"""
+        page = self.client.get(self.url).context['comments']
+        self.assertEqual(
+            [comment.text for comment in page],
+            [f'comment{i}' for i in range(COMMENTS_TEST_ALL - 1, 4, -1)]
+        )
+        self.assertTrue(page.has_next())
+        more = self.client.get(
+            self.url, {'comments_before': page.next_cursor}
+        ).context['comments']
+        self.assertEqual(
+            [comment.text for comment in more],
+            [f'comment{i}' for i in range(4, -1, -1)]
+        )
+        self.assertFalse(more.has_next())
+
+    def test_comments_cursor_with_bad_date(self):
+        """Курсор комментариев с неверной датой отдаёт новые
+        комментарии, а не ошибку"""
+        response = self.client.get(
+            self.url, {'comments_before': urlsafe_base64_encode(b'garbage|5')}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context['comments'][0].text,
+            f'comment{COMMENTS_TEST_ALL - 1}'
+        )
+
+    def test_comments_do_not_cause_n_plus_one(self):
+        """Комментарии с авторами загружаются одним запросом (плюс
+        валидатор условного GET и пост)"""
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'commentator24')
+
+    def test_comments_cache_invalidated_by_new_comment(self):
+        """Новый комментарий сбрасывает кеш блока комментариев"""
+        self.client.get(self.url)
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+        self.authorized_client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            {'text': 'fresh_comment'}
+        )
+        self.assertContains(self.client.get(self.url), 'fresh_comment')
+
+
+class ConditionalGetTest(TestCase):
+    """Тест условных GET лент и страницы поста"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='etag_author')
+        cls.reader = User.objects.create_user(username='etag_reader')
+        cls.group = Group.objects.create(
+            title='etag_group', slug='etag_slug', description=''
+        )
+        cls.post = Post.objects.create(
+            text='etag_text', group=cls.group, author=cls.author
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_unchanged_pages_return_304(self):
+        """Неизменная страница отдаёт 304 одним запросом валидатора"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self.reader_client.get(url)['ETag']
+                # Только валидатор: сессия и пользователь в кеше,
+                # шаблон не рендерится.
+                with self.assertNumQueries(1):
+                    response = self.reader_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    )
+                self.assertEqual(response.status_code, 304)
+                self.assertIsNone(response.context)
+
+    def test_changes_and_user_change_etag(self):
+        """Правка поста, новый комментарий и другой пользователь
+        меняют ETag"""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        etag = self.reader_client.get(url)['ETag']
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+        self.post.text = 'edited'
+        self.post.save()
+        edited = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(edited.status_code, 200)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='etag_comment'
+        )
+        self.assertEqual(self.reader_client.get(
+            url, HTTP_IF_NONE_MATCH=edited['ETag']
+        ).status_code, 200)
+
+    def test_if_modified_since_alone_is_not_trusted(self):
+        """Без ETag правка не прячется за 304 по If-Modified-Since"""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        response = self.reader_client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.post.text = 'edited'
+        self.post.save()
+        response = self.reader_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 3600)
+        )
+        self.assertContains(response, 'edited')
+
+    def test_missing_objects_still_404(self):
+        """Для несуществующих страниц валидаторов нет, ответ 404"""
+        response = self.client.get(
+            reverse('posts:group_list', args=('missing',))
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
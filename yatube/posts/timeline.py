@@ -0,0 +1,182 @@
+"""Ленты подписок: fan-out-on-write с откатом на fan-out-on-read.
+
+Новый пост автора сразу раскладывается во входящие (TimelineEntry)
+всех его подписчиков, поэтому /follow/ читает один диапазон индекса.
+Раскладку по более чем TIMELINE_INLINE_FANOUT подписчикам делает
+фоновая задача posts.fan_out. Для авторов с числом подписчиков больше
+TIMELINE_FANOUT_LIMIT раскладка не делается вовсе: их посты
+домешиваются в ленту при чтении; когда автор опускается до лимита,
+demote() кладёт посты, которые не раскладывались, во входящие
+подписчиков. С шардами постов (posts.sharding)
+входящие не ведутся, и вся лента собирается при чтении.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, Q
+
+from core import jobs
+from . import sharding
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+FANOUT_AUTHORS_CACHE_KEY = 'timeline:read-authors'
+FANOUT_AUTHORS_CACHE_TIMEOUT = 300
+TRIM_BATCH = 500
+
+
+def read_authors():
+    """Id авторов, чьи посты читаются при запросе ленты."""
+    authors = cache.get(FANOUT_AUTHORS_CACHE_KEY)
+    if authors is None:
+        authors = set(
+            AuthorStats.objects.filter(
+                follower_count__gt=settings.TIMELINE_FANOUT_LIMIT
+            ).values_list('user', flat=True)
+        )
+        cache.set(
+            FANOUT_AUTHORS_CACHE_KEY, authors, FANOUT_AUTHORS_CACHE_TIMEOUT
+        )
+    return authors
+
+
+def is_read_author(author_id):
+    return author_id in read_authors()
+
+
+def demote(author_id):
+    """Автор опустился до TIMELINE_FANOUT_LIMIT подписчиков.
+
+    Его новые посты снова раскладываются, а опубликованные, пока он
+    был выше лимита, задача posts.backfill_followers добавляет во
+    входящие подписчиков. Второй запуск через
+    FANOUT_AUTHORS_CACHE_TIMEOUT подбирает посты, которые другие
+    процессы не разложили по старому списку read_authors().
+    """
+    cache.delete(FANOUT_AUTHORS_CACHE_KEY)
+    for delay in (0, FANOUT_AUTHORS_CACHE_TIMEOUT):
+        jobs.enqueue(
+            'posts.backfill_followers', author_id=author_id, delay=delay,
+            key=f'backfill-followers:{author_id}:{delay}',
+        )
+
+
+def is_large_fan_out(author_id):
+    """Раскладка поста автора слишком велика, чтобы делать её в запросе."""
+    return AuthorStats.objects.filter(
+        user_id=author_id,
+        follower_count__gt=settings.TIMELINE_INLINE_FANOUT,
+    ).exists()
+
+
+def trim(user_ids):
+    """Оставляет во входящих user_ids только TIMELINE_SIZE последних
+    постов.
+
+    Лишние записи всех пользователей удаляются одним DELETE на пачку
+    из TRIM_BATCH пользователей: ROW_NUMBER() нумерует входящие в
+    порядке индекса (user, -pub_date, -post), как их читает feed().
+    """
+    user_ids = list(user_ids)
+    table = TimelineEntry._meta.db_table
+    for start in range(0, len(user_ids), TRIM_BATCH):
+        batch = user_ids[start:start + TRIM_BATCH]
+        placeholders = ', '.join(['%s'] * len(batch))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE id IN ('
+                f'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+                f'PARTITION BY user_id ORDER BY pub_date DESC, post_id DESC'
+                f') AS position FROM {table} '
+                f'WHERE user_id IN ({placeholders})) AS ranked '
+                f'WHERE position > %s)',
+                [*batch, settings.TIMELINE_SIZE],
+            )
+
+
+def fan_out(post):
+    """Кладёт новый пост во входящие всех подписчиков автора."""
+    if is_read_author(post.author_id):
+        return
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers
+        ],
+        ignore_conflicts=True,
+    )
+    trim(followers)
+
+
+def backfill(user_id, author_id):
+    """Добавляет во входящие последние посты нового автора подписки."""
+    if is_read_author(author_id):
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date', '-id')
+        .values_list('id', 'pub_date')[:settings.TIMELINE_SIZE]
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        ],
+        ignore_conflicts=True,
+    )
+    trim([user_id])
+
+
+def prune(user_id, author_id):
+    """Убирает из входящих посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild(user_id):
+    """Собирает входящие пользователя заново по его подпискам."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    posts = (
+        Post.objects.filter(author__following__user_id=user_id)
+        .exclude(author__in=read_authors())
+        .order_by('-pub_date', '-id')
+        .values_list('id', 'pub_date')[:settings.TIMELINE_SIZE]
+    )
+    TimelineEntry.objects.bulk_create(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts
+    )
+
+
+def feed(user):
+    """Queryset ленты подписок пользователя.
+
+    Обычно это диапазон индекса входящих (user, -pub_date, -post);
+    если пользователь читает популярных авторов, их посты
+    объединяются с входящими.
+    """
+    if sharding.enabled():
+        authors = list(
+            Follow.objects.filter(user=user).values_list('author', flat=True)
+        )
+        return Post.objects.across_shards(authors).filter(
+            author__in=authors
+        ).for_feed()
+    posts = Post.objects.for_feed()
+    followed = read_authors() and list(
+        Follow.objects.filter(user=user, author__in=read_authors())
+        .values_list('author', flat=True)
+    )
+    if not followed:
+        return posts.filter(timeline_entries__user=user).order_by(
+            F('timeline_entries__pub_date').desc(),
+            F('timeline_entries__post_id').desc(),
+        )
+    return posts.filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post'))
+        | Q(author__in=followed)
+    ).order_by('-pub_date', '-id')
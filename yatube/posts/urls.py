@@ -10,6 +10,7 @@ urlpatterns = [
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path('search/', views.search, name='search'),
     path('create/', views.post_create, name='create_post'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path(
@@ -3,27 +3,76 @@ from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
 
+from core.page_cache import cache_for_anonymous
+from core.replicas import cache_timeout, read_from_replica
+from . import conditions, timeline
+from .cache import (
+    comments_cache_key, depend_on_feed, feed_cache_context, feed_count_key,
+)
 from .forms import PostForm, CommentForm
 from .models import Group, Post, Follow, User
+from .paginators import CachedCountPaginator, CursorPaginator
+from .search import SearchResults
+from .tasks import process_image
+
+
+def paginate(queryset, request, page_size=settings.PAGE_POSTS,
+             count_key=None):
+    """Страница ленты: по номеру или, если запрошен курсор
+    (`?before=`/`?after=`) либо включён FEED_PAGINATION = 'cursor',
+    по курсору. С count_key число постов берётся из кеша."""
+    if (settings.FEED_PAGINATION == 'cursor'
+            or 'before' in request.GET or 'after' in request.GET):
+        return CursorPaginator(queryset, page_size).get_page(
+            request.GET.get('before'), request.GET.get('after')
+        )
+    if count_key:
+        paginator = CachedCountPaginator(queryset, page_size, count_key)
+    else:
+        paginator = Paginator(queryset, page_size)
+    return paginator.get_page(request.GET.get('page'))
 
 
-def paginate(queryset, request, page_size=settings.PAGE_POSTS):
-    return Paginator(queryset, page_size).get_page(request.GET.get('page'))
-
-
+@read_from_replica
+@cache_for_anonymous
+@conditions.conditional(conditions.index)
 def index(request):
     """Функция отображения главной страницы"""
     return render(request, 'posts/index.html', {
-        'page_obj': paginate(Post.objects.all(), request),
+        'page_obj': paginate(
+            Post.objects.across_shards().for_feed(), request,
+            count_key=feed_count_key('index'),
+        ),
+        **feed_cache_context(request, 'index'),
     })
 
 
+@read_from_replica
+@cache_for_anonymous
+@conditions.conditional(conditions.group)
 def group_posts(request, slug):
     """Функция отображения страницы всех постов группы"""
     group = get_object_or_404(Group, slug=slug)
     return render(request, 'posts/group_list.html', {
         'group': group,
-        'page_obj': paginate(group.posts.all(), request),
+        'page_obj': paginate(
+            Post.objects.across_shards().filter(group=group).for_feed(),
+            request,
+            count_key=feed_count_key('group', group.pk),
+        ),
+        **feed_cache_context(request, 'group', group.pk),
+    })
+
+
+def search(request):
+    """Функция отображения результатов поиска по тексту постов"""
+    query = request.GET.get('q', '').strip()
+    page_obj = query and Paginator(
+        SearchResults(query), settings.PAGE_POSTS
+    ).get_page(request.GET.get('page'))
+    return render(request, 'posts/search.html', {
+        'query': query,
+        'page_obj': page_obj,
     })
 
 
@@ -36,6 +85,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        process_image(post)
         return redirect('posts:profile', username=post.author)
     context = {
         'form': form,
@@ -47,12 +97,16 @@ def post_create(request):
 def post_edit(request, post_id):
     """Функция редактирования поста.
     Доступна только авторизованным пользователям"""
-    post = get_object_or_404(Post, pk=post_id, author=request.user)
+    post = get_object_or_404(request.user.posts, pk=post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post_id)
-    form = PostForm(instance=post, data=request.POST)
+    form = PostForm(
+        instance=post, data=request.POST, files=request.FILES or None
+    )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            process_image(post)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'form': form,
@@ -61,10 +115,15 @@ def post_edit(request, post_id):
     return render(request, 'posts/create_post.html', context)
 
 
+@read_from_replica
+@cache_for_anonymous
+@conditions.conditional(conditions.profile)
 def profile(request, username):
     """Функция отображения страницы всех постов пользователя"""
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.select_related('author').all()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    posts = author.posts.for_feed()
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user,
         author=author
@@ -72,18 +131,38 @@ def profile(request, username):
     context = {
         'author': author,
         'following': following,
-        'page_obj': paginate(posts, request),
+        'page_obj': paginate(
+            posts, request,
+            count_key=feed_count_key('profile', author.pk),
+        ),
+        **feed_cache_context(request, 'profile', author.pk),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@read_from_replica
+@cache_for_anonymous
+@conditions.conditional(conditions.post_detail)
 def post_detail(request, post_id):
     """Функция отображения выбранного поста"""
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.across_shards().select_related('author__stats', 'group'),
+        pk=post_id,
+    )
+    depend_on_feed(request, 'comments', post.pk)
+    depend_on_feed(request, 'profile', post.author_id)
     form_comments = CommentForm(request.POST or None)
+    cursor = request.GET.get('comments_before', '')
+    comments = CursorPaginator(
+        post.comments.select_related('author').order_by('-created', '-id'),
+        settings.PAGE_COMMENTS,
+    ).get_page(before=cursor)
     context = {
         'post': post,
         'form_comments': form_comments,
+        'comments': comments,
+        'comments_cache_key': comments_cache_key(post.pk, cursor),
+        'comments_cache_timeout': cache_timeout(settings.FEED_CACHE_TIMEOUT),
     }
     return render(request, 'posts/post_detail.html', context)
 
@@ -91,7 +170,7 @@ def post_detail(request, post_id):
 @login_required
 def add_comment(request, post_id):
     """Функция добавления комментария к посту"""
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.across_shards(), id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -101,12 +180,13 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@read_from_replica
 @login_required
+@conditions.conditional(conditions.follow)
 def follow_index(request):
     """Отображение страницы подписок"""
     return render(request, 'posts/follow.html', {
-        'page_obj': paginate(Post.objects.all().filter(
-            author__following__user=request.user), request),
+        'page_obj': paginate(timeline.feed(request.user), request),
     })
 
 
@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import PasswordResetForm, UserCreationForm
+
+from core import jobs
 
 User = get_user_model()
 
@@ -8,3 +10,28 @@ class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ('first_name', 'last_name', 'username', 'email')
+
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    """Сброс пароля, письмо которого отправляет фоновая задача.
+
+    В очередь уходят только id пользователя, адрес и имена шаблонов:
+    ссылка с токеном собирается в задаче и в базе не хранится.
+    """
+
+    def send_mail(self, subject_template_name, email_template_name,
+                  context, from_email, to_email,
+                  html_email_template_name=None):
+        jobs.enqueue(
+            'users.send_password_reset',
+            user_id=context['user'].pk,
+            email=to_email,
+            context={
+                key: value for key, value in context.items()
+                if key not in ('user', 'uid', 'token', 'email')
+            },
+            subject_template_name=subject_template_name,
+            email_template_name=email_template_name,
+            from_email=from_email,
+            html_email_template_name=html_email_template_name,
+        )
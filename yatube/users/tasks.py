@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.forms import PasswordResetForm
+from django.contrib.auth.tokens import default_token_generator
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from core import jobs
+
+User = get_user_model()
+
+
+@jobs.task('users.send_password_reset', max_attempts=5, priority=10)
+def send_password_reset(user_id, email, context, subject_template_name,
+                        email_template_name, from_email,
+                        html_email_template_name=None):
+    """Собирает и отправляет письмо сброса пароля. Ссылка с токеном
+    создаётся здесь, чтобы не лежать в Job.payload открытым текстом."""
+    user = User.objects.filter(pk=user_id, is_active=True).first()
+    if user is None:
+        return
+    context = {
+        **context,
+        'email': email,
+        'user': user,
+        'uid': urlsafe_base64_encode(force_bytes(user.pk)),
+        'token': default_token_generator.make_token(user),
+    }
+    PasswordResetForm().send_mail(
+        subject_template_name, email_template_name, context,
+        from_email, email, html_email_template_name,
+    )
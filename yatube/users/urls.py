@@ -2,6 +2,7 @@ from django.contrib.auth.views import LoginView, LogoutView, PasswordResetView
 from django.urls import path
 
 from . import views
+from .forms import QueuedPasswordResetForm
 
 app_name = 'users'
 
@@ -20,7 +21,9 @@ urlpatterns = [
     path(
         'password_reset_form/',
         PasswordResetView.as_view(
-            template_name='users/password_reset_form.html'),
+            template_name='users/password_reset_form.html',
+            form_class=QueuedPasswordResetForm,
+        ),
         name='password_reset_form'
     ),
 ]
@@ -45,11 +45,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.replicas.ReplicaMiddleware',
+    'core.page_cache.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.auth.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -60,7 +63,7 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.timing.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -81,13 +84,54 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# core.db.sqlite3: WAL, PRAGMA и повтор при «database is locked»;
+# соединения живут между запросами
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 600,
     }
 }
 
+# Реплики для чтения лент: алиасы из DATABASES. Локально это второй
+# файл SQLite, который обновляет `manage.py sync_replicas --interval 1`:
+#   DATABASES['replica'] = {**DATABASES['default'],
+#                           'NAME': os.path.join(BASE_DIR, 'replica.sqlite3')}
+#   DATABASE_REPLICAS = ['replica']
+DATABASE_REPLICAS = []
+
+# Шарды постов и комментариев: алиасы из DATABASES, автор попадает на
+# один из них по хешу author_id (posts.sharding). Пустой список — всё
+# в default. Локально это несколько файлов SQLite; пользователи и группы
+# остаются в default, поэтому внешние ключи на шардах не проверяются:
+#   DATABASES.update({
+#       f'posts_{n}': {
+#           **DATABASES['default'],
+#           'NAME': os.path.join(BASE_DIR, f'posts_{n}.sqlite3'),
+#           'OPTIONS': {'pragmas': {'foreign_keys': 'off'}},
+#       } for n in range(2)
+#   })
+#   POST_SHARDS = ['posts_0', 'posts_1']
+# затем `migrate --database=posts_N` для каждого шарда и rebalance_shards
+POST_SHARDS = []
+
+# Сколько id постов или комментариев процесс берёт из общего счётчика
+# за одну транзакцию
+POST_SHARD_ID_BLOCK = 100
+
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.replicas.ReplicaRouter',
+]
+
+# Сколько секунд после записи пользователь читает с default
+REPLICA_STICKY_SECONDS = 10
+
+# Кеш, заполненный по данным реплики, может оказаться под уже новой
+# версией ленты, поэтому живёт не дольше стольких секунд
+REPLICA_CACHE_TIMEOUT = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -139,14 +183,138 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 PAGE_POSTS = 10
 
+PAGE_COMMENTS = 20
+
+# 'pages' — нумерованные страницы, 'cursor' — keyset-пагинация лент
+FEED_PAGINATION = 'pages'
+
+# Размер материализованной ленты подписок одного пользователя
+TIMELINE_SIZE = 1000
+
+# Посты авторов с большим числом подписчиков не раскладываются по лентам,
+# а подмешиваются в ленту при чтении
+TIMELINE_FANOUT_LIMIT = 5000
+
+# Раскладка поста по большему числу лент уходит в фоновую задачу
+TIMELINE_INLINE_FANOUT = 200
+
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки именуются по SHA-256 содержимого, одинаковые файлы
+# хранятся один раз; миниатюрам sorl это не нужно
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+
+# Файл, загруженный снова после того, как на него перестали ссылаться,
+# не удаляется столько секунд: новая запись успеет взять ссылку
+STORAGE_REUSE_GRACE = 60
+
+THUMBNAIL_STORAGE = 'django.core.files.storage.FileSystemStorage'
+
+# Загрузки всегда пишутся на диск кусками; больше UPLOAD_MAX_BYTES
+# не принимается, а картинки больше IMAGE_MAX_PIXELS отклоняются
+# по заголовку, без декодирования
+FILE_UPLOAD_HANDLERS = ['core.uploads.LimitedUploadHandler']
+
+UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+
+IMAGE_MAX_PIXELS = 24_000_000
+
+# Уменьшать картинки больше IMAGE_MAX_SIDE и убирать из них EXIF
+# фоновой задачей после загрузки
+IMAGE_NORMALIZE = False
+
+IMAGE_MAX_SIDE = 2560
+
+# Миниатюры, которые core.thumbnails готовит сразу после загрузки
+# картинки: алиас -> (геометрия, опции sorl-thumbnail)
+THUMBNAIL_ALIASES = {
+    'feed': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+# Варианты каждого алиаса для srcset: ширины (не больше ширины алиаса)
+# и форматы; форматы, которых нет в установленном Pillow, пропускаются
+THUMBNAIL_WIDTHS = (320, 640, 960)
+
+THUMBNAIL_FORMATS = ('AVIF', 'WEBP')
+
+THUMBNAIL_ENGINE = 'core.thumbnail_engine.Engine'
+
+# core.jobs: базовая задержка повтора упавшей задачи (удваивается
+# с каждой попыткой) и через сколько секунд задача «зависшего»
+# обработчика возвращается в очередь
+JOB_RETRY_DELAY = 10
+
+JOB_LOCK_TIMEOUT = 600
+
+# Сколько дней хранить выполненные и упавшие задачи
+JOB_RETENTION_DAYS = 7
+
+# Фрагменты лент сбрасываются сигналами, поэтому TTL может быть большим
+FEED_CACHE_TIMEOUT = 300
+
+# Страницы для анонимных посетителей сбрасываются по версиям лент,
+# TTL ограничивает устаревание того, что версиями не покрыто
+# (имена авторов, год в подвале)
+PAGE_CACHE_TIMEOUT = 600
+
+# Выключатель кеша страниц; в manage.py test его выключает TEST_RUNNER
+PAGE_CACHE_ENABLED = True
+
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# core.cache.get_or_compute: сколько секунд после истечения отдавать
+# устаревшее значение и на сколько брать блокировку пересчёта
+CACHE_STALE_TIMEOUT = 60
+
+CACHE_LOCK_TIMEOUT = 10
+
+# Кеш в памяти процесса годится для одного процесса (runserver, тесты).
+# При нескольких воркерах gunicorn нужен общий кеш, иначе попадания
+# делятся на воркеры, а сброс версий лент виден одному процессу:
+# 'BACKEND': 'core.sqlite_cache.TimedSQLiteCache',
+# 'LOCATION': os.path.join(BASE_DIR, 'cache'),
+# 'OPTIONS': {'SHARDS': 8, 'MAX_ENTRIES': 10000,
+#             'MAX_SIZE': 256 * 1024 * 1024, 'LOCAL_ENTRIES': 1000},
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.timing.TimedLocMemCache',
     }
 }
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Сессии читаются из кеша и пишутся в базу; request.user тоже берётся
+# из кеша (core.auth) и сбрасывается при сохранении пользователя.
+# Истёкшие сессии удаляет `manage.py purge_sessions --interval 3600`
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+USER_CACHE_TIMEOUT = 300
+
+# core.timing: запросы дольше стольких секунд пишутся в лог вместе
+# с SLOW_REQUEST_QUERIES самыми медленными SQL
+SLOW_REQUEST_THRESHOLD = 0.5
+
+SLOW_REQUEST_QUERIES = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.timing': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        # Время подготовки каждой миниатюры (core.generate_thumbnails)
+        'core.thumbnails': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}